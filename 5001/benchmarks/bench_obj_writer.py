@@ -0,0 +1,110 @@
+"""
+Benchmark the vertex-color OBJ writer against the original per-face implementation.
+
+legacy_obj_with_vertex_colors is write_obj_with_vertex_colors as it was before the
+writers were vectorized (progress printing removed). Every timed output is checked to
+be byte-identical to the legacy bytes before its time is reported.
+
+    cd 5001 && python benchmarks/bench_obj_writer.py [--repeat 5] [--sizes 48 75]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests'))
+from conftest import import_server, prepare_app_workdir  # noqa: E402
+
+
+def legacy_obj_with_vertex_colors(vertices: np.ndarray, faces: np.ndarray, triangle_colors: np.ndarray) -> bytes:
+    obj_content = []
+    obj_content.append("# Colored Album Cover Model")
+    obj_content.append("# Colors preserved from original PNG")
+    obj_content.append("# Vertex colors embedded directly: v x y z r g b")
+    obj_content.append("# Vertices duplicated per triangle to prevent color interpolation")
+    obj_content.append("")
+    all_vertices = []
+    all_vertex_colors = []
+    all_faces = []
+    for face_idx, face in enumerate(faces):
+        v0 = vertices[face[0]]
+        v1 = vertices[face[1]]
+        v2 = vertices[face[2]]
+        r, g, b = triangle_colors[face_idx]
+        r_norm = r / 255.0
+        g_norm = g / 255.0
+        b_norm = b / 255.0
+        vertex_base_idx = len(all_vertices)
+        all_vertices.append(v0)
+        all_vertex_colors.append((r_norm, g_norm, b_norm))
+        all_vertices.append(v1)
+        all_vertex_colors.append((r_norm, g_norm, b_norm))
+        all_vertices.append(v2)
+        all_vertex_colors.append((r_norm, g_norm, b_norm))
+        all_faces.append((vertex_base_idx + 1, vertex_base_idx + 2, vertex_base_idx + 3))
+    for i, v in enumerate(all_vertices):
+        r, g, b = all_vertex_colors[i]
+        obj_content.append(f"v {v[0]:.6f} {v[1]:.6f} {v[2]:.6f} {r:.6f} {g:.6f} {b:.6f}")
+    obj_content.append("")
+    for v1, v2, v3 in all_faces:
+        obj_content.append(f"f {v1} {v2} {v3}")
+    return "\n".join(obj_content).encode('utf-8')
+
+
+def four_color_design(server, num_faces: int, seed: int = 0) -> np.ndarray:
+    """Per-face colors drawn from the default 4-color palette"""
+    palette = np.array(server.FOUR_COLORS_RGB, dtype=np.uint8)
+    return palette[np.random.default_rng(seed).integers(0, len(palette), num_faces)]
+
+
+def best_time(fn, repeat: int):
+    """(fastest wall time over repeat runs, last result)"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[48, 75])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        server = import_server(prepare_app_workdir(workdir))
+        rows = []
+        for size in args.sizes:
+            template = server.grid_templates.get(size)
+            vertices = np.asarray(template.vertices)
+            faces = np.asarray(template.faces)
+            colors = four_color_design(server, len(faces))
+            skeleton = server.OutputSkeleton(vertices, faces)
+
+            legacy_time, expected = best_time(lambda: legacy_obj_with_vertex_colors(vertices, faces, colors), args.repeat)
+            stream_time, streamed = best_time(
+                lambda: b"".join(server.iter_obj_with_vertex_colors(vertices, faces, colors)), args.repeat)
+            with contextlib.redirect_stdout(io.StringIO()):
+                skeleton_time, spliced = best_time(
+                    lambda: server.write_obj_with_vertex_colors(vertices, faces, colors, skeleton=skeleton), args.repeat)
+            if streamed != expected or spliced != expected:
+                sys.exit(f"❌ {size}x{size}: writer output differs from the legacy bytes")
+
+            rows.append(f"{size:>3}x{size:<3} {len(faces):>7} {legacy_time:>8.3f}s {stream_time:>8.3f}s "
+                        f"{skeleton_time:>8.3f}s {legacy_time / skeleton_time:>7.1f}x")
+
+        print(f"\n{'grid':<7} {'faces':>7} {'legacy':>9} {'stream':>9} {'skeleton':>9} {'speedup':>8}")
+        print("\n".join(rows))
+        print("✅ All outputs byte-identical to the legacy writer")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Benchmark attach_files_to_order over REST and over GraphQL against a local stand-in
+Admin API (tests/shopify_stand_in.py) that adds a fixed latency to every response.
+
+    cd 5001 && python benchmarks/bench_shopify_attach.py [--latency 0.05] [--runs 5]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests'))
+from shopify_api import ShopifyAPI  # noqa: E402
+from shopify_stand_in import ShopifyStandIn  # noqa: E402
+
+FILE_URLS = ['https://cdn.example/order_1_obj.obj', 'https://cdn.example/order_1_png.png']
+METAFIELDS = [('album_builder', 'order_id', 'order1', 'single_line_text_field')]
+
+
+def make_api(stand_in: ShopifyStandIn, use_graphql: bool) -> ShopifyAPI:
+    os.environ.update({
+        'SHOPIFY_STORE_URL': 'stand-in.myshopify.com',
+        'SHOPIFY_API_KEY': 'key',
+        'SHOPIFY_API_SECRET': 'secret',
+        'SHOPIFY_API_BASE_URL': stand_in.base_url,
+        'SHOPIFY_USE_GRAPHQL': '1' if use_graphql else '0',
+    })
+    with contextlib.redirect_stdout(io.StringIO()):
+        return ShopifyAPI()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds added to every response')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    stand_in = ShopifyStandIn(latency=args.latency)
+    try:
+        print(f"Attaching {len(FILE_URLS)} files plus {len(METAFIELDS)} metafield, "
+              f"{args.latency * 1000:.0f} ms per response, {args.runs} runs each")
+        for label, use_graphql in (('REST', False), ('GraphQL', True)):
+            api = make_api(stand_in, use_graphql)
+            timings = []
+            for _ in range(args.runs):
+                stand_in.reset()
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    ok = api.attach_files_to_order(stand_in.ORDER_ID, FILE_URLS, METAFIELDS)
+                timings.append(time.perf_counter() - start)
+                if not ok or len(stand_in.fulfillments) != 1:
+                    sys.exit(f"❌ {label} attach failed")
+            print(f"  {label:<8} {stand_in.round_trips} round trips, {sum(timings) / len(timings) * 1000:.0f} ms avg")
+    finally:
+        stand_in.close()
+
+
+if __name__ == '__main__':
+    main()
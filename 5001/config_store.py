@@ -0,0 +1,180 @@
+"""
+Config Store
+Prices, text content and product images are small JSON documents read on every page load.
+Each is parsed once and kept with its serialized bytes and a strong ETag; a file whose
+mtime/size changed (an admin write from any worker process) is reloaded on the next read.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+from static_assets import get_asset_store
+
+
+# Default text content; content.json only needs to hold what the admin changed
+DEFAULT_CONTENT = {
+    'title': '3D Album Cover Mosaic Builder',
+    'price_subtitle': 'Create colorized 3D prints',
+    'upload_image_text': 'Choose image file...',
+    'upload_subtext': 'Will be resized to 75×75 pixels',
+    'stl_upload_text': 'Choose STL file...',
+    'stl_subtext': 'Or auto-load from server',
+    'info_title': 'Custom Brick Mosaic Designer',
+    'info_description': 'Turn your favourite photos into stunning brick art—made by you!',
+    'info_additional': 'Bring your memories to life, one brick at a time. With our Custom Brick Mosaic Designer you can transform any image into a beautiful 3D printable mosaic.',
+    'howto_title': 'How to Use',
+    'howto_content': '1. Upload Your Image\n2. Select Grid Size\n3. Adjust Image\n4. View in 3D',
+    'desktop_info': 'Each pixel in your PNG maps to one cube in the STL grid. Colors are preserved exactly as-is.',
+    'desktop_output': 'OBJ file with MTL colors - Import to Bambu Studio and export as 3MF for printing.',
+    # Desktop orange text labels
+    'panel_title': 'Edit Your Photo',
+    'canvas_label': 'Processed (Posterized)',
+    'section_upload': '1. Upload Color Image',
+    'section_grid': '2. Select Grid Size',
+    'section_adjustments': 'Image Adjustments',
+    'section_painting': 'Painting',
+    # Additional editable text fields
+    'grid_btn_48': '48 × 48',
+    'grid_btn_75': '75 × 75',
+    'grid_btn_96': '96 × 96',
+    'slider_contrast_label': 'Contrast',
+    'slider_brightness_label': 'Brightness',
+    'slider_tones_label': 'Tones',
+    'label_dimensions': 'Dimensions:',
+    'label_addons': 'Addons:',
+    'label_48x48': '48×48:',
+    'label_75x75': '75×75:',
+    'label_96x96': '96×96:',
+    'stand_name': 'Stand',
+    'stand_upload_btn': 'Upload Image',
+    'mounting_name': 'Nano Wall Mounting Dots (Pack of 8)',
+    'mounting_upload_btn': 'Upload Image',
+    'color_black_title': 'Black',
+    'color_darkgray_title': 'Dark Gray',
+    'color_lightgray_title': 'Light Gray',
+    'color_white_title': 'White',
+    'size_guide_title': 'Size Guide',
+    'size_guide_button_text': 'Size Guide',
+    'size_guide': {
+        'square': [
+            {'bricks': '32 × 32 bricks', 'cm': '28.6 × 28.6 cm'},
+            {'bricks': '32 × 32 bricks*', 'cm': '25.6 × 25.6 cm'},
+            {'bricks': '48 × 48 bricks', 'cm': '41.4 × 41.4 cm'},
+            {'bricks': '48 × 48 bricks*', 'cm': '38.4 × 38.4 cm'},
+            {'bricks': '64 × 64 bricks', 'cm': '54.2 × 54.2 cm'},
+            {'bricks': '96 × 96 bricks', 'cm': '79.8 × 79.8 cm'}
+        ],
+        'portrait': [],
+        'landscape': [],
+        'note': '* Unframed baseplate. All other measurements shown are for the framed baseplate.'
+    }
+}
+
+
+def deep_merge(default: Dict[str, Any], saved: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge saved into default recursively (saved values win, nested dicts are merged)"""
+    result = default.copy()
+    for key, value in saved.items():
+        if key in result and isinstance(result[key], dict) and isinstance(value, dict):
+            result[key] = deep_merge(result[key], value)
+        else:
+            result[key] = value
+    return result
+
+
+class ConfigSnapshot(NamedTuple):
+    data: Any    # Document as stored (what admin edits start from)
+    body: bytes  # Serialized JSON response body (after the document's transform)
+    etag: str    # Strong validator (hash of body), without quotes
+
+
+class ConfigDocument:
+    """
+    One JSON file. With defaults, the file is deep-merged over them (missing file = defaults).
+    With backup_corrupt, an unparsable file is copied aside and treated as empty instead of failing.
+    transform rewrites the served copy only (e.g. asset paths to fingerprinted URLs).
+    """
+
+    def __init__(self, path: str, defaults: Optional[Dict[str, Any]] = None, backup_corrupt: bool = False,
+                 transform: Optional[Callable[[Any], Any]] = None):
+        self.path = path
+        self.defaults = defaults
+        self.backup_corrupt = backup_corrupt
+        self.transform = transform
+        self._snapshot: Optional[ConfigSnapshot] = None
+        self._signature: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def _stat_signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self) -> Any:
+        saved = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    saved = json.load(f)
+            except json.JSONDecodeError:
+                if not self.backup_corrupt:
+                    raise
+                backup_file = self.path + '.backup.' + str(int(time.time()))
+                try:
+                    shutil.copy2(self.path, backup_file)
+                    print(f"⚠️ {self.path} is corrupted, backed up to {backup_file}, using empty")
+                except OSError:
+                    print(f"⚠️ {self.path} is corrupted, using empty (backup failed)")
+                saved = {}
+        return deep_merge(self.defaults, saved) if self.defaults is not None else saved
+
+    def get(self) -> ConfigSnapshot:
+        """Current document; costs one stat() unless the file changed"""
+        signature = self._stat_signature()
+        with self._lock:
+            if self._snapshot is None or signature != self._signature:
+                data = self._load()
+                served = self.transform(data) if self.transform is not None else data
+                body = json.dumps(served, separators=(',', ':')).encode('utf-8')
+                self._snapshot = ConfigSnapshot(data, body, hashlib.sha256(body).hexdigest()[:32])
+                self._signature = signature
+                self.loads += 1
+            return self._snapshot
+
+    def save(self, data: Any) -> ConfigSnapshot:
+        """Write the document atomically and return the new snapshot"""
+        tmp_path = f'{self.path}.tmp-{uuid.uuid4().hex[:8]}'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, self.path)
+        with self._lock:
+            self._snapshot = None
+        return self.get()
+
+
+# Global documents
+_documents: Dict[str, ConfigDocument] = {}
+_documents_lock = threading.Lock()
+
+def get_config(name: str) -> ConfigDocument:
+    """Get the 'prices', 'content' or 'images' document"""
+    with _documents_lock:
+        if name not in _documents:
+            if name == 'prices':
+                _documents[name] = ConfigDocument('prices.json')
+            elif name == 'content':
+                _documents[name] = ConfigDocument('content.json', defaults=DEFAULT_CONTENT)
+            elif name == 'images':
+                _documents[name] = ConfigDocument('images.json', backup_corrupt=True,
+                                                  transform=get_asset_store().fingerprint_urls)
+            else:
+                raise KeyError(name)
+        return _documents[name]
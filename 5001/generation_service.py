@@ -0,0 +1,249 @@
+"""
+Generation Service
+Runs CPU-bound model generation in a pool of warm worker processes, so NumPy/Python
+work in one request never holds the GIL of the Flask worker serving everything else.
+Inputs and results cross the process boundary through shared memory instead of pickles.
+"""
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Callable, Optional, Tuple
+
+from jobs import QueueFullError
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+
+# (shared memory block name, payload length); None stands for "no bytes"
+SharedRef = Optional[Tuple[str, int]]
+
+
+def share_bytes(data: Optional[bytes]) -> Tuple[SharedRef, Optional[shared_memory.SharedMemory]]:
+    """
+    Copy data into a new shared memory block.
+    Returns: (reference to pass to another process, block to close/unlink when done)
+    """
+    if not data:
+        return None, None
+    block = shared_memory.SharedMemory(create=True, size=len(data))
+    block.buf[:len(data)] = data
+    return (block.name, len(data)), block
+
+
+def read_shared_bytes(ref: SharedRef, unlink: bool = False) -> Optional[bytes]:
+    """Copy the payload out of a shared memory block (optionally freeing the block)"""
+    if ref is None:
+        return None
+    name, size = ref
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        return bytes(block.buf[:size])
+    finally:
+        block.close()
+        if unlink:
+            block.unlink()
+
+
+def _release(block: Optional[shared_memory.SharedMemory]):
+    if block is not None:
+        block.close()
+        block.unlink()
+
+
+class GenerationSlots:
+    """
+    At most `count` generations at once across every process sharing slot_dir (all
+    gunicorn workers of one instance): a slot is an flock on slot_dir/<n>.lock, which
+    the OS also releases if the holding process dies.
+    Without fcntl (Windows) the cap only applies within this process.
+    """
+
+    POLL_INTERVAL = 0.05
+
+    def __init__(self, slot_dir: str, count: int):
+        self.slot_dir = slot_dir
+        self.count = count
+        self._local = threading.BoundedSemaphore(count) if not FCNTL_AVAILABLE else None
+
+    def _try_lock(self) -> Optional[int]:
+        for slot in range(self.count):
+            fd = os.open(os.path.join(self.slot_dir, f'{slot}.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                os.close(fd)
+        return None
+
+    def acquire(self, timeout: Optional[float]) -> Optional[int]:
+        """
+        Take a slot, waiting up to timeout seconds (None = as long as it takes).
+        Returns: a token for release(), or None if no slot freed up in time
+        """
+        if self._local is not None:
+            return 0 if self._local.acquire(timeout=timeout) else None
+        os.makedirs(self.slot_dir, exist_ok=True)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            fd = self._try_lock()
+            if fd is not None:
+                return fd
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(self.POLL_INTERVAL)
+
+    def release(self, token: int):
+        if self._local is not None:
+            self._local.release()
+        else:
+            os.close(token)  # Closing the descriptor drops the flock
+
+
+class GenerationService:
+    """
+    Process pool with admission control: at most max_in_flight generations run or wait
+    for a worker at once across all web workers (see GenerationSlots). Request handlers
+    wait up to admission_timeout seconds for a slot and then get a QueueFullError;
+    background callers pass block=True and wait their turn.
+    """
+
+    def __init__(self, processes: int, max_in_flight: int, admission_timeout: float,
+                 worker: Callable[..., Tuple[str, SharedRef]], initializer: Optional[Callable[[], None]] = None,
+                 slot_dir: str = '.generation_slots'):
+        self.processes = processes
+        self.max_in_flight = max_in_flight
+        self.admission_timeout = admission_timeout
+        self._worker = worker
+        self._initializer = initializer
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots = GenerationSlots(slot_dir, max_in_flight)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+        self._avg_duration = 5.0  # Seconds, moving average used for Retry-After
+
+    @property
+    def enabled(self) -> bool:
+        # Worker processes import the same modules, so they see this service too
+        return self.processes > 0 and not in_generation_worker()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a multi-threaded gunicorn worker is not safe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(self._initializer,),
+                )
+                print(f"⚙️  Started generation pool with {self.processes} worker process(es)")
+            return self._executor
+
+    def _reset_executor(self, executor: ProcessPoolExecutor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def run(self, output_format: str, stl_bytes: Optional[bytes], png_bytes: bytes, grid_size: int,
+            block: bool = False) -> Tuple[str, bytes]:
+        """
+        Generate in a worker process.
+        Args:
+            block: Wait for a free slot however long it takes instead of admission_timeout
+        Returns: (result cache key, file bytes)
+        """
+        slot = self._slots.acquire(None if block else self.admission_timeout)
+        if slot is None:
+            with self._lock:
+                self._rejected += 1
+                retry_after = max(1, math.ceil(self._avg_duration))
+            raise QueueFullError(retry_after)
+
+        stl_block = png_block = None
+        started = time.monotonic()
+        with self._lock:
+            self._in_flight += 1
+        try:
+            stl_ref, stl_block = share_bytes(stl_bytes)
+            png_ref, png_block = share_bytes(png_bytes)
+            executor = self._get_executor()
+            try:
+                cache_key, result_ref = executor.submit(self._worker, output_format, stl_ref, png_ref, grid_size).result()
+            except BrokenProcessPool:
+                self._reset_executor(executor)
+                raise RuntimeError("Generation worker crashed, please retry")
+            with self._lock:
+                self._completed += 1
+                self._avg_duration = 0.8 * self._avg_duration + 0.2 * (time.monotonic() - started)
+            return cache_key, read_shared_bytes(result_ref, unlink=True)
+        finally:
+            _release(stl_block)
+            _release(png_block)
+            with self._lock:
+                self._in_flight -= 1
+            self._slots.release(slot)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'processes': self.processes,
+                'max_in_flight': self.max_in_flight,  # Across all web workers
+                'in_flight': self._in_flight,  # In this web worker
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'started': self._executor is not None,
+            }
+
+
+def _init_worker(initializer: Optional[Callable[[], None]]):
+    # Mark the process so code paths never re-dispatch from inside a worker
+    os.environ['GENERATION_WORKER'] = '1'
+    if initializer is not None:
+        initializer()
+
+
+def in_generation_worker() -> bool:
+    """True inside pool workers, including while they are still importing modules"""
+    return os.environ.get('GENERATION_WORKER') == '1' or multiprocessing.parent_process() is not None
+
+
+def create_generation_service(worker: Callable[..., Tuple[str, SharedRef]],
+                              initializer: Optional[Callable[[], None]] = None) -> GenerationService:
+    """
+    Build the service from environment variables:
+    GENERATION_PROCESSES (default: this web worker's share of the CPUs, i.e. CPU count
+    divided by WEB_CONCURRENCY (default 2, the gunicorn --workers setting); 0 = generate inline),
+    GENERATION_JOBS_PER_CORE (default 1; the in-flight cap is CPU count x this, shared by all
+    web workers through GENERATION_SLOT_DIR) and GENERATION_ADMISSION_TIMEOUT seconds
+    (default 0: a request that finds every slot busy gets a 429 at once)
+    """
+    cores = os.cpu_count() or 1
+    web_workers = max(1, int(os.getenv('WEB_CONCURRENCY', 2)))
+    processes = int(os.getenv('GENERATION_PROCESSES', max(1, cores // web_workers)))
+    jobs_per_core = int(os.getenv('GENERATION_JOBS_PER_CORE', 1))
+    return GenerationService(
+        processes=processes,
+        max_in_flight=max(1, cores * jobs_per_core),
+        admission_timeout=float(os.getenv('GENERATION_ADMISSION_TIMEOUT', 0)),
+        worker=worker,
+        initializer=initializer,
+        slot_dir=os.getenv('GENERATION_SLOT_DIR', '.generation_slots'),
+    )
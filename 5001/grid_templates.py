@@ -0,0 +1,459 @@
+"""
+Grid Template Store
+Parses each stl_files/{size}x{size}_grid.stl once into compact NumPy arrays
+and persists them as .npy files that every gunicorn worker memory-maps.
+Sizes without an uploaded STL (and rectangular grids) are generated procedurally.
+"""
+import hashlib
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+
+# Arrays persisted per template (one .npy file each)
+TEMPLATE_ARRAYS = ('vertices', 'faces', 'normals', 'centroids', 'top_bounds')
+
+SUPPORTED_GRID_SIZES = (48, 75, 96)
+# Any size up to this can be generated when no STL was uploaded for it
+MAX_GRID_SIZE = 256
+
+# Procedural grids are built on the scale of the uploaded templates (which are not in mm):
+# pitch and height are measured from the uploaded STL nearest in size, and these
+# defaults (the shipped 75x75 template) apply when there is none. The env variables
+# override the measured values.
+DEFAULT_GRID_PITCH = 0.158173
+DEFAULT_GRID_HEIGHT = 0.366266
+GRID_PITCH = float(os.environ['GRID_PITCH']) if os.getenv('GRID_PITCH') else None
+GRID_HEIGHT = float(os.environ['GRID_HEIGHT']) if os.getenv('GRID_HEIGHT') else None
+# 0 (the default) builds one closed outer shell; a gap builds separate cubes
+GRID_GAP = float(os.getenv('GRID_GAP', 0.0))
+# Part of the procedural cache key; bump when generate_grid_mesh output changes
+PROCEDURAL_VERSION = 2
+PROCEDURAL_CACHE_SIZE = 16
+# Template entries (arrays plus derived STL/viewer files) kept in cache_dir; least recently used go first
+TEMPLATE_CACHE_ENTRIES = int(os.getenv('GRID_TEMPLATE_CACHE_ENTRIES', 32))
+
+# Unit cube corners and its 12 triangles, wound counter-clockwise seen from outside
+CUBE_CORNERS = np.array([
+    [0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0],
+    [0, 0, 1], [1, 0, 1], [1, 1, 1], [0, 1, 1],
+], dtype=np.float64)
+CUBE_FACES = np.array([
+    [0, 2, 1], [0, 3, 2],  # bottom
+    [4, 5, 6], [4, 6, 7],  # top
+    [0, 1, 5], [0, 5, 4],  # front (-y)
+    [2, 3, 7], [2, 7, 6],  # back (+y)
+    [0, 4, 7], [0, 7, 3],  # left (-x)
+    [1, 2, 6], [1, 6, 5],  # right (+x)
+], dtype=np.int32)
+
+STL_RECORD = np.dtype([('normal', '<f4', (3,)), ('vertices', '<f4', (3, 3)), ('attributes', '<u2')])
+
+
+def is_valid_grid_size(size: int) -> bool:
+    return 1 <= size <= MAX_GRID_SIZE
+
+
+def generate_grid_mesh(columns: int, rows: int, pitch: float = DEFAULT_GRID_PITCH, gap: float = GRID_GAP,
+                       height: float = DEFAULT_GRID_HEIGHT) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Build a columns x rows grid (one cell per pixel) from the minimum corner, row by row.
+    Touching cubes (gap 0) would share internal side faces, which makes the union
+    non-manifold in OBJ/3MF, so without a gap only the outer shell is built: top and
+    bottom faces per cell on a shared vertex lattice, side faces along the perimeter.
+
+    Args:
+        pitch: Distance between neighbouring cell origins
+        gap: Space between neighbouring cubes (cube width = pitch - gap)
+        height: Cell height
+
+    Returns:
+        (vertices float64, faces int32); 4 faces per cell plus 2 per perimeter edge
+        without a gap, 8 vertices and 12 faces per cube with one
+    """
+    if not (is_valid_grid_size(columns) and is_valid_grid_size(rows)):
+        raise ValueError(f"Grid size must be between 1 and {MAX_GRID_SIZE}, got {columns}x{rows}")
+    if not (0 <= gap < pitch) or height <= 0:
+        raise ValueError(f"Invalid cube dimensions: pitch={pitch}, gap={gap}, height={height}")
+    if gap == 0:
+        return _generate_grid_shell(columns, rows, pitch, height)
+    width = pitch - gap
+    cell_x, cell_y = np.meshgrid(np.arange(columns), np.arange(rows))
+    origins = np.zeros((columns * rows, 3))
+    origins[:, 0] = cell_x.ravel() * pitch + gap / 2
+    origins[:, 1] = cell_y.ravel() * pitch + gap / 2
+    vertices = (origins[:, None, :] + CUBE_CORNERS * np.array([width, width, height])).reshape(-1, 3)
+    offsets = np.arange(columns * rows, dtype=np.int32)[:, None, None] * len(CUBE_CORNERS)
+    faces = (CUBE_FACES[None, :, :] + offsets).reshape(-1, 3)
+    return vertices, faces
+
+
+def _generate_grid_shell(columns: int, rows: int, pitch: float, height: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Closed box over a (columns + 1) x (rows + 1) vertex lattice, wound like CUBE_FACES"""
+    nx, ny = columns + 1, rows + 1
+    lattice_x, lattice_y = np.meshgrid(np.arange(nx) * pitch, np.arange(ny) * pitch)
+    bottom = np.stack([lattice_x.ravel(), lattice_y.ravel(), np.zeros(nx * ny)], axis=1)
+    vertices = np.concatenate([bottom, bottom + np.array([0.0, 0.0, height])])
+    top = nx * ny  # Offset of a lattice point's top vertex
+
+    def lattice(i, j):
+        return np.asarray(j, dtype=np.int32) * nx + np.asarray(i, dtype=np.int32)
+
+    # Cells row by row: bottom pair (facing -z), then top pair (facing +z)
+    cell_i, cell_j = (a.ravel() for a in np.meshgrid(np.arange(columns), np.arange(rows)))
+    c0, c1, c2, c3 = lattice(cell_i, cell_j), lattice(cell_i + 1, cell_j), lattice(cell_i + 1, cell_j + 1), lattice(cell_i, cell_j + 1)
+    cells = np.stack([
+        np.stack([c0, c2, c1], axis=1), np.stack([c0, c3, c2], axis=1),
+        np.stack([c0, c1, c2], axis=1) + top, np.stack([c0, c2, c3], axis=1) + top,
+    ], axis=1).reshape(-1, 3)
+
+    def side(a, b):
+        """Quad from bottom edge a -> b up to the top, facing right of a -> b seen from above"""
+        return np.stack([np.stack([a, b, b + top], axis=1), np.stack([a, b + top, a + top], axis=1)], axis=1).reshape(-1, 3)
+
+    i, j = np.arange(columns), np.arange(rows)
+    sides = [
+        side(lattice(i, 0), lattice(i + 1, 0)),                  # front (-y)
+        side(lattice(i + 1, rows), lattice(i, rows)),            # back (+y)
+        side(lattice(0, j + 1), lattice(0, j)),                  # left (-x)
+        side(lattice(columns, j), lattice(columns, j + 1)),      # right (+x)
+    ]
+    return vertices, np.concatenate([cells] + sides).astype(np.int32)
+
+
+def encode_binary_stl(vertices: np.ndarray, faces: np.ndarray, normals: np.ndarray) -> bytes:
+    """Binary STL for a mesh (80-byte header, face count, 50 bytes per face)"""
+    records = np.zeros(len(faces), dtype=STL_RECORD)
+    records['normal'] = normals
+    records['vertices'] = np.asarray(vertices)[np.asarray(faces)]
+    header = b'Procedural grid'.ljust(80, b' ')
+    return header + np.uint32(len(faces)).astype('<u4').tobytes() + records.tobytes()
+
+
+def compute_top_bounds(vertices: np.ndarray, faces: np.ndarray, normals: np.ndarray) -> np.ndarray:
+    """
+    XY bounds of the near-horizontal (top) faces, matching the frontend viewer.
+    Falls back to the vertex bounding box if no top faces are found.
+    Returns: float64 array [minX, minY, maxX, maxY]
+    """
+    top_mask = np.abs(normals[:, 2]) > 0.5
+    if np.any(top_mask):
+        top_xy = vertices[faces[top_mask].ravel(), :2]
+    else:
+        top_xy = vertices[:, :2]
+    mins = top_xy.min(axis=0)
+    maxs = top_xy.max(axis=0)
+    return np.array([mins[0], mins[1], maxs[0], maxs[1]], dtype=np.float64)
+
+
+def compute_face_normals(vertices: np.ndarray, faces: np.ndarray) -> np.ndarray:
+    """Unit face normals (zero-area faces keep a zero normal)"""
+    tri_verts = vertices[faces]
+    normals = np.cross(tri_verts[:, 1] - tri_verts[:, 0], tri_verts[:, 2] - tri_verts[:, 0])
+    norm_lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    norm_lengths = np.where(norm_lengths == 0, 1, norm_lengths)
+    return normals / norm_lengths
+
+
+class GridTemplate:
+    """
+    Pre-parsed grid mesh for one grid size (arrays may be read-only memory maps).
+    size is the column count; rows differs from it only for rectangular grids.
+    Procedural templates have no stl_path, and stl_sha256 hashes the generator parameters.
+    """
+
+    def __init__(self, size: int, stl_path: Optional[str], stl_sha256: str, arrays: Dict[str, np.ndarray],
+                 rows: Optional[int] = None, procedural: bool = False):
+        self.size = size
+        self.rows = rows or size
+        self.procedural = procedural
+        self.stl_path = stl_path
+        self.stl_sha256 = stl_sha256
+        self.vertices = arrays['vertices']
+        self.faces = arrays['faces']
+        self.normals = arrays['normals']
+        self.centroids = arrays['centroids']
+        self.top_bounds = arrays['top_bounds']
+
+    @property
+    def template_id(self) -> str:
+        """Stable identifier for this template's geometry"""
+        return f"{self.size}x{self.rows}-{self.stl_sha256[:16]}"
+
+    @property
+    def num_faces(self) -> int:
+        return len(self.faces)
+
+    @classmethod
+    def from_mesh(cls, size: int, stl_path: Optional[str], stl_sha256: str, vertices: np.ndarray, faces: np.ndarray,
+                  rows: Optional[int] = None, procedural: bool = False) -> 'GridTemplate':
+        """Build the derived arrays from a parsed (and repaired) mesh"""
+        vertices = np.ascontiguousarray(vertices, dtype=np.float64)
+        faces = np.ascontiguousarray(faces, dtype=np.int32)
+        normals = compute_face_normals(vertices, faces)
+        arrays = {
+            'vertices': vertices,
+            'faces': faces,
+            'normals': normals,
+            'centroids': vertices[faces].mean(axis=1),
+            'top_bounds': compute_top_bounds(vertices, faces, normals),
+        }
+        return cls(size, stl_path, stl_sha256, arrays, rows=rows, procedural=procedural)
+
+
+class GridTemplateStore:
+    """
+    Loads grid templates from stl_files/ and caches them on disk as .npy files.
+    The cache directory is keyed by the STL content hash, so replacing an STL via
+    the admin panel produces a fresh cache entry instead of serving stale geometry.
+    """
+
+    def __init__(self, stl_dir: str, loader: Callable[[bytes], Tuple[np.ndarray, np.ndarray]], cache_dir: Optional[str] = None,
+                 max_entries: int = TEMPLATE_CACHE_ENTRIES, on_evict: Optional[Callable[[str], None]] = None):
+        self.stl_dir = stl_dir
+        self.cache_dir = cache_dir or os.path.join(stl_dir, '.template_cache')
+        self.max_entries = max_entries
+        self._loader = loader
+        self._on_evict = on_evict
+        self._templates: Dict[int, GridTemplate] = {}
+        self._stat_keys: Dict[int, Tuple[int, int]] = {}
+        self._procedural: 'OrderedDict[tuple, GridTemplate]' = OrderedDict()
+        self._dimensions: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def stl_path(self, size: int) -> str:
+        return os.path.join(self.stl_dir, f'{size}x{size}_grid.stl')
+
+    def has_stl(self, size: int) -> bool:
+        return os.path.exists(self.stl_path(size))
+
+    def has_template(self, size: int) -> bool:
+        return self.has_stl(size) or is_valid_grid_size(size)
+
+    def get(self, size: int) -> GridTemplate:
+        """
+        Get the template for a grid size, parsing the STL only on first use.
+        Sizes without an uploaded STL get the procedural grid.
+        Raises FileNotFoundError if there is no STL and the size is out of range.
+        """
+        stl_path = self.stl_path(size)
+        try:
+            stat = os.stat(stl_path)
+        except FileNotFoundError:
+            if not is_valid_grid_size(size):
+                raise
+            return self.get_procedural(size)
+        stat_key = (stat.st_mtime_ns, stat.st_size)
+
+        template = self._templates.get(size)
+        if template is not None and self._stat_keys.get(size) == stat_key:
+            return template
+
+        with self._lock:
+            template = self._templates.get(size)
+            if template is not None and self._stat_keys.get(size) == stat_key:
+                return template
+            template = self._load(size, stl_path)
+            self._templates[size] = template
+            self._stat_keys[size] = stat_key
+        self.prune()
+        return template
+
+    def procedural_dimensions(self, columns: int) -> Tuple[float, float]:
+        """
+        (pitch, height) for a generated grid: measured from the uploaded template nearest
+        in size (larger on a tie) so every grid size shares the uploads' scale
+        """
+        uploaded = [size for size in SUPPORTED_GRID_SIZES if self.has_stl(size)]
+        pitch, height = DEFAULT_GRID_PITCH, DEFAULT_GRID_HEIGHT
+        if uploaded:
+            reference = self.get(min(uploaded, key=lambda size: (abs(size - columns), -size)))
+            dimensions = self._dimensions.get(reference.template_id)
+            if dimensions is None:
+                z = np.asarray(reference.vertices[:, 2])
+                dimensions = ((reference.top_bounds[2] - reference.top_bounds[0]) / reference.size,
+                              float(z.max() - z.min()))
+                self._dimensions[reference.template_id] = dimensions
+            pitch, height = dimensions
+        return (GRID_PITCH if GRID_PITCH is not None else float(pitch),
+                GRID_HEIGHT if GRID_HEIGHT is not None else float(height))
+
+    def get_procedural(self, columns: int, rows: Optional[int] = None, pitch: Optional[float] = None,
+                       gap: float = GRID_GAP, height: Optional[float] = None) -> GridTemplate:
+        """
+        Generated columns x rows grid (see generate_grid_mesh), cached in memory and on disk
+        like a parsed STL. pitch and height default to procedural_dimensions(columns).
+        Raises ValueError for out-of-range sizes or dimensions.
+        """
+        rows = rows or columns
+        if pitch is None or height is None:
+            measured_pitch, measured_height = self.procedural_dimensions(columns)
+            pitch = measured_pitch if pitch is None else pitch
+            height = measured_height if height is None else height
+        key = (columns, rows, float(pitch), float(gap), float(height))
+        with self._lock:
+            template = self._procedural.get(key)
+            if template is not None:
+                self._procedural.move_to_end(key)
+                return template
+
+        params_sha256 = hashlib.sha256(f'procedural-v{PROCEDURAL_VERSION}:{key!r}'.encode('utf-8')).hexdigest()
+        entry_dir = os.path.join(self.cache_dir, f'{columns}x{rows}-{params_sha256[:16]}')
+        arrays = self._read_cache(entry_dir)
+        if arrays is not None:
+            self._touch(entry_dir)
+            template = GridTemplate(columns, None, params_sha256, arrays, rows=rows, procedural=True)
+        else:
+            vertices, faces = generate_grid_mesh(columns, rows, pitch, gap, height)
+            template = self._cache_template(
+                entry_dir,
+                GridTemplate.from_mesh(columns, None, params_sha256, vertices, faces, rows=rows, procedural=True)
+            )
+
+        with self._lock:
+            self._procedural[key] = template
+            self._procedural.move_to_end(key)
+            while len(self._procedural) > PROCEDURAL_CACHE_SIZE:
+                self._procedural.popitem(last=False)
+        if arrays is None:
+            self.prune()
+        return template
+
+    def derived_file(self, template: GridTemplate, filename: str, build: Callable[[], bytes]) -> str:
+        """
+        Path of a file derived from a template (e.g. an encoded mesh), stored next to its
+        arrays in cache_dir and written once by whichever worker asks first
+        """
+        path = os.path.join(self.cache_dir, template.template_id, filename)
+        if not os.path.exists(path):
+            body = build()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.tmp-{uuid.uuid4().hex[:8]}'
+            with open(tmp_path, 'wb') as f:
+                f.write(body)
+            # Renamed into place so no reader sees a partial file (a concurrent writer's copy is identical)
+            os.replace(tmp_path, path)
+        return path
+
+    def prune(self) -> int:
+        """
+        Delete the least recently used cache entries beyond max_entries, except those this
+        process holds in memory (a deleted entry is simply rebuilt by whoever needs it next).
+        Returns the number of entries deleted.
+        """
+        with self._lock:
+            in_use = {template.template_id for template in self._templates.values()}
+            in_use.update(template.template_id for template in self._procedural.values())
+        try:
+            entries = [entry for entry in os.scandir(self.cache_dir) if entry.is_dir() and '.tmp-' not in entry.name]
+        except FileNotFoundError:
+            return 0
+        entries.sort(key=lambda entry: entry.stat().st_mtime_ns, reverse=True)
+        deleted = 0
+        for entry in entries[self.max_entries:]:
+            if entry.name in in_use:
+                continue
+            if self._on_evict is not None:
+                self._on_evict(entry.path)
+            shutil.rmtree(entry.path, ignore_errors=True)
+            deleted += 1
+        if deleted:
+            print(f"🧹 Pruned {deleted} grid template cache entr{'y' if deleted == 1 else 'ies'}")
+        return deleted
+
+    def invalidate(self, size: Optional[int] = None):
+        """Drop in-memory templates (e.g. after an admin STL upload)"""
+        with self._lock:
+            if size is None:
+                self._templates.clear()
+                self._stat_keys.clear()
+            else:
+                self._templates.pop(size, None)
+                self._stat_keys.pop(size, None)
+
+    def preload(self, sizes=SUPPORTED_GRID_SIZES):
+        """Load every available template (called once at startup)"""
+        for size in sizes:
+            if not self.has_template(size):
+                continue
+            try:
+                template = self.get(size)
+                print(f"✅ Grid template {size}x{size} ready ({len(template.vertices)} vertices, {template.num_faces} faces)")
+            except Exception as e:
+                print(f"⚠️  Could not preload grid template {size}x{size}: {e}")
+
+    def _load(self, size: int, stl_path: str) -> GridTemplate:
+        with open(stl_path, 'rb') as f:
+            stl_bytes = f.read()
+        stl_sha256 = hashlib.sha256(stl_bytes).hexdigest()
+        entry_dir = os.path.join(self.cache_dir, f'{size}x{size}-{stl_sha256[:16]}')
+
+        arrays = self._read_cache(entry_dir)
+        if arrays is not None:
+            self._touch(entry_dir)
+            return GridTemplate(size, stl_path, stl_sha256, arrays)
+
+        print(f"⚙️  Parsing grid template {size}x{size} from {stl_path}")
+        vertices, faces = self._loader(stl_bytes)
+        return self._cache_template(entry_dir, GridTemplate.from_mesh(size, stl_path, stl_sha256, vertices, faces))
+
+    @staticmethod
+    def _touch(entry_dir: str):
+        # Entry mtimes order prune(); a read-only filesystem just loses the ordering
+        try:
+            os.utime(entry_dir)
+        except OSError:
+            pass
+
+    def _cache_template(self, entry_dir: str, template: GridTemplate) -> GridTemplate:
+        try:
+            self._write_cache(entry_dir, template)
+            # Re-open through the cache so this worker shares pages with the others
+            arrays = self._read_cache(entry_dir)
+            if arrays is not None:
+                template = GridTemplate(template.size, template.stl_path, template.stl_sha256, arrays,
+                                        rows=template.rows, procedural=template.procedural)
+        except OSError as e:
+            print(f"⚠️  Could not write grid template cache for {template.size}x{template.rows}: {e}")
+        return template
+
+    @staticmethod
+    def _read_cache(entry_dir: str) -> Optional[Dict[str, np.ndarray]]:
+        if not os.path.isdir(entry_dir):
+            return None
+        try:
+            return {
+                name: np.load(os.path.join(entry_dir, f'{name}.npy'), mmap_mode='r')
+                for name in TEMPLATE_ARRAYS
+            }
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Ignoring unreadable grid template cache {entry_dir}: {e}")
+            return None
+
+    def _write_cache(self, entry_dir: str, template: GridTemplate):
+        # Write into a private directory and rename it into place so concurrent
+        # workers never see a partially written entry
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_dir = f'{entry_dir}.tmp-{uuid.uuid4().hex[:8]}'
+        os.makedirs(tmp_dir)
+        try:
+            for name in TEMPLATE_ARRAYS:
+                np.save(os.path.join(tmp_dir, f'{name}.npy'), getattr(template, name))
+            try:
+                os.rename(tmp_dir, entry_dir)
+            except OSError:
+                if not os.path.isdir(entry_dir):
+                    raise
+                # Another worker finished first (its entry is identical), unless the directory
+                # only holds derived files written after a prune() removed the arrays
+                if not os.path.exists(os.path.join(entry_dir, f'{TEMPLATE_ARRAYS[0]}.npy')):
+                    for name in TEMPLATE_ARRAYS:
+                        os.replace(os.path.join(tmp_dir, f'{name}.npy'), os.path.join(entry_dir, f'{name}.npy'))
+        finally:
+            if os.path.isdir(tmp_dir):
+                shutil.rmtree(tmp_dir, ignore_errors=True)
@@ -0,0 +1,151 @@
+"""
+Generation Jobs
+Runs model generation on a bounded background thread pool so slow requests never
+tie up a gunicorn worker. Job state and artifacts live on disk, so any worker
+process can answer a status poll for a job another worker accepted.
+"""
+import json
+import math
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+class QueueFullError(Exception):
+    """Raised by JobQueue.submit when the queue is saturated"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Generation queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class JobQueue:
+    """
+    Background generation jobs stored under jobs_dir/<job_id>/:
+    job.json holds the status document, the artifact is written next to it.
+    """
+
+    def __init__(self, jobs_dir: str, max_workers: int, max_pending: int, ttl_seconds: int):
+        self.jobs_dir = jobs_dir
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.ttl_seconds = ttl_seconds
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0  # Queued or running in this process
+        self._avg_duration = 5.0  # Seconds, moving average used for Retry-After
+        self._lock = threading.Lock()
+        os.makedirs(self.jobs_dir, exist_ok=True)
+
+    def _job_dir(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, job_id)
+
+    def artifact_path(self, job_id: str) -> str:
+        return os.path.join(self._job_dir(job_id), 'artifact')
+
+    def _write_status(self, job_id: str, status: Dict[str, Any]):
+        path = os.path.join(self._job_dir(job_id), 'job.json')
+        tmp_path = f'{path}.tmp-{uuid.uuid4().hex[:8]}'
+        with open(tmp_path, 'w') as f:
+            json.dump(status, f)
+        os.replace(tmp_path, path)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Status document for a job, or None if it is unknown (or expired)"""
+        # Job ids are uuid4 hex; anything else could escape jobs_dir
+        if len(job_id) != 32 or not all(c in '0123456789abcdef' for c in job_id):
+            return None
+        try:
+            with open(os.path.join(self._job_dir(job_id), 'job.json'), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def submit(self, run: Callable[[str], None], details: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Queue run(artifact_path), which must write the artifact to artifact_path.
+        Raises QueueFullError if max_pending jobs are already queued or running.
+        Returns: job id
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise QueueFullError(max(1, math.ceil(self._avg_duration * self._pending / self.max_workers)))
+            self._pending += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='generation-job')
+
+        job_id = uuid.uuid4().hex
+        status = dict(details or {})
+        status.update({'job_id': job_id, 'status': 'queued', 'created_at': time.time()})
+        try:
+            os.makedirs(self._job_dir(job_id))
+            self._write_status(job_id, status)
+            self._executor.submit(self._run, job_id, status, run)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+        self._sweep_expired()
+        return job_id
+
+    def _run(self, job_id: str, status: Dict[str, Any], run: Callable[[str], None]):
+        started = time.time()
+        status.update({'status': 'running', 'started_at': started})
+        try:
+            self._write_status(job_id, status)
+            run(self.artifact_path(job_id))
+            status.update({'status': 'done', 'artifact_size': os.path.getsize(self.artifact_path(job_id))})
+        except Exception as e:
+            print(f"❌ Generation job {job_id} failed: {e}")
+            status.update({'status': 'failed', 'error': str(e)})
+        finished = time.time()
+        status['finished_at'] = finished
+        try:
+            self._write_status(job_id, status)
+        except OSError as e:
+            print(f"⚠️  Could not record status of job {job_id}: {e}")
+        with self._lock:
+            self._pending -= 1
+            self._avg_duration = 0.8 * self._avg_duration + 0.2 * (finished - started)
+
+    def _sweep_expired(self):
+        """Delete job folders older than ttl_seconds"""
+        cutoff = time.time() - self.ttl_seconds
+        try:
+            entries = list(os.scandir(self.jobs_dir))
+        except OSError:
+            return
+        for entry in entries:
+            try:
+                if entry.is_dir() and entry.stat().st_mtime < cutoff:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'pending': self._pending,
+                'max_pending': self.max_pending,
+                'workers': self.max_workers,
+                'avg_duration_seconds': round(self._avg_duration, 3),
+            }
+
+
+# Global instance
+_job_queue = None
+
+def get_job_queue() -> JobQueue:
+    """Get or create the job queue (configured from environment variables)"""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue(
+            jobs_dir=os.getenv('JOBS_DIR', 'jobs'),
+            max_workers=int(os.getenv('JOB_WORKERS', 2)),
+            max_pending=int(os.getenv('JOB_QUEUE_LIMIT', 8)),
+            ttl_seconds=int(os.getenv('JOB_TTL_SECONDS', 3600)),
+        )
+    return _job_queue
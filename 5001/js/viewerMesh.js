@@ -0,0 +1,127 @@
+/**
+ * Viewer Mesh Decoder
+ * Decodes the compact grid mesh served by /get-mesh/<size> (see viewer_mesh.py for the layout)
+ */
+
+const VIEWER_MESH_MAGIC = 'AMSH';
+const VIEWER_MESH_VERSION = 1;
+const VIEWER_MESH_HEADER_SIZE = 64;
+const VIEWER_MESH_FLAG_INDEX_UINT32 = 1;
+const VIEWER_MESH_FLAG_PIXEL_INDEX = 2;
+const VIEWER_MESH_FLAG_PIXEL_UINT32 = 4;
+
+/**
+ * Decode a viewer mesh
+ * @param {ArrayBuffer} buffer - Response body of /get-mesh/<size>
+ * @returns {Object} { gridSize, positions (Float32Array), index, pixelIndex, imageWidth, imageHeight, topBounds }
+ */
+function decodeViewerMesh(buffer) {
+    const view = new DataView(buffer);
+    const magic = String.fromCharCode(view.getUint8(0), view.getUint8(1), view.getUint8(2), view.getUint8(3));
+    if (magic !== VIEWER_MESH_MAGIC || view.getUint16(4, true) !== VIEWER_MESH_VERSION) {
+        throw new Error('Not a viewer mesh');
+    }
+    const flags = view.getUint16(6, true);
+    const vertexCount = view.getUint32(8, true);
+    const faceCount = view.getUint32(12, true);
+    const gridSize = view.getUint16(16, true);
+    const imageWidth = view.getUint16(18, true);
+    const imageHeight = view.getUint16(20, true);
+    const floats = [];
+    for (let i = 0; i < 10; i++) {
+        floats.push(view.getFloat32(24 + i * 4, true));
+    }
+    const bboxMin = floats.slice(0, 3);
+    const bboxMax = floats.slice(3, 6);
+
+    let offset = VIEWER_MESH_HEADER_SIZE;
+    const take = (ArrayType, count) => {
+        const array = new ArrayType(buffer, offset, count);
+        offset += Math.ceil(array.byteLength / 4) * 4;
+        return array;
+    };
+
+    const quantized = take(Uint16Array, vertexCount * 3);
+    const positions = new Float32Array(vertexCount * 3);
+    for (let axis = 0; axis < 3; axis++) {
+        const scale = (bboxMax[axis] - bboxMin[axis]) / 65535;
+        for (let i = axis; i < positions.length; i += 3) {
+            positions[i] = bboxMin[axis] + quantized[i] * scale;
+        }
+    }
+    const index = take(flags & VIEWER_MESH_FLAG_INDEX_UINT32 ? Uint32Array : Uint16Array, faceCount * 3);
+    const pixelIndex = flags & VIEWER_MESH_FLAG_PIXEL_INDEX
+        ? take(flags & VIEWER_MESH_FLAG_PIXEL_UINT32 ? Uint32Array : Uint16Array, faceCount)
+        : null;
+
+    return { gridSize, positions, index, pixelIndex, imageWidth, imageHeight, topBounds: floats.slice(6, 10) };
+}
+
+/**
+ * Build a non-indexed THREE.BufferGeometry (one vertex per face corner, flat normals) so
+ * faces can be colored individually, like the geometry STLLoader produces
+ * @param {Object} mesh - Result of decodeViewerMesh
+ * @returns {THREE.BufferGeometry}
+ */
+function viewerMeshToGeometry(mesh) {
+    const geometry = new THREE.BufferGeometry();
+    geometry.setAttribute('position', new THREE.BufferAttribute(mesh.positions, 3));
+    geometry.setIndex(new THREE.BufferAttribute(mesh.index, 1));
+    const flat = geometry.toNonIndexed();
+    flat.computeVertexNormals();
+    return flat;
+}
+
+/**
+ * Parse a grid file the viewer loaded: a viewer mesh (/get-mesh) or a binary STL (/get-stl)
+ * @param {ArrayBuffer} buffer - File contents
+ * @returns {Object} { geometry (non-indexed THREE.BufferGeometry), pixelIndex, imageWidth, imageHeight };
+ *          pixelIndex is null for an STL
+ */
+function parseGridFile(buffer) {
+    const bytes = new Uint8Array(buffer, 0, Math.min(4, buffer.byteLength));
+    if (String.fromCharCode(...bytes) === VIEWER_MESH_MAGIC) {
+        const mesh = decodeViewerMesh(buffer);
+        return {
+            geometry: viewerMeshToGeometry(mesh),
+            pixelIndex: mesh.pixelIndex,
+            imageWidth: mesh.imageWidth,
+            imageHeight: mesh.imageHeight
+        };
+    }
+    let geometry = new THREE.STLLoader().parse(buffer);
+    // Ensure per-triangle unique vertices so colors don't bleed across shared vertices
+    if (geometry.index) {
+        geometry = geometry.toNonIndexed();
+    }
+    return { geometry, pixelIndex: null, imageWidth: 0, imageHeight: 0 };
+}
+
+/**
+ * Fetch the grid for a size: the compact viewer mesh, or the STL if the mesh is unavailable
+ * @param {Function} apiUrl - Maps a path to the backend URL (getApiUrl)
+ * @param {number} size - Grid size
+ * @param {Object} init - fetch() options
+ * @returns {Promise<File>} {size}x{size}.gridmesh or {size}x{size}_grid.stl; both load through parseGridFile
+ */
+async function fetchGridFile(apiUrl, size, init = {}) {
+    try {
+        const response = await fetch(apiUrl(`/get-mesh/${size}`), init);
+        if (response.ok) {
+            const blob = await response.blob();
+            return new File([blob], `${size}x${size}.gridmesh`, { type: 'model/x-grid-mesh' });
+        }
+        console.warn(`Viewer mesh for ${size}×${size} unavailable (${response.status}), loading the STL`);
+    } catch (error) {
+        console.warn(`Viewer mesh for ${size}×${size} failed to load, loading the STL:`, error);
+    }
+    const response = await fetch(apiUrl(`/get-stl/${size}`), init);
+    if (!response.ok) {
+        throw new Error(`STL file not found for ${size}×${size} grid (${response.status} ${response.statusText})`);
+    }
+    const blob = await response.blob();
+    if (blob.size === 0) {
+        throw new Error(`STL file is empty for ${size}×${size}`);
+    }
+    return new File([blob], `${size}x${size}_grid.stl`, { type: 'application/octet-stream' });
+}
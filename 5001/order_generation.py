@@ -0,0 +1,143 @@
+"""
+Order Model Generation
+Checkout only stores the inputs of an order; the printable model is generated in the
+background afterwards. Each order folder holds a generation.json with its state
+(pending, running, done, failed) so any process can report or wait for it.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Optional
+
+
+GENERATION_STATE_FILE = 'generation.json'
+MODEL_FILENAME = 'model.obj'
+
+
+class OrderModelBuilder:
+    """
+    Background builder for orders/<order_id>/model.obj.
+    build(order_id, order_dir, state) must write the model into order_dir.
+    A 'running' state younger than stale_seconds belongs to a live build (possibly in
+    another process), which is waited for rather than duplicated.
+    """
+
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, orders_dir: str, build: Callable[[str, str, Dict[str, Any]], None], max_workers: int = 1,
+                 stale_seconds: float = 600):
+        self.orders_dir = orders_dir
+        self._build = build
+        self.stale_seconds = stale_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='order-model')
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def order_dir(self, order_id: str) -> str:
+        return os.path.join(self.orders_dir, order_id)
+
+    def model_path(self, order_id: str) -> str:
+        return os.path.join(self.order_dir(order_id), MODEL_FILENAME)
+
+    def read_state(self, order_id: str) -> Dict[str, Any]:
+        """Generation state of an order (orders created before deferred generation count as done)"""
+        try:
+            with open(os.path.join(self.order_dir(order_id), GENERATION_STATE_FILE), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            if os.path.exists(self.model_path(order_id)):
+                return {'status': 'done'}
+            return {'status': 'missing'}
+
+    def write_state(self, order_id: str, state: Dict[str, Any]):
+        state = dict(state, updated_at=time.time())
+        path = os.path.join(self.order_dir(order_id), GENERATION_STATE_FILE)
+        tmp_path = f'{path}.tmp-{uuid.uuid4().hex[:8]}'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    def schedule(self, order_id: str) -> Future:
+        """Start generating an order's model unless this process is already on it"""
+        with self._lock:
+            future = self._futures.get(order_id)
+            if future is None:
+                future = self._executor.submit(self._run, order_id)
+                self._futures[order_id] = future
+                future.add_done_callback(lambda _: self._forget(order_id))
+            return future
+
+    def _is_live_build(self, state: Dict[str, Any]) -> bool:
+        return state.get('status') == 'running' and time.time() - state.get('updated_at', 0) < self.stale_seconds
+
+    def _running_elsewhere(self, order_id: str, state: Dict[str, Any]) -> bool:
+        with self._lock:
+            return self._is_live_build(state) and order_id not in self._futures
+
+    def _forget(self, order_id: str):
+        with self._lock:
+            self._futures.pop(order_id, None)
+
+    def _run(self, order_id: str):
+        state = self.read_state(order_id)
+        if state.get('status') == 'done' and os.path.exists(self.model_path(order_id)):
+            return
+        if self._is_live_build(state):
+            # This process runs one build per order at a time, so another process has it
+            print(f"⏳ Model for order {order_id} is being generated by another process")
+            return
+        started = time.time()
+        state.update({'status': 'running', 'error': None})
+        self.write_state(order_id, state)
+        try:
+            self._build(order_id, self.order_dir(order_id), state)
+            state.update({'status': 'done', 'duration_seconds': round(time.time() - started, 3)})
+            print(f"✅ Model generated for order {order_id}")
+        except Exception as e:
+            print(f"❌ Model generation failed for order {order_id}: {e}")
+            state.update({'status': 'failed', 'error': str(e)})
+        self.write_state(order_id, state)
+
+    def ensure(self, order_id: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Make sure the model exists, generating it now if needed (a failed earlier attempt
+        is retried) or waiting for the build another process is running.
+        Waits up to timeout seconds (None waits indefinitely).
+        Returns: the generation state afterwards
+        """
+        if not order_id or os.path.basename(order_id) != order_id or order_id.startswith('.'):
+            return {'status': 'missing'}
+        state = self.read_state(order_id)
+        if state.get('status') == 'done' and os.path.exists(self.model_path(order_id)):
+            return state
+        if state.get('status') == 'missing':
+            return state
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if not self._running_elsewhere(order_id, state):
+            future = self.schedule(order_id)
+            try:
+                future.result(timeout=timeout)
+            except FutureTimeoutError:
+                return self.read_state(order_id)  # Still running; the state file says how far it got
+        state = self.read_state(order_id)
+        while self._is_live_build(state) and (deadline is None or time.monotonic() < deadline):
+            time.sleep(self.POLL_INTERVAL)
+            state = self.read_state(order_id)
+        return state
+
+
+# Global instance, created by the server (which owns the generation pipeline)
+_order_model_builder: Optional[OrderModelBuilder] = None
+
+def set_order_model_builder(builder: OrderModelBuilder):
+    global _order_model_builder
+    _order_model_builder = builder
+
+
+def get_order_model_builder() -> Optional[OrderModelBuilder]:
+    """Get the order model builder, or None outside the server process"""
+    return _order_model_builder
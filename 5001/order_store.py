@@ -0,0 +1,168 @@
+"""
+Order Store
+SQLite (WAL) repository for album builder orders, replacing orders.json. Each order is one
+row holding its JSON document, with the fields the admin filters on copied into indexed
+columns, so creating or updating an order touches a single row and concurrent gunicorn
+workers no longer overwrite each other's changes.
+"""
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    order_id TEXT PRIMARY KEY,
+    shopify_order_id TEXT,
+    completed INTEGER NOT NULL DEFAULT 0,
+    timestamp TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_orders_shopify_order_id ON orders (shopify_order_id);
+CREATE INDEX IF NOT EXISTS idx_orders_completed ON orders (completed);
+CREATE INDEX IF NOT EXISTS idx_orders_timestamp ON orders (timestamp);
+CREATE TABLE IF NOT EXISTS order_store_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def _columns(order: Dict[str, Any]) -> tuple:
+    shopify_order_id = order.get('shopify_order_id')
+    return (
+        order['order_id'],
+        str(shopify_order_id) if shopify_order_id is not None else None,
+        int(bool(order.get('completed'))),
+        order.get('timestamp'),
+        json.dumps(order),
+    )
+
+
+class OrderStore:
+    """Order documents keyed by order_id (the same dicts orders.json used to hold)"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        with self._transaction() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _transaction(self, immediate: bool = False):
+        """
+        Short-lived connection committing on success (connections are not shared across threads).
+        immediate takes the write lock up front, for read-modify-write sequences.
+        """
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            with conn:
+                if immediate:
+                    conn.execute('BEGIN IMMEDIATE')
+                yield conn
+        finally:
+            conn.close()
+
+    def add(self, order: Dict[str, Any]):
+        """Insert (or replace) an order document; it must have an order_id"""
+        with self._transaction() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO orders (order_id, shopify_order_id, completed, timestamp, data) '
+                'VALUES (?, ?, ?, ?, ?)',
+                _columns(order)
+            )
+
+    def get(self, order_id: str) -> Optional[Dict[str, Any]]:
+        with self._transaction() as conn:
+            row = conn.execute('SELECT data FROM orders WHERE order_id = ?', (order_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def find_by_shopify_order_id(self, shopify_order_id: str) -> Optional[Dict[str, Any]]:
+        with self._transaction() as conn:
+            row = conn.execute(
+                'SELECT data FROM orders WHERE shopify_order_id = ? LIMIT 1', (str(shopify_order_id),)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list(self, completed: Optional[bool] = None, limit: Optional[int] = None, offset: int = 0) -> List[Dict[str, Any]]:
+        """Orders newest first, optionally only (un)completed ones"""
+        where, params = '', []
+        if completed is not None:
+            where = 'WHERE completed = ?'
+            params.append(int(completed))
+        params.extend([limit if limit is not None else -1, offset])
+        with self._transaction() as conn:
+            rows = conn.execute(
+                f'SELECT data FROM orders {where} ORDER BY timestamp DESC, rowid DESC LIMIT ? OFFSET ?', params
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def update(self, order_id: str, fields: Dict[str, Any]) -> bool:
+        """
+        Merge fields into one order
+        Returns: False if the order does not exist
+        """
+        with self._transaction(immediate=True) as conn:
+            row = conn.execute('SELECT data FROM orders WHERE order_id = ?', (order_id,)).fetchone()
+            if row is None:
+                return False
+            order = json.loads(row[0])
+            order.update(fields)
+            order['order_id'] = order_id
+            conn.execute(
+                'UPDATE orders SET shopify_order_id = ?, completed = ?, timestamp = ?, data = ? WHERE order_id = ?',
+                _columns(order)[1:] + (order_id,)
+            )
+        return True
+
+    def delete(self, order_id: str) -> bool:
+        with self._transaction() as conn:
+            return conn.execute('DELETE FROM orders WHERE order_id = ?', (order_id,)).rowcount == 1
+
+    def migrate_from_json(self, json_path: str) -> int:
+        """
+        One-shot import of a legacy orders.json (renamed to *.migrated afterwards).
+        Only the first process to get here imports it.
+        Returns: number of orders imported
+        """
+        if not os.path.exists(json_path):
+            return 0
+        with self._transaction(immediate=True) as conn:
+            if conn.execute("SELECT 1 FROM order_store_meta WHERE key = 'migrated_from_json'").fetchone():
+                return 0
+            try:
+                with open(json_path, 'r') as f:
+                    orders = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️  Could not read {json_path} for migration: {e}")
+                return 0
+            orders = [order for order in orders if order.get('order_id')]
+            # INSERT OR IGNORE: orders created since (by a process that already used the store) win
+            conn.executemany(
+                'INSERT OR IGNORE INTO orders (order_id, shopify_order_id, completed, timestamp, data) '
+                'VALUES (?, ?, ?, ?, ?)',
+                [_columns(order) for order in orders]
+            )
+            conn.execute(
+                "INSERT INTO order_store_meta (key, value) VALUES ('migrated_from_json', ?)", (str(time.time()),)
+            )
+        os.replace(json_path, json_path + '.migrated')
+        print(f"📦 Migrated {len(orders)} order(s) from {json_path} to {self.db_path}")
+        return len(orders)
+
+
+# Global instance
+_order_store = None
+
+def get_order_store() -> OrderStore:
+    """Get or create the order store, importing orders.json on first use"""
+    global _order_store
+    if _order_store is None:
+        store = OrderStore(os.getenv('ORDERS_DB', 'orders.db'))
+        store.migrate_from_json(os.getenv('ORDERS_JSON', 'orders.json'))
+        _order_store = store
+    return _order_store
@@ -0,0 +1,80 @@
+"""
+Page Cache
+Renders the storefront HTML pages with their startup data (content, prices, images,
+variants) inlined as window.__BOOTSTRAP__, so a first visit needs no extra API round
+trips. Local script/stylesheet references are rewritten to fingerprinted asset URLs.
+A rendered page (and its gzip/brotli encodings) is reused until the HTML file, one of
+its sources or a referenced asset changes, and carries an ETag so repeat visitors get a 304.
+"""
+import hashlib
+import os
+import re
+import threading
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+from config_store import ConfigSnapshot
+from static_assets import AssetStore, compress_variants
+
+
+BOOTSTRAP_MARKER = b'</head>'
+ASSET_REFERENCE = re.compile(rb'((?:src|href)=")/((?:js)/[^"?#]+)(")')
+
+
+class RenderedPage(NamedTuple):
+    body: bytes
+    etag: str
+    encodings: Dict[str, bytes]  # Precompressed bodies by content encoding
+
+
+class PageCache:
+    """
+    sources() returns the current snapshot of every bootstrap entry; it is called per
+    request, so it must be cheap (ConfigDocument.get() costs one stat()).
+    """
+
+    def __init__(self, sources: Callable[[], Dict[str, ConfigSnapshot]], assets: Optional[AssetStore] = None):
+        self._sources = sources
+        self._assets = assets
+        # path -> (cache key, asset paths the page references, page)
+        self._pages: Dict[str, Tuple[tuple, Tuple[str, ...], RenderedPage]] = {}
+        self._lock = threading.Lock()
+        self.renders = 0
+
+    def _asset_urls(self, relpaths: Tuple[str, ...]) -> tuple:
+        return tuple(self._assets.url(relpath) for relpath in relpaths) if self._assets is not None else ()
+
+    def render(self, path: str) -> RenderedPage:
+        """
+        Rendered page for the HTML file at path.
+        Raises FileNotFoundError if the file is missing.
+        """
+        stat = os.stat(path)
+        sources = self._sources()
+        key = (stat.st_mtime_ns, stat.st_size) + tuple((name, snapshot.etag) for name, snapshot in sorted(sources.items()))
+        with self._lock:
+            cached = self._pages.get(path)
+        if cached is not None and cached[0] == key + self._asset_urls(cached[1]):
+            return cached[2]
+
+        with open(path, 'rb') as f:
+            html = f.read()
+        relpaths = ()
+        if self._assets is not None:
+            relpaths = tuple(dict.fromkeys(match.group(2).decode('utf-8') for match in ASSET_REFERENCE.finditer(html)))
+            html = ASSET_REFERENCE.sub(
+                lambda match: match.group(1) + self._assets.url(match.group(2).decode('utf-8')).encode('utf-8') + match.group(3),
+                html
+            )
+        # The snapshots already hold serialized JSON; "</" is escaped so no value can close the script tag
+        blob = b'{' + b','.join(
+            b'"' + name.encode('utf-8') + b'":' + snapshot.body for name, snapshot in sorted(sources.items())
+        ) + b'}'
+        script = b'<script>window.__BOOTSTRAP__=' + blob.replace(b'</', b'<\\/') + b';</script>\n'
+        index = html.find(BOOTSTRAP_MARKER)
+        body = html[:index] + script + html[index:] if index >= 0 else script + html
+        page = RenderedPage(body, hashlib.sha256(body).hexdigest()[:32], compress_variants(body))
+
+        with self._lock:
+            self._pages[path] = (key + self._asset_urls(relpaths), relpaths, page)
+            self.renders += 1
+        return page
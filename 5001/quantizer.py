@@ -0,0 +1,142 @@
+"""
+Palette Quantizer
+Maps RGB colors to the nearest palette entry using a precomputed lookup table
+over a reduced RGB cube, with exact resolution for cells that straddle a boundary
+"""
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# LUT value marking a cell whose colors do not all share one nearest palette entry
+AMBIGUOUS = 255
+
+
+def nearest_palette_indices(rgb_colors: np.ndarray, palette: np.ndarray) -> np.ndarray:
+    """
+    Exact nearest palette index for each color (Euclidean distance in RGB space).
+    Ties go to the lowest palette index, same as np.argmin.
+    """
+    diffs = rgb_colors.astype(np.int32)[:, np.newaxis, :] - palette.astype(np.int32)[np.newaxis, :, :]
+    distances = np.einsum('nkc,nkc->nk', diffs, diffs)
+    return np.argmin(distances, axis=1).astype(np.uint8)
+
+
+class PaletteQuantizer:
+    """
+    Nearest-color quantizer for an arbitrary palette (up to 255 colors).
+    Each LUT cell covers a (2^(8-bits))^3 block of RGB values. Nearest-palette regions
+    are convex, so a cell whose 8 corners share the same nearest entry maps entirely to
+    it; other cells are marked AMBIGUOUS and resolved exactly per color.
+    """
+
+    def __init__(self, palette: Sequence[Sequence[int]], names: Optional[Sequence[str]] = None, bits: int = 5):
+        self.palette = np.array(palette, dtype=np.uint8).reshape(-1, 3)
+        if not 0 < len(self.palette) < AMBIGUOUS:
+            raise ValueError(f"Palette must have between 1 and {AMBIGUOUS - 1} colors")
+        if not 1 <= bits <= 8:
+            raise ValueError("bits must be between 1 and 8")
+        self.names = list(names) if names else [f"Color {i}" for i in range(len(self.palette))]
+        self.bits = bits
+        self._shift = 8 - bits
+        self.lut = self._build_lut()
+
+    def _build_lut(self) -> np.ndarray:
+        cells = 1 << self.bits
+        step = 1 << self._shift
+        lows = np.arange(cells, dtype=np.int32) * step
+        # Channel values of every cell corner: [lo_0, hi_0, lo_1, hi_1, ...]
+        corner_values = np.stack([lows, lows + step - 1], axis=1).ravel()
+        r, g, b = np.meshgrid(corner_values, corner_values, corner_values, indexing='ij')
+        corner_colors = np.stack([r.ravel(), g.ravel(), b.ravel()], axis=1)
+        nearest = nearest_palette_indices(corner_colors, self.palette)
+        nearest = nearest.reshape(cells, 2, cells, 2, cells, 2)
+
+        lut = nearest[:, 0, :, 0, :, 0].copy()
+        corners = nearest.transpose(0, 2, 4, 1, 3, 5).reshape(cells, cells, cells, 8)
+        ambiguous = np.any(corners != lut[..., np.newaxis], axis=3)
+        lut[ambiguous] = AMBIGUOUS
+        return lut.ravel()
+
+    def quantize(self, rgb_colors: np.ndarray) -> np.ndarray:
+        """
+        Args:
+            rgb_colors: Array of shape (N, 3) with RGB values 0-255
+        Returns:
+            uint8 palette indices of shape (N,)
+        """
+        rgb = np.asarray(rgb_colors).reshape(-1, 3).astype(np.uint8, copy=False)
+        if len(rgb) == 0:
+            return np.zeros(0, dtype=np.uint8)
+        cell = ((rgb[:, 0].astype(np.int32) >> self._shift) << (2 * self.bits)) \
+            | ((rgb[:, 1].astype(np.int32) >> self._shift) << self.bits) \
+            | (rgb[:, 2].astype(np.int32) >> self._shift)
+        indices = self.lut[cell]
+        ambiguous = indices == AMBIGUOUS
+        if np.any(ambiguous):
+            indices[ambiguous] = nearest_palette_indices(rgb[ambiguous], self.palette)
+        return indices
+
+    def to_rgb(self, indices: np.ndarray) -> np.ndarray:
+        """Expand palette indices back to exact RGB triples"""
+        return self.palette[indices]
+
+    def color_counts(self, indices: np.ndarray) -> np.ndarray:
+        """Number of entries per palette color"""
+        return np.bincount(indices, minlength=len(self.palette))
+
+    def log_stats(self, indices: np.ndarray, unit: str = 'triangles'):
+        counts = self.color_counts(indices)
+        total = max(1, len(indices))
+        used = np.flatnonzero(counts)
+        print(f"📊 Quantization: Using {len(used)} out of {len(self.palette)} colors")
+        for idx in used:
+            print(f"   - {self.names[idx]}: {counts[idx]} {unit} ({counts[idx] / total * 100:.1f}%)")
+        missing = np.flatnonzero(counts == 0)
+        if len(missing):
+            print(f"⚠️  Warning: Missing colors: {[self.names[i] for i in missing]}")
+            print(f"   This is normal if the image doesn't contain those color ranges.")
+
+
+# Quantizers are cheap to keep around and expensive-ish to build, so cache by palette
+_quantizers: 'OrderedDict[Tuple, PaletteQuantizer]' = OrderedDict()
+_quantizers_lock = threading.Lock()
+_MAX_QUANTIZERS = 8
+
+
+def get_quantizer(palette: Sequence[Sequence[int]], names: Optional[Sequence[str]] = None) -> PaletteQuantizer:
+    """Get or create the quantizer for a palette"""
+    key = (tuple(tuple(int(c) for c in color) for color in palette), tuple(names) if names else None)
+    with _quantizers_lock:
+        quantizer = _quantizers.get(key)
+        if quantizer is not None:
+            _quantizers.move_to_end(key)
+            return quantizer
+    quantizer = PaletteQuantizer(palette, names)
+    with _quantizers_lock:
+        _quantizers[key] = quantizer
+        while len(_quantizers) > _MAX_QUANTIZERS:
+            _quantizers.popitem(last=False)
+    return quantizer
+
+
+def parse_palette(data) -> Tuple[List[Tuple[int, int, int]], List[str]]:
+    """
+    Parse a palette document: [{"name": "Black", "rgb": [0, 0, 0]}, ...]
+    Raises ValueError if malformed.
+    """
+    if not isinstance(data, list) or not data:
+        raise ValueError("Palette must be a non-empty list")
+    colors = []
+    names = []
+    for i, entry in enumerate(data):
+        if not isinstance(entry, dict) or 'rgb' not in entry:
+            raise ValueError(f"Palette entry {i} must be an object with an 'rgb' field")
+        rgb = entry['rgb']
+        if not isinstance(rgb, (list, tuple)) or len(rgb) != 3 or not all(isinstance(c, int) and 0 <= c <= 255 for c in rgb):
+            raise ValueError(f"Palette entry {i} 'rgb' must be three integers 0-255")
+        colors.append((rgb[0], rgb[1], rgb[2]))
+        names.append(str(entry.get('name') or f"Color {i}"))
+    return colors, names
@@ -0,0 +1,201 @@
+"""
+Result Cache
+Two-tier content-addressed cache for generated model files:
+an in-process LRU bounded by bytes, backed by an on-disk directory with size-based eviction
+"""
+import hashlib
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+
+def make_cache_key(*parts: Any) -> str:
+    """SHA-256 over the given parts (bytes are hashed as-is, everything else via str())"""
+    digest = hashlib.sha256()
+    for part in parts:
+        data = part if isinstance(part, (bytes, bytearray, memoryview)) else str(part).encode('utf-8')
+        digest.update(len(data).to_bytes(8, 'big'))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Bytes cache keyed by hex digests (see make_cache_key)"""
+
+    def __init__(self, cache_dir: Optional[str], max_memory_bytes: int, max_disk_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: 'OrderedDict[str, bytes]' = OrderedDict()
+        self._memory_bytes = 0
+        self._memory_refs: Dict[int, int] = {}  # id(value) -> number of keys sharing it (see alias)
+        self._lock = threading.Lock()
+        self._counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'disk_evictions': 0}
+        if self.cache_dir and self.max_disk_bytes > 0:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{key}.bin')
+
+    def _disk_enabled(self) -> bool:
+        return bool(self.cache_dir) and self.max_disk_bytes > 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self._counters['memory_hits'] += 1
+                return value
+
+        if self._disk_enabled():
+            path = self._disk_path(key)
+            try:
+                with open(path, 'rb') as f:
+                    value = f.read()
+                os.utime(path)  # Mark as recently used for eviction
+            except OSError:
+                value = None
+            if value is not None:
+                self._put_memory(key, value)
+                with self._lock:
+                    self._counters['disk_hits'] += 1
+                return value
+
+        with self._lock:
+            self._counters['misses'] += 1
+        return None
+
+    def put(self, key: str, value: bytes, persist: bool = True):
+        """Store value; persist=False keeps it in memory only (e.g. another process wrote the disk tier)"""
+        self._put_memory(key, value)
+        if persist and self._disk_enabled() and len(value) <= self.max_disk_bytes:
+            try:
+                self._put_disk(key, value)
+            except OSError as e:
+                print(f"⚠️  Could not write result cache entry: {e}")
+        with self._lock:
+            self._counters['stores'] += 1
+
+    def get_or_compute(self, key: str, compute: Callable[[], bytes]) -> bytes:
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def alias(self, key: str, source_key: str) -> bool:
+        """
+        Make key resolve to the same bytes as source_key (the memory tier shares the
+        object, the disk tier hard-links the file). Returns False if source_key is gone.
+        """
+        with self._lock:
+            value = self._memory.get(source_key)
+        if value is not None:
+            self._put_memory(key, value)
+        linked = False
+        if self._disk_enabled():
+            linked = self.link_to(source_key, self._disk_path(key))
+        return value is not None or linked
+
+    def link_to(self, key: str, dest_path: str) -> bool:
+        """
+        Hard-link the disk entry for key to dest_path (replacing it).
+        Returns False if there is no disk entry or the filesystem does not support links.
+        """
+        if not self._disk_enabled():
+            return False
+        tmp_path = f'{dest_path}.tmp-{uuid.uuid4().hex[:8]}'
+        try:
+            os.link(self._disk_path(key), tmp_path)
+            os.replace(tmp_path, dest_path)
+            return True
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+
+    def _put_memory(self, key: str, value: bytes):
+        if len(value) > self.max_memory_bytes:
+            return
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._release_memory(previous)
+            self._memory[key] = value
+            refs = self._memory_refs.get(id(value), 0)
+            if refs == 0:
+                self._memory_bytes += len(value)
+            self._memory_refs[id(value)] = refs + 1
+            while self._memory_bytes > self.max_memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._release_memory(evicted)
+
+    def _release_memory(self, value: bytes):
+        """Drop one key's reference to value; its bytes are freed with the last one"""
+        refs = self._memory_refs.pop(id(value)) - 1
+        if refs:
+            self._memory_refs[id(value)] = refs
+        else:
+            self._memory_bytes -= len(value)
+
+    def _put_disk(self, key: str, value: bytes):
+        path = self._disk_path(key)
+        tmp_path = f'{path}.tmp-{uuid.uuid4().hex[:8]}'
+        with open(tmp_path, 'wb') as f:
+            f.write(value)
+        os.replace(tmp_path, path)
+        self._evict_disk()
+
+    def _evict_disk(self):
+        """Delete least recently used files until the directory fits in max_disk_bytes"""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith('.bin'):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+        if total <= self.max_disk_bytes:
+            return
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                with self._lock:
+                    self._counters['disk_evictions'] += 1
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats['memory_entries'] = len(self._memory)
+            stats['memory_bytes'] = self._memory_bytes
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        return stats
+
+
+# Global instance
+_result_cache = None
+
+def get_result_cache() -> ResultCache:
+    """Get or create the result cache (configured from environment variables)"""
+    global _result_cache
+    if _result_cache is None:
+        _result_cache = ResultCache(
+            cache_dir=os.getenv('RESULT_CACHE_DIR', 'result_cache'),
+            max_memory_bytes=int(os.getenv('RESULT_CACHE_MEMORY_MB', 64)) * 1024 * 1024,
+            max_disk_bytes=int(os.getenv('RESULT_CACHE_DISK_MB', 512)) * 1024 * 1024,
+        )
+    return _result_cache
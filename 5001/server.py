@@ -2,15 +2,17 @@
 Flask backend API for 3MF color mapping
 Exposes a /generate endpoint that accepts STL + PNG and returns 3MF
 """
+import hashlib
 import io
 import json
 import os
-import time
+import threading
 import uuid
-from typing import List, Tuple, Optional
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, List, NamedTuple, Tuple, Optional
 
 import numpy as np
-from flask import Flask, request, send_file, jsonify
+from flask import Flask, Response, has_request_context, request, send_file, jsonify
 from flask_cors import CORS
 from PIL import Image
 import trimesh
@@ -39,6 +41,7 @@ except ImportError:
 # Import Shopify API wrapper
 try:
     from shopify_api import get_shopify_api
+    from shopify_order_mirror import get_shopify_order_mirror
     SHOPIFY_API_AVAILABLE = True
 except ImportError:
     SHOPIFY_API_AVAILABLE = False
@@ -48,11 +51,25 @@ except ImportError:
 try:
     from webhook_handlers import handle_order_create, handle_order_paid
     from shopify_api import get_shopify_api as get_shopify_api_for_webhook
+    from webhook_outbox import get_webhook_outbox
     WEBHOOK_HANDLERS_AVAILABLE = True
 except ImportError:
     WEBHOOK_HANDLERS_AVAILABLE = False
     print("⚠️  webhook_handlers.py not found")
 
+from grid_templates import (MAX_GRID_SIZE, SUPPORTED_GRID_SIZES, GridTemplate, GridTemplateStore, compute_face_normals,
+                            compute_top_bounds, encode_binary_stl, is_valid_grid_size)
+from quantizer import get_quantizer, parse_palette
+from result_cache import get_result_cache, make_cache_key
+from jobs import QueueFullError, get_job_queue
+from generation_service import SharedRef, create_generation_service, in_generation_worker, read_shared_bytes, share_bytes
+from order_generation import OrderModelBuilder, set_order_model_builder
+from order_store import get_order_store
+from config_store import DEFAULT_CONTENT, ConfigDocument, ConfigSnapshot, deep_merge, get_config
+from page_cache import PageCache
+from static_assets import IMMUTABLE_CACHE_CONTROL, Asset, AssetStore, get_asset_store, negotiate_encoding
+from viewer_mesh import MESH_EXTENSION, encode_viewer_mesh
+
 # Try both bindings; some environments publish lib3mf as 'lib3mf', others as 'py3mf'
 _three_mf = None
 _three_mf_error = None
@@ -117,6 +134,63 @@ FOUR_COLORS_RGB: List[Tuple[int, int, int]] = [
 ]
 
 
+FOUR_COLOR_NAMES: List[str] = ["Black", "Dark Gray", "Light Gray", "White"]
+
+PALETTE_FILE = 'palette.json'
+
+
+_palette_cache: Optional[Tuple[Optional[Tuple[int, int]], Tuple[List[Tuple[int, int, int]], List[str]]]] = None
+_palette_cache_lock = threading.Lock()
+
+
+def _palette_signature() -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(PALETTE_FILE)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _load_palette() -> Tuple[List[Tuple[int, int, int]], List[str]]:
+    if os.path.exists(PALETTE_FILE):
+        try:
+            with open(PALETTE_FILE, 'r') as f:
+                return parse_palette(json.load(f))
+        except Exception as e:
+            print(f"⚠️  Ignoring invalid {PALETTE_FILE}: {e}")
+    return list(FOUR_COLORS_RGB), list(FOUR_COLOR_NAMES)
+
+
+def get_active_palette() -> Tuple[List[Tuple[int, int, int]], List[str]]:
+    """
+    Filament palette used for pixelated modes.
+    Admins can override it via palette.json; defaults to FOUR_COLORS_RGB.
+    Parsed once per file version (mtime/size), like config_store.ConfigDocument.
+    """
+    global _palette_cache
+    signature = _palette_signature()
+    with _palette_cache_lock:
+        if _palette_cache is None or _palette_cache[0] != signature:
+            _palette_cache = (signature, _load_palette())
+        palette, names = _palette_cache[1]
+    return list(palette), list(names)
+
+
+def quantize_to_palette(rgb_colors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Quantize RGB colors to the nearest color of the active palette.
+    Args:
+        rgb_colors: Array of shape (N, 3) with RGB values 0-255
+    Returns:
+        (palette indices of shape (N,) as uint8, palette colors of shape (K, 3) as uint8)
+    """
+    palette, names = get_active_palette()
+    quantizer = get_quantizer(palette, names)
+    palette_indices = quantizer.quantize(rgb_colors)
+    quantizer.log_stats(palette_indices)
+    return palette_indices, quantizer.palette
+
+
 def quantize_to_four_colors(rgb_colors: np.ndarray) -> np.ndarray:
     """
     Quantize RGB colors to the nearest of the 4 allowed colors.
@@ -126,42 +200,10 @@ def quantize_to_four_colors(rgb_colors: np.ndarray) -> np.ndarray:
     Returns:
         Quantized colors array of shape (N, 3) with only the 4 allowed colors
     """
-    # Convert to numpy array for easier computation
-    colors_array = np.array(FOUR_COLORS_RGB, dtype=np.float32)  # Shape: (4, 3)
-    
-    # Reshape input to (N, 1, 3) for broadcasting
-    rgb_colors_float = rgb_colors.astype(np.float32)
-    rgb_colors_reshaped = rgb_colors_float[:, np.newaxis, :]  # (N, 1, 3)
-    
-    # Calculate Euclidean distance to each of the 4 colors
-    # Shape: (N, 4) - distance from each input color to each palette color
-    distances = np.sqrt(np.sum((rgb_colors_reshaped - colors_array) ** 2, axis=2))
-    
-    # Find index of closest color for each input color
-    closest_indices = np.argmin(distances, axis=1)
-    
-    # Map to the closest palette color - ensure EXACT values
-    quantized = np.zeros_like(rgb_colors, dtype=np.uint8)
-    for i, exact_color in enumerate(FOUR_COLORS_RGB):
-        mask = closest_indices == i
-        quantized[mask] = np.array(exact_color, dtype=np.uint8)
-    
-    # Debug: Print color usage statistics
-    unique_colors_used = set(closest_indices)
-    color_names = ["Black", "Dark Gray", "Light Gray", "White"]
-    print(f"📊 Quantization: Using {len(unique_colors_used)} out of 4 colors")
-    for idx in sorted(unique_colors_used):
-        count = np.sum(closest_indices == idx)
-        percentage = count / len(closest_indices) * 100
-        print(f"   - {color_names[idx]}: {count} triangles ({percentage:.1f}%)")
-    
-    # Check if all 4 colors are present
-    missing_colors = set(range(4)) - unique_colors_used
-    if missing_colors:
-        print(f"⚠️  Warning: Missing colors: {[color_names[i] for i in missing_colors]}")
-        print(f"   This is normal if the image doesn't contain those color ranges.")
-    
-    return quantized
+    quantizer = get_quantizer(FOUR_COLORS_RGB, FOUR_COLOR_NAMES)
+    palette_indices = quantizer.quantize(rgb_colors)
+    quantizer.log_stats(palette_indices)
+    return quantizer.to_rgb(palette_indices)
 
 
 def require_three_mf():
@@ -384,54 +426,69 @@ def load_stl_vertices_faces(stl_bytes: bytes) -> Tuple[np.ndarray, np.ndarray]:
     return vertices, faces
 
 
-def get_triangle_colors_from_image(vertices: np.ndarray, faces: np.ndarray, img_rgb: np.ndarray, grid_size: int = 75) -> np.ndarray:
+# Grid STLs and the files derived from them, served like static assets by /get-stl and /get-mesh
+stl_assets = AssetStore('.', get_asset_store().cache_dir, dirs=('stl_files', 'shopify-version'))
+
+# Pre-parsed grid STLs from stl_files/ (shared across workers via memory-mapped .npy files);
+# evicted cache entries take their derived files' precompressed variants with them
+grid_templates = GridTemplateStore('stl_files', loader=load_stl_vertices_faces, on_evict=stl_assets.forget)
+
+
+def matching_grid_template(stl_bytes: Optional[bytes], grid_size: int) -> Optional[GridTemplate]:
     """
-    Map each triangle to its corresponding pixel color in the image.
+    Return the server's grid template for grid_size if stl_bytes is a byte-for-byte copy of it.
+
+    Args:
+        stl_bytes: Uploaded STL file contents (may be None)
+        grid_size: Grid size of the request
+
+    Returns:
+        The matching GridTemplate, or None for a custom (or missing) STL
+    """
+    if not stl_bytes or not grid_templates.has_template(grid_size):
+        return None
+    template = grid_templates.get(grid_size)
+    if template.stl_path is not None:
+        return template if hashlib.sha256(stl_bytes).hexdigest() == template.stl_sha256 else None
+    # Generated grids hash their parameters, so compare with the STL /get-stl serves for them
+    stl_path = grid_template_stl_path(template)
+    if os.path.getsize(stl_path) != len(stl_bytes):
+        return None
+    with open(stl_path, 'rb') as f:
+        return template if f.read() == stl_bytes else None
+
+
+def load_mesh_for_request(stl_bytes: Optional[bytes], grid_size: int) -> GridTemplate:
+    """
+    Return the mesh for a generate request as a GridTemplate.
+    Uses the preloaded grid template when no STL was uploaded, or when the upload is
+    a copy of it (clients send back the grid they fetched from /get-stl).
+    """
+    template = matching_grid_template(stl_bytes, grid_size)
+    if template is not None:
+        return template
+    if stl_bytes:
+        vertices, faces = load_stl_vertices_faces(stl_bytes)
+        return GridTemplate.from_mesh(grid_size, None, hashlib.sha256(stl_bytes).hexdigest(), vertices, faces)
+    if not grid_templates.has_template(grid_size):
+        raise ValueError(f"No STL uploaded and no {grid_size}x{grid_size} grid template on the server")
+    return grid_templates.get(grid_size)
+
+
+def compute_face_pixel_indices(vertices: np.ndarray, faces: np.ndarray, img_width: int, img_height: int, grid_size: int = 75,
+                               centroids: Optional[np.ndarray] = None, top_bounds: Optional[np.ndarray] = None,
+                               grid_rows: Optional[int] = None) -> np.ndarray:
+    """
+    Map each triangle centroid to the flat index (py * img_width + px) of the pixel it samples.
     Uses EXACT same logic as frontend applyColorsToMesh function.
-    Returns shape: (num_triangles, 3) with RGB values
+    centroids/top_bounds may be passed in from a GridTemplate to skip recomputing them.
+    grid_rows sets the vertical cell count of a rectangular grid (default: grid_size).
+    Returns shape: (num_triangles,) int64
     """
-    # Get actual image dimensions
-    img_height, img_width = img_rgb.shape[:2]
-    
-    # Get triangle vertices
-    tri_verts = vertices[faces]
-    
     # Compute XY bounds based ONLY on near-horizontal (top) faces (matches frontend exactly)
-    minX = np.inf
-    minY = np.inf
-    maxX = -np.inf
-    maxY = -np.inf
-    
-    # Calculate face normals to find top faces
-    v0 = tri_verts[:, 0]
-    v1 = tri_verts[:, 1]
-    v2 = tri_verts[:, 2]
-    
-    ab = v1 - v0
-    ac = v2 - v0
-    normals = np.cross(ab, ac)
-    norm_lengths = np.linalg.norm(normals, axis=1, keepdims=True)
-    norm_lengths = np.where(norm_lengths == 0, 1, norm_lengths)
-    normals_unit = normals / norm_lengths
-    nz_unit = np.abs(normals_unit[:, 2])
-    
-    # Only use top-ish faces (nz > 0.5) to determine bounds
-    top_mask = nz_unit > 0.5
-    
-    if np.any(top_mask):
-        top_tri_verts = tri_verts[top_mask]
-        for tri in top_tri_verts:
-            minX = min(minX, tri[0, 0], tri[1, 0], tri[2, 0])
-            minY = min(minY, tri[0, 1], tri[1, 1], tri[2, 1])
-            maxX = max(maxX, tri[0, 0], tri[1, 0], tri[2, 0])
-            maxY = max(maxY, tri[0, 1], tri[1, 1], tri[2, 1])
-    
-    if not (np.isfinite(minX) and np.isfinite(minY)):
-        # Fallback to bbox if no top faces detected
-        minX = vertices[:, 0].min()
-        minY = vertices[:, 1].min()
-        maxX = vertices[:, 0].max()
-        maxY = vertices[:, 1].max()
+    if top_bounds is None:
+        top_bounds = compute_top_bounds(vertices, faces, compute_face_normals(vertices, faces))
+    minX, minY, maxX, maxY = (float(b) for b in top_bounds)
     
     sizeX = max(1e-9, maxX - minX)
     sizeY = max(1e-9, maxY - minY)
@@ -441,115 +498,109 @@ def get_triangle_colors_from_image(vertices: np.ndarray, faces: np.ndarray, img_
     # This ensures pixel mapping matches exactly what the user sees in the 3D viewer
     
     # Get triangle centroids
-    centroids = tri_verts.mean(axis=1)
+    if centroids is None:
+        centroids = vertices[faces].mean(axis=1)
     
-    # Map each triangle centroid to image pixel
-    num_faces = len(faces)
-    triangle_colors = np.zeros((num_faces, 3), dtype=np.uint8)
+    # Normalize to [0, 1] range
+    u = np.clip((centroids[:, 0] - minX) / sizeX, 0.0, 0.999999)
+    v = np.clip((centroids[:, 1] - minY) / sizeY, 0.0, 0.999999)
     
-    # Debug: Log bounds and image dimensions
     print(f"🔍 Color mapping debug:")
     print(f"   Bounds: X=[{minX:.3f}, {maxX:.3f}], Y=[{minY:.3f}, {maxY:.3f}]")
     print(f"   Size: X={sizeX:.3f}, Y={sizeY:.3f}")
     print(f"   Image dimensions: {img_width}×{img_height}")
     print(f"   Grid size: {grid_size}")
-    print(f"   Number of triangles: {num_faces}")
+    print(f"   Number of triangles: {len(centroids)}")
     
     # For Normal mode (48), use continuous mapping - each triangle maps individually (no pixel grouping)
     # For other modes, use grid-based mapping with pixel grouping
     is_normal_mode = (grid_size == 48)
     
     if is_normal_mode:
-        # Pixel-perfect mapping: each triangle maps to the exact pixel it covers
-        # Group triangles by pixel to ensure all triangles mapping to same pixel get exact same color
-        from collections import defaultdict
-        pixel_triangles = defaultdict(list)
-        
-        # Map each triangle to its pixel location (pixel-perfect)
-        for face_idx in range(num_faces):
-            cx = centroids[face_idx, 0]
-            cy = centroids[face_idx, 1]
-            
-            # Normalize to [0, 1] range using square bounding box
-            u = max(0.0, min(0.999999, (cx - minX) / sizeX))
-            v = max(0.0, min(0.999999, (cy - minY) / sizeY))
-            
-            # Map to image coordinates - use nearest pixel (pixel-perfect mapping)
-            img_x = u * (img_width - 1)
-            img_y = (1.0 - v) * (img_height - 1)  # Flip Y: v=0 (top) maps to bottom
-            
-            # Round to nearest pixel for pixel-perfect mapping
-            px = int(np.round(img_x))
-            py = int(np.round(img_y))
-            
-            # Clamp to valid pixel range
-            px = max(0, min(img_width - 1, px))
-            py = max(0, min(img_height - 1, py))
-            
-            # Group triangles by pixel
-            pixel_triangles[(py, px)].append(face_idx)
-        
-        # Assign colors: all triangles mapping to the same pixel get the exact same color
-        for (py, px), tri_indices in pixel_triangles.items():
-            pixel_color = img_rgb[py, px, :]  # Get exact pixel color
-            for tri_idx in tri_indices:
-                triangle_colors[tri_idx] = pixel_color
-        
-        # Debug: Log color distribution before quantization
-        unique_colors_before = len(set(tuple(c) for c in triangle_colors))
-        print(f"   Normal mode: {len(pixel_triangles)} unique pixels mapped, {unique_colors_before} unique colors before quantization")
+        # Pixel-perfect mapping: round to the nearest pixel
+        # Flip Y: v=0 (top) maps to bottom
+        px = np.round(u * (img_width - 1))
+        py = np.round((1.0 - v) * (img_height - 1))
     else:
-        # Grid-based mapping for pixelated modes - group triangles by pixel
-        from collections import defaultdict
-        pixel_triangles = defaultdict(list)
-        
-        grid = float(grid_size)
-        
-        # Map each triangle to its pixel location (EXACT frontend logic)
+        # Grid-based mapping for pixelated modes (EXACT frontend logic)
         # Frontend code: cellU = Math.floor(u * grid) + 0.5; cellV = Math.floor(v * grid) + 0.5;
         # Then: snappedU = cellU / grid; snappedV = cellV / grid;
         # Then: px = Math.floor(snappedU * (pngImage.width - 1));
         # And: py = Math.floor((1 - snappedV) * (pngImage.height - 1));
-        for face_idx in range(num_faces):
-            cx = centroids[face_idx, 0]
-            cy = centroids[face_idx, 1]
-            
-            # Normalize to [0, 1] range using square bounding box (matches frontend)
-            u = max(0.0, min(0.999999, (cx - minX) / sizeX))
-            v = max(0.0, min(0.999999, (cy - minY) / sizeY))
-            
-            # Snap by selected grid cells (EXACT frontend logic)
-            # Frontend: cellU = Math.floor(u * grid) + 0.5
-            cellU = np.floor(u * grid) + 0.5
-            cellV = np.floor(v * grid) + 0.5
-            
-            # Frontend: snappedU = cellU / grid; snappedV = cellV / grid
-            snappedU = cellU / grid
-            snappedV = cellV / grid
-            
-            # Frontend: px = Math.floor(snappedU * (pngImage.width - 1))
-            px = int(np.floor(snappedU * (img_width - 1)))
-            
-            # Frontend: py = Math.floor((1 - snappedV) * (pngImage.height - 1))
-            py = int(np.floor((1.0 - snappedV) * (img_height - 1)))
-            
-            # Clamp to valid pixel range
-            px = max(0, min(img_width - 1, px))
-            py = max(0, min(img_height - 1, py))
-            
-            # Group triangles by pixel
-            pixel_triangles[(py, px)].append(face_idx)
-        
-        # Assign colors: all triangles in the same pixel get the exact same color from the image
-        # This is the only color assignment - no additional edge checks that could cause duplication
-        for (py, px), tri_indices in pixel_triangles.items():
-            pixel_color = img_rgb[py, px, :]  # Get color directly from image
-            for tri_idx in tri_indices:
-                triangle_colors[tri_idx] = pixel_color
-        
-        # Debug: Log color distribution before quantization
-        unique_colors_before = len(set(tuple(c) for c in triangle_colors))
-        print(f"   Grid mode: {len(pixel_triangles)} unique pixels mapped, {unique_colors_before} unique colors before quantization")
+        grid = float(grid_size)
+        gridV = float(grid_rows or grid_size)
+        snappedU = (np.floor(u * grid) + 0.5) / grid
+        snappedV = (np.floor(v * gridV) + 0.5) / gridV
+        px = np.floor(snappedU * (img_width - 1))
+        py = np.floor((1.0 - snappedV) * (img_height - 1))
+    
+    # Clamp to valid pixel range
+    px = np.clip(px.astype(np.int64), 0, img_width - 1)
+    py = np.clip(py.astype(np.int64), 0, img_height - 1)
+    
+    return py * img_width + px
+
+
+# LRU of face->pixel index tables keyed by (mesh id, grid columns, grid rows, image width, image height).
+# The mapping only depends on geometry and image dimensions, so the common
+# 48/75/96 templates reduce coloring to a single gather after the first request.
+FACE_PIXEL_INDEX_CACHE_SIZE = int(os.getenv('FACE_PIXEL_INDEX_CACHE_SIZE', 32))
+_face_pixel_index_cache: 'OrderedDict[tuple, np.ndarray]' = OrderedDict()
+_face_pixel_index_lock = threading.Lock()
+
+
+def get_face_pixel_indices(mesh_key: Optional[str], vertices: np.ndarray, faces: np.ndarray, img_width: int, img_height: int,
+                           grid_size: int = 75, centroids: Optional[np.ndarray] = None,
+                           top_bounds: Optional[np.ndarray] = None, grid_rows: Optional[int] = None) -> np.ndarray:
+    """
+    Fetch (or build and cache) the int32 flat pixel index for every face.
+    mesh_key identifies the geometry (e.g. GridTemplate.template_id); pass None to skip the cache.
+    """
+    if mesh_key is None or FACE_PIXEL_INDEX_CACHE_SIZE <= 0:
+        return compute_face_pixel_indices(vertices, faces, img_width, img_height, grid_size,
+                                          centroids=centroids, top_bounds=top_bounds, grid_rows=grid_rows).astype(np.int32)
+    
+    key = (mesh_key, int(grid_size), int(grid_rows or grid_size), int(img_width), int(img_height))
+    with _face_pixel_index_lock:
+        pixel_indices = _face_pixel_index_cache.get(key)
+        if pixel_indices is not None:
+            _face_pixel_index_cache.move_to_end(key)
+            return pixel_indices
+    
+    pixel_indices = compute_face_pixel_indices(vertices, faces, img_width, img_height, grid_size,
+                                               centroids=centroids, top_bounds=top_bounds, grid_rows=grid_rows).astype(np.int32)
+    pixel_indices.setflags(write=False)
+    
+    with _face_pixel_index_lock:
+        _face_pixel_index_cache[key] = pixel_indices
+        _face_pixel_index_cache.move_to_end(key)
+        while len(_face_pixel_index_cache) > FACE_PIXEL_INDEX_CACHE_SIZE:
+            _face_pixel_index_cache.popitem(last=False)
+    return pixel_indices
+
+
+def get_triangle_colors_from_image(vertices: np.ndarray, faces: np.ndarray, img_rgb: np.ndarray, grid_size: int = 75,
+                                   centroids: Optional[np.ndarray] = None, top_bounds: Optional[np.ndarray] = None,
+                                   mesh_key: Optional[str] = None) -> np.ndarray:
+    """
+    Map each triangle to its corresponding pixel color in the image.
+    Uses EXACT same logic as frontend applyColorsToMesh function.
+    All triangles that map to the same pixel get that pixel's exact color.
+    Pass mesh_key to reuse a cached face->pixel index table for this geometry.
+    Returns shape: (num_triangles, 3) with RGB values
+    """
+    img_height, img_width = img_rgb.shape[:2]
+    pixel_indices = get_face_pixel_indices(mesh_key, vertices, faces, img_width, img_height, grid_size,
+                                           centroids=centroids, top_bounds=top_bounds)
+    triangle_colors = np.ascontiguousarray(img_rgb, dtype=np.uint8).reshape(-1, 3)[pixel_indices]
+    num_faces = len(triangle_colors)
+    
+    # Debug: Log color distribution before quantization
+    mode_label = "Normal mode" if grid_size == 48 else "Grid mode"
+    unique_pixels = int(np.count_nonzero(np.bincount(pixel_indices, minlength=img_width * img_height)))
+    packed_colors = (triangle_colors[:, 0].astype(np.int32) << 16) | (triangle_colors[:, 1].astype(np.int32) << 8) | triangle_colors[:, 2]
+    unique_colors_before = len(np.unique(packed_colors))
+    print(f"   {mode_label}: {unique_pixels} unique pixels mapped, {unique_colors_before} unique colors before quantization")
     
     # Debug: Show sample of assigned colors
     if num_faces > 0:
@@ -584,42 +635,8 @@ def write_3mf_with_texture(vertices: np.ndarray, faces: np.ndarray, img_rgb: np.
     img_height, img_width = img_rgb.shape[:2]
     
     # Compute XY bounds based ONLY on near-horizontal (top) faces
-    tri_verts = vertices[faces]
-    minX = np.inf
-    minY = np.inf
-    maxX = -np.inf
-    maxY = -np.inf
-    
-    # Calculate face normals to find top faces
-    v0 = tri_verts[:, 0]
-    v1 = tri_verts[:, 1]
-    v2 = tri_verts[:, 2]
-    
-    ab = v1 - v0
-    ac = v2 - v0
-    normals = np.cross(ab, ac)
-    norm_lengths = np.linalg.norm(normals, axis=1, keepdims=True)
-    norm_lengths = np.where(norm_lengths == 0, 1, norm_lengths)
-    normals_unit = normals / norm_lengths
-    nz_unit = np.abs(normals_unit[:, 2])
-    
-    # Only use top-ish faces (nz > 0.5) to determine bounds
-    top_mask = nz_unit > 0.5
-    
-    if np.any(top_mask):
-        top_tri_verts = tri_verts[top_mask]
-        for tri in top_tri_verts:
-            minX = min(minX, tri[0, 0], tri[1, 0], tri[2, 0])
-            minY = min(minY, tri[0, 1], tri[1, 1], tri[2, 1])
-            maxX = max(maxX, tri[0, 0], tri[1, 0], tri[2, 0])
-            maxY = max(maxY, tri[0, 1], tri[1, 1], tri[2, 1])
-    
-    if not (np.isfinite(minX) and np.isfinite(minY)):
-        # Fallback to bbox if no top faces detected
-        minX = vertices[:, 0].min()
-        minY = vertices[:, 1].min()
-        maxX = vertices[:, 0].max()
-        maxY = vertices[:, 1].max()
+    # (top-ish faces with |nz| > 0.5; falls back to the bbox if there are none)
+    minX, minY, maxX, maxY = (float(b) for b in compute_top_bounds(vertices, faces, compute_face_normals(vertices, faces)))
     
     sizeX = max(1e-9, maxX - minX)
     sizeY = max(1e-9, maxY - minY)
@@ -755,71 +772,10 @@ def write_3mf_with_texture(vertices: np.ndarray, faces: np.ndarray, img_rgb: np.
             raise RuntimeError(f"Failed to write 3MF file: {e}")
 
 
-def write_3mf_vertex_colors(vertices: np.ndarray, faces: np.ndarray, triangle_colors: np.ndarray) -> bytes:
-    """
-    Write 3MF file with vertex colors (single object, colorgroup).
-    Bakes triangle colors to vertices - each vertex gets the color of its face.
-    Creates ONE unified mesh with vertex colors (no basematerials, no multiple objects).
-    """
-    import zipfile
-    import tempfile
-    
-    print(f"✅ Writing 3MF with vertex colors (single object, {len(vertices)} vertices, {len(faces)} triangles)")
-    
-    # Step 1: Collect unique triangle colors and create color index mapping
-    from collections import OrderedDict
-    
-    # Get unique colors from triangles (as tuples for hashing)
-    unique_colors = OrderedDict()
-    triangle_color_indices = []
-    
-    for tri_idx, face in enumerate(faces):
-        r, g, b = int(triangle_colors[tri_idx][0]), int(triangle_colors[tri_idx][1]), int(triangle_colors[tri_idx][2])
-        color_tuple = (r, g, b)
-        
-        if color_tuple not in unique_colors:
-            unique_colors[color_tuple] = len(unique_colors)
-        
-        triangle_color_indices.append(unique_colors[color_tuple])
-    
-    print(f"✅ Found {len(unique_colors)} unique colors for {len(faces)} triangles")
-    
-    # Step 2: Build 3MF XML manually as string (for proper namespace handling)
-    # Use color:colorresources extension (Bambu Studio compatible format)
-    # This is the color extension namespace method for vertex colors
-    
-    # Build colorresources XML (placed BEFORE <resources> as per 3MF spec)
-    color_xml = []
-    color_xml.append('  <color:colorresources id="1">')
-    color_xml.append('    <color:colors>')
-    
-    # Build color list - one color per unique color (this is the color palette)
-    # Colors use 0-255 range (not normalized) for colorresources
-    for color_tuple in unique_colors.keys():
-        r, g, b = color_tuple
-        color_xml.append(f'      <color:color r="{r}" g="{g}" b="{b}"/>')
-    
-    color_xml.append('    </color:colors>')
-    color_xml.append('  </color:colorresources>')
-    
-    # Build vertices XML
-    vertices_xml = []
-    for i in range(len(vertices)):
-        x, y, z = vertices[i]
-        vertices_xml.append(f'          <vertex x="{float(x)}" y="{float(y)}" z="{float(z)}"/>')
-    
-    # Build triangles XML with colorid to reference colorresources
-    # colorid references the color index in the colorresources palette
-    triangles_xml = []
-    for tri_idx, face in enumerate(faces):
-        v1, v2, v3 = int(face[0]), int(face[1]), int(face[2])
-        color_index = triangle_color_indices[tri_idx]
-        # Use colorid to reference color in colorresources (all vertices get same color for triangle)
-        triangles_xml.append(f'          <triangle v1="{v1}" v2="{v2}" v3="{v3}" colorid="{color_index}"/>')
-    
-    # Build complete model XML with Bambu Lab metadata
-    # Using 2013/01 namespace with color extension for vertex colors
-    model_xml_str = f'''<?xml version="1.0" encoding="UTF-8"?>
+# Rows formatted per bulk % operation when streaming 3MF/OBJ bodies
+WRITER_CHUNK_ROWS = 16384
+
+THREE_MF_MODEL_HEADER = '''<?xml version="1.0" encoding="UTF-8"?>
 <model unit="millimeter"
        xmlns="http://schemas.microsoft.com/3dmanufacturing/core/2013/01"
        xmlns:mc="http://schemas.openxmlformats.org/markup-compatibility/2006"
@@ -828,16 +784,19 @@ def write_3mf_vertex_colors(vertices: np.ndarray, faces: np.ndarray, triangle_co
   <metadata name="Producer">Bambu Lab</metadata>
   <metadata name="Application">Bambu Studio</metadata>
 
-{chr(10).join(color_xml)}
-  <resources>
+'''
+
+THREE_MF_MESH_OPEN = '''  <resources>
     <object id="1" type="model">
       <mesh>
         <vertices>
-{chr(10).join(vertices_xml)}
-        </vertices>
+'''
+
+THREE_MF_MESH_MIDDLE = '''        </vertices>
         <triangles>
-{chr(10).join(triangles_xml)}
-        </triangles>
+'''
+
+THREE_MF_MESH_CLOSE = '''        </triangles>
       </mesh>
     </object>
   </resources>
@@ -846,45 +805,141 @@ def write_3mf_vertex_colors(vertices: np.ndarray, faces: np.ndarray, triangle_co
     <item objectid="1"/>
   </build>
 </model>'''
-    
-    # Step 3: Create 3MF zip package
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".3mf") as tmp_file:
-        tmp_path = tmp_file.name
-    
-    with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        # Add model XML (built as string for proper namespace handling)
-        zipf.writestr("3D/3dmodel.model", model_xml_str.encode('utf-8'))
-        
-        # Add [Content_Types].xml
-        content_types = '''<?xml version="1.0" encoding="UTF-8"?>
+
+THREE_MF_CONTENT_TYPES = '''<?xml version="1.0" encoding="UTF-8"?>
 <Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
   <Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
   <Default Extension="model" ContentType="application/vnd.ms-package.3dmanufacturing-3dmodel+xml"/>
   <Override PartName="/3D/3dmodel.model" ContentType="application/vnd.ms-package.3dmanufacturing-3dmodel+xml"/>
 </Types>'''
-        zipf.writestr("[Content_Types].xml", content_types)
-        
-        # Add _rels/.rels
-        rels = '''<?xml version="1.0" encoding="UTF-8"?>
+
+THREE_MF_RELS = '''<?xml version="1.0" encoding="UTF-8"?>
 <Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
   <Relationship Type="http://schemas.microsoft.com/3dmanufacturing/2013/01/3dmodel" Target="/3D/3dmodel.model" Id="rel0"/>
 </Relationships>'''
-        zipf.writestr("_rels/.rels", rels)
+
+
+def index_unique_colors(triangle_colors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Deduplicate triangle colors, numbering them in order of first appearance.
+    Returns: (unique colors of shape (K, 3) as uint8, color index per triangle)
+    """
+    colors = np.asarray(triangle_colors).astype(np.int64)
+    packed = (colors[:, 0] << 16) | (colors[:, 1] << 8) | colors[:, 2]
+    _, first_index, inverse = np.unique(packed, return_index=True, return_inverse=True)
+    order = np.argsort(first_index, kind='stable')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return np.asarray(triangle_colors)[first_index[order]].astype(np.uint8), rank[inverse.ravel()]
+
+
+def iter_formatted_rows(row_format: str, rows: np.ndarray, chunk_rows: int = WRITER_CHUNK_ROWS) -> Iterator[str]:
+    """Format array rows with one bulk % operation per chunk instead of one f-string per row"""
+    for start in range(0, len(rows), chunk_rows):
+        chunk = rows[start:start + chunk_rows]
+        yield (row_format * len(chunk)) % tuple(chunk.ravel().tolist())
+
+
+def iter_3mf_model_xml(vertices: np.ndarray, faces: np.ndarray, triangle_colors: np.ndarray) -> Iterator[str]:
+    """
+    Yield the 3D/3dmodel.model document in chunks.
+    Uses color:colorresources extension (Bambu Studio compatible format);
+    colorid on each triangle references the palette of unique colors.
+    """
+    unique_colors, color_indices = index_unique_colors(triangle_colors)
+    print(f"✅ Found {len(unique_colors)} unique colors for {len(faces)} triangles")
+    
+    yield THREE_MF_MODEL_HEADER
+    # Colors use 0-255 range (not normalized) for colorresources
+    yield '  <color:colorresources id="1">\n    <color:colors>\n'
+    yield from iter_formatted_rows('      <color:color r="%d" g="%d" b="%d"/>\n', unique_colors)
+    yield '    </color:colors>\n  </color:colorresources>\n'
+    
+    yield THREE_MF_MESH_OPEN
+    # %r matches f"{float(x)}" (shortest round-trip repr)
+    yield from iter_formatted_rows('          <vertex x="%r" y="%r" z="%r"/>\n', np.asarray(vertices, dtype=np.float64))
+    yield THREE_MF_MESH_MIDDLE
+    triangle_rows = np.column_stack([np.asarray(faces, dtype=np.int64), color_indices])
+    yield from iter_formatted_rows('          <triangle v1="%d" v2="%d" v3="%d" colorid="%d"/>\n', triangle_rows)
+    yield THREE_MF_MESH_CLOSE
+
+
+class _ChunkSink:
+    """Write-only file object that collects bytes for a streaming ZipFile"""
+    
+    def __init__(self):
+        self._chunks = []
+    
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
     
-    # Read and return
-    with open(tmp_path, "rb") as f:
-        result = f.read()
+    def flush(self):
+        pass
+    
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _write_3mf_package(fileobj, model_chunks) -> Iterator[None]:
+    """Write the 3MF ZIP into fileobj, yielding after every model chunk so callers can drain it"""
+    import zipfile
     
-    os.unlink(tmp_path)
-    return result
+    with zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        with zipf.open("3D/3dmodel.model", 'w') as model_entry:
+            for chunk in model_chunks:
+                model_entry.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+                yield
+        zipf.writestr("[Content_Types].xml", THREE_MF_CONTENT_TYPES)
+        zipf.writestr("_rels/.rels", THREE_MF_RELS)
+    yield
+
 
+def _iter_model_chunks(vertices: np.ndarray, faces: np.ndarray, triangle_colors: np.ndarray, skeleton: Optional['OutputSkeleton']):
+    if skeleton is not None:
+        return skeleton.iter_3mf_model_xml(triangle_colors)
+    return iter_3mf_model_xml(vertices, faces, triangle_colors)
 
-def write_3mf(vertices: np.ndarray, faces: np.ndarray, triangle_colors: np.ndarray) -> bytes:
+
+def iter_3mf_vertex_colors(vertices: np.ndarray, faces: np.ndarray, triangle_colors: np.ndarray,
+                           skeleton: Optional['OutputSkeleton'] = None) -> Iterator[bytes]:
+    """
+    Stream a 3MF package as ZIP byte chunks (suitable for a Flask streaming response).
+    The model XML is never held in memory as a whole document.
+    Pass the mesh's OutputSkeleton to splice colors into precomputed geometry text.
+    """
+    print(f"✅ Streaming 3MF with vertex colors (single object, {len(vertices)} vertices, {len(faces)} triangles)")
+    sink = _ChunkSink()
+    for _ in _write_3mf_package(sink, _iter_model_chunks(vertices, faces, triangle_colors, skeleton)):
+        data = sink.drain()
+        if data:
+            yield data
+
+
+def write_3mf_vertex_colors(vertices: np.ndarray, faces: np.ndarray, triangle_colors: np.ndarray,
+                            skeleton: Optional['OutputSkeleton'] = None) -> bytes:
+    """
+    Write 3MF file with vertex colors (single object, colorgroup).
+    Bakes triangle colors to vertices - each vertex gets the color of its face.
+    Creates ONE unified mesh with vertex colors (no basematerials, no multiple objects).
+    Pass the mesh's OutputSkeleton to splice colors into precomputed geometry text.
+    """
+    print(f"✅ Writing 3MF with vertex colors (single object, {len(vertices)} vertices, {len(faces)} triangles)")
+    buffer = io.BytesIO()
+    for _ in _write_3mf_package(buffer, _iter_model_chunks(vertices, faces, triangle_colors, skeleton)):
+        pass
+    return buffer.getvalue()
+
+
+def write_3mf(vertices: np.ndarray, faces: np.ndarray, triangle_colors: np.ndarray,
+              skeleton: Optional['OutputSkeleton'] = None) -> bytes:
     """
     Write 3MF file with vertex colors (single object, colorgroup).
     Uses the new vertex color approach instead of multiple objects with basematerials.
     """
-    return write_3mf_vertex_colors(vertices, faces, triangle_colors)
+    return write_3mf_vertex_colors(vertices, faces, triangle_colors, skeleton)
 
 
 def write_obj_with_uv_texture(vertices: np.ndarray, faces: np.ndarray, img_rgb: np.ndarray, grid_size: int = 75) -> Tuple[bytes, bytes]:
@@ -900,42 +955,8 @@ def write_obj_with_uv_texture(vertices: np.ndarray, faces: np.ndarray, img_rgb:
     img_height, img_width = img_rgb.shape[:2]
     
     # Compute XY bounds based ONLY on near-horizontal (top) faces (matches frontend exactly)
-    tri_verts = vertices[faces]
-    minX = np.inf
-    minY = np.inf
-    maxX = -np.inf
-    maxY = -np.inf
-    
-    # Calculate face normals to find top faces
-    v0 = tri_verts[:, 0]
-    v1 = tri_verts[:, 1]
-    v2 = tri_verts[:, 2]
-    
-    ab = v1 - v0
-    ac = v2 - v0
-    normals = np.cross(ab, ac)
-    norm_lengths = np.linalg.norm(normals, axis=1, keepdims=True)
-    norm_lengths = np.where(norm_lengths == 0, 1, norm_lengths)
-    normals_unit = normals / norm_lengths
-    nz_unit = np.abs(normals_unit[:, 2])
-    
-    # Only use top-ish faces (nz > 0.5) to determine bounds
-    top_mask = nz_unit > 0.5
-    
-    if np.any(top_mask):
-        top_tri_verts = tri_verts[top_mask]
-        for tri in top_tri_verts:
-            minX = min(minX, tri[0, 0], tri[1, 0], tri[2, 0])
-            minY = min(minY, tri[0, 1], tri[1, 1], tri[2, 1])
-            maxX = max(maxX, tri[0, 0], tri[1, 0], tri[2, 0])
-            maxY = max(maxY, tri[0, 1], tri[1, 1], tri[2, 1])
-    
-    if not (np.isfinite(minX) and np.isfinite(minY)):
-        # Fallback to bbox if no top faces detected
-        minX = vertices[:, 0].min()
-        minY = vertices[:, 1].min()
-        maxX = vertices[:, 0].max()
-        maxY = vertices[:, 1].max()
+    # (top-ish faces with |nz| > 0.5; falls back to the bbox if there are none)
+    minX, minY, maxX, maxY = (float(b) for b in compute_top_bounds(vertices, faces, compute_face_normals(vertices, faces)))
     
     sizeX = max(1e-9, maxX - minX)
     sizeY = max(1e-9, maxY - minY)
@@ -1181,7 +1202,44 @@ def write_obj_with_colors(vertices: np.ndarray, faces: np.ndarray, triangle_colo
     return obj_bytes, mtl_bytes
 
 
-def write_obj_with_vertex_colors(vertices: np.ndarray, faces: np.ndarray, triangle_colors: np.ndarray, is_normal_mode: bool = False) -> bytes:
+OBJ_VERTEX_COLORS_HEADER = (
+    "# Colored Album Cover Model\n"
+    "# Colors preserved from original PNG\n"
+    "# Vertex colors embedded directly: v x y z r g b\n"
+    "# Vertices duplicated per triangle to prevent color interpolation\n"
+    "\n"
+)
+
+
+def iter_obj_with_vertex_colors(vertices: np.ndarray, faces: np.ndarray, triangle_colors: np.ndarray) -> Iterator[bytes]:
+    """
+    Yield the vertex-color OBJ in chunks (same bytes as write_obj_with_vertex_colors).
+    Vertices are duplicated per triangle with NumPy indexing and formatted in bulk.
+    """
+    faces = np.asarray(faces)
+    num_faces = len(faces)
+    
+    yield OBJ_VERTEX_COLORS_HEADER.encode('utf-8')
+    
+    # Duplicate vertices per triangle to prevent color interpolation at edges:
+    # rows are x y z r g b with colors normalized to 0.0-1.0
+    for start in range(0, num_faces, WRITER_CHUNK_ROWS):
+        face_chunk = faces[start:start + WRITER_CHUNK_ROWS]
+        rows = np.empty((len(face_chunk) * 3, 6), dtype=np.float64)
+        rows[:, :3] = np.asarray(vertices)[face_chunk.ravel()]
+        rows[:, 3:] = np.repeat(np.asarray(triangle_colors)[start:start + WRITER_CHUNK_ROWS] / 255.0, 3, axis=0)
+        for text in iter_formatted_rows("v %.6f %.6f %.6f %.6f %.6f %.6f\n", rows, chunk_rows=len(rows)):
+            yield text.encode('utf-8')
+    
+    # Faces (1-indexed); each line is prefixed with a newline so the blank separator line
+    # comes first and the file has no trailing newline
+    face_indices = np.arange(1, num_faces * 3 + 1, dtype=np.int64).reshape(-1, 3)
+    for text in iter_formatted_rows("\nf %d %d %d", face_indices):
+        yield text.encode('utf-8')
+
+
+def write_obj_with_vertex_colors(vertices: np.ndarray, faces: np.ndarray, triangle_colors: np.ndarray, is_normal_mode: bool = False,
+                                 skeleton: Optional['OutputSkeleton'] = None) -> bytes:
     """
     Write OBJ file with vertex colors embedded directly in vertex lines.
     Format: v x y z r g b (extended OBJ format widely supported by 3D software)
@@ -1193,79 +1251,159 @@ def write_obj_with_vertex_colors(vertices: np.ndarray, faces: np.ndarray, triang
         faces: Array of face indices
         triangle_colors: Array of RGB colors for each triangle (0-255 range)
         is_normal_mode: If True (48x48), preserves all colors. If False, ensures 4-color palette.
+        skeleton: Precomputed OutputSkeleton for this mesh; colors are spliced into its bytes.
     """
     if is_normal_mode:
         print(f"✅ Creating OBJ with vertex colors (Normal mode - all colors preserved)")
     else:
         print(f"✅ Creating OBJ with vertex colors (4-color palette)")
     
-    # Create OBJ file with vertex colors
-    obj_content = []
-    obj_content.append("# Colored Album Cover Model")
-    obj_content.append("# Colors preserved from original PNG")
-    obj_content.append("# Vertex colors embedded directly: v x y z r g b")
-    obj_content.append("# Vertices duplicated per triangle to prevent color interpolation")
-    obj_content.append("")
-    
-    # Build all vertices with their colors
-    # Duplicate vertices per triangle to prevent color interpolation at edges
-    all_vertices = []
-    all_vertex_colors = []
-    all_faces = []
-    
-    for face_idx, face in enumerate(faces):
-        # Get the three vertices for this triangle
-        v0 = vertices[face[0]]
-        v1 = vertices[face[1]]
-        v2 = vertices[face[2]]
-        
-        # Get triangle color (normalize to 0.0-1.0 for OBJ vertex colors)
-        r, g, b = triangle_colors[face_idx]
-        r_norm = r / 255.0
-        g_norm = g / 255.0
-        b_norm = b / 255.0
-        
-        # Add vertices and their colors
-        vertex_base_idx = len(all_vertices)
-        all_vertices.append(v0)
-        all_vertex_colors.append((r_norm, g_norm, b_norm))
-        all_vertices.append(v1)
-        all_vertex_colors.append((r_norm, g_norm, b_norm))
-        all_vertices.append(v2)
-        all_vertex_colors.append((r_norm, g_norm, b_norm))
-        
-        # Create new face indices (1-indexed for OBJ)
-        all_faces.append((vertex_base_idx + 1, vertex_base_idx + 2, vertex_base_idx + 3))
-    
-    # Write vertices with colors embedded directly: v x y z r g b
-    # This is the extended OBJ format that's widely supported
-    for i, v in enumerate(all_vertices):
-        r, g, b = all_vertex_colors[i]
-        obj_content.append(f"v {v[0]:.6f} {v[1]:.6f} {v[2]:.6f} {r:.6f} {g:.6f} {b:.6f}")
-    
-    obj_content.append("")
-    
-    # Write faces
-    for v1, v2, v3 in all_faces:
-        obj_content.append(f"f {v1} {v2} {v3}")
-    
-    obj_bytes = "\n".join(obj_content).encode('utf-8')
+    if skeleton is not None:
+        obj_bytes = skeleton.obj_bytes(triangle_colors)
+    else:
+        obj_bytes = b"".join(iter_obj_with_vertex_colors(vertices, faces, triangle_colors))
     
-    unique_colors = len(set(tuple(c) for c in triangle_colors))
-    print(f"✅ Created OBJ with vertex colors ({unique_colors} unique colors, {len(all_vertices)} vertices)")
+    unique_colors = len(index_unique_colors(triangle_colors)[0]) if len(triangle_colors) else 0
+    print(f"✅ Created OBJ with vertex colors ({unique_colors} unique colors, {len(faces) * 3} vertices)")
     return obj_bytes
 
 
-def generate_3mf_from_inputs(stl_bytes: bytes, png_bytes: bytes, grid_size: int = 75) -> bytes:
+# "%.6f" text of c / 255.0 for every channel value; always 8 bytes ("0.xxxxxx" or "1.000000")
+OBJ_CHANNEL_DIGITS = np.array([list(("%.6f" % (c / 255.0)).encode('ascii')) for c in range(256)], dtype=np.uint8)
+# Width of the " r g b\n" tail of an OBJ vertex line, not counting the leading space
+OBJ_COLOR_FIELD_WIDTH = 27
+
+
+class OutputSkeleton:
     """
-    Generate 3MF file with per-triangle colors that match frontend exactly
-    Uses the same color mapping logic as the frontend 3D viewer
-    Falls back to OBJ if 3MF library is not available
+    Constant byte segments of the OBJ and 3MF outputs for one mesh.
+    Vertex coordinates and face topology never change for a grid template,
+    so each order only splices its per-face colors into these bytes.
     """
-    # Check if 3MF is available
-    if _three_mf is None:
-        raise RuntimeError("3MF library not available. Please install: pip install lib3mf")
     
+    def __init__(self, vertices: np.ndarray, faces: np.ndarray):
+        vertices = np.asarray(vertices, dtype=np.float64)
+        faces = np.asarray(faces, dtype=np.int64)
+        self.num_faces = len(faces)
+        
+        # OBJ: every vertex line ends with a fixed-width color field, so format the
+        # lines once with black and remember where each color field starts
+        vertex_lines = "".join(iter_formatted_rows(
+            "v %.6f %.6f %.6f 0.000000 0.000000 0.000000\n", vertices[faces.ravel()]
+        )).encode('ascii')
+        self.obj_vertex_block = np.frombuffer(vertex_lines, dtype=np.uint8)
+        self.obj_color_offsets = np.flatnonzero(self.obj_vertex_block == ord('\n')) - (OBJ_COLOR_FIELD_WIDTH - 1)
+        face_indices = np.arange(1, self.num_faces * 3 + 1, dtype=np.int64).reshape(-1, 3)
+        self.obj_face_block = "".join(iter_formatted_rows("\nf %d %d %d", face_indices)).encode('ascii')
+        
+        # 3MF: the vertex block is constant; triangle lines only differ in colorid
+        self.model_vertex_block = "".join(iter_formatted_rows(
+            '          <vertex x="%r" y="%r" z="%r"/>\n', vertices
+        )).encode('ascii')
+        self.model_triangle_prefixes = [
+            b'          <triangle v1="%d" v2="%d" v3="%d" colorid="' % (a, b, c) for a, b, c in faces.tolist()
+        ]
+    
+    @property
+    def nbytes(self) -> int:
+        return (self.obj_vertex_block.nbytes + self.obj_color_offsets.nbytes + len(self.obj_face_block)
+                + len(self.model_vertex_block) + sum(len(p) for p in self.model_triangle_prefixes))
+    
+    def obj_bytes(self, triangle_colors: np.ndarray) -> bytes:
+        """Same bytes as write_obj_with_vertex_colors, spliced from the skeleton"""
+        block = self.obj_vertex_block.copy()
+        line_colors = np.repeat(np.asarray(triangle_colors, dtype=np.uint8), 3, axis=0)
+        for channel in range(3):
+            digits = OBJ_CHANNEL_DIGITS[line_colors[:, channel]]
+            base = self.obj_color_offsets + channel * 9
+            for j in range(OBJ_CHANNEL_DIGITS.shape[1]):
+                block[base + j] = digits[:, j]
+        return OBJ_VERTEX_COLORS_HEADER.encode('ascii') + block.tobytes() + self.obj_face_block
+    
+    def iter_3mf_model_xml(self, triangle_colors: np.ndarray) -> Iterator[bytes]:
+        """Same document as iter_3mf_model_xml, spliced from the skeleton"""
+        unique_colors, color_indices = index_unique_colors(triangle_colors)
+        print(f"✅ Found {len(unique_colors)} unique colors for {self.num_faces} triangles")
+        
+        yield THREE_MF_MODEL_HEADER.encode('utf-8')
+        yield b'  <color:colorresources id="1">\n    <color:colors>\n'
+        for text in iter_formatted_rows('      <color:color r="%d" g="%d" b="%d"/>\n', unique_colors):
+            yield text.encode('ascii')
+        yield b'    </color:colors>\n  </color:colorresources>\n'
+        
+        yield THREE_MF_MESH_OPEN.encode('utf-8')
+        yield self.model_vertex_block
+        yield THREE_MF_MESH_MIDDLE.encode('utf-8')
+        suffixes = [b'%d"/>\n' % i for i in range(len(unique_colors))]
+        pieces = [None] * (2 * WRITER_CHUNK_ROWS)
+        for start in range(0, self.num_faces, WRITER_CHUNK_ROWS):
+            prefixes = self.model_triangle_prefixes[start:start + WRITER_CHUNK_ROWS]
+            count = len(prefixes)
+            pieces[0:2 * count:2] = prefixes
+            pieces[1:2 * count:2] = [suffixes[i] for i in color_indices[start:start + count].tolist()]
+            yield b"".join(pieces[:2 * count])
+        yield THREE_MF_MESH_CLOSE.encode('utf-8')
+
+
+OUTPUT_SKELETON_CACHE_SIZE = int(os.getenv('OUTPUT_SKELETON_CACHE_SIZE', 4))
+_output_skeletons: 'OrderedDict[str, OutputSkeleton]' = OrderedDict()
+_output_skeletons_lock = threading.Lock()
+# One build lock per template being built: a build takes seconds, so it runs outside
+# _output_skeletons_lock and only callers of the same template wait for it
+_output_skeleton_builds: Dict[str, threading.Lock] = {}
+
+
+def _cached_output_skeleton(template_id: str) -> Optional[OutputSkeleton]:
+    with _output_skeletons_lock:
+        skeleton = _output_skeletons.get(template_id)
+        if skeleton is not None:
+            _output_skeletons.move_to_end(template_id)
+        return skeleton
+
+
+def get_output_skeleton(mesh: GridTemplate) -> Optional[OutputSkeleton]:
+    """
+    Output skeleton for a server grid template, uploaded or procedural (built once,
+    then LRU-cached). Returns None for STLs uploaded with a request, which are usually one-off meshes.
+    """
+    if (mesh.stl_path is None and not mesh.procedural) or OUTPUT_SKELETON_CACHE_SIZE <= 0:
+        return None
+    template_id = mesh.template_id
+    skeleton = _cached_output_skeleton(template_id)
+    if skeleton is not None:
+        return skeleton
+    with _output_skeletons_lock:
+        build_lock = _output_skeleton_builds.setdefault(template_id, threading.Lock())
+    with build_lock:
+        skeleton = _cached_output_skeleton(template_id)
+        if skeleton is not None:
+            return skeleton
+        try:
+            print(f"⚙️  Building output skeleton for {template_id}")
+            skeleton = OutputSkeleton(mesh.vertices, mesh.faces)
+            with _output_skeletons_lock:
+                _output_skeletons[template_id] = skeleton
+                while len(_output_skeletons) > OUTPUT_SKELETON_CACHE_SIZE:
+                    _output_skeletons.popitem(last=False)
+        finally:
+            with _output_skeletons_lock:
+                _output_skeleton_builds.pop(template_id, None)
+    return skeleton
+
+
+class Design(NamedTuple):
+    """Decoded design: the pixels triangles are mapped from, plus a hash of what they encode"""
+    image: np.ndarray          # (H, W, 3) uint8; already snapped to the palette for pixelated modes
+    is_normal_mode: bool
+    design_hash: str
+
+
+def prepare_design(png_bytes: bytes, grid_size: int = 75) -> Design:
+    """
+    Decode the PNG and, for pixelated modes, quantize every grid pixel to the active palette.
+    The design hash covers the palette-index grid (or the raw pixels in Normal mode), so
+    different encodings of the same cover produce the same hash.
+    """
     # For Normal mode (48), keep full resolution; otherwise resize to grid_size
     is_normal_mode = (grid_size == 48)
     if is_normal_mode:
@@ -1273,23 +1411,157 @@ def generate_3mf_from_inputs(stl_bytes: bytes, png_bytes: bytes, grid_size: int
     else:
         img = load_png(png_bytes, grid_size)
     img_array = get_png_as_array(img)
-    vertices, faces = load_stl_vertices_faces(stl_bytes)
     
-    # For Normal mode, use actual image dimensions; otherwise use grid_size
-    mapping_grid_size = img_array.shape[0] if is_normal_mode else grid_size
-    triangle_colors = get_triangle_colors_from_image(vertices, faces, img_array, mapping_grid_size)
+    if is_normal_mode:
+        # Normal mode uses exact colors from image (no quantization)
+        design_hash = make_cache_key('rgb', img_array.shape, img_array.tobytes())
+        return Design(img_array, True, design_hash)
     
-    # For Normal mode: use exact colors from image (no quantization)
-    # For pixelated modes: quantize to 4 colors
-    if not is_normal_mode:
-        triangle_colors = quantize_to_four_colors(triangle_colors)
-        print(f"✅ Generating 3MF with per-triangle colors (4-color palette)")
+    palette, names = get_active_palette()
+    quantizer = get_quantizer(palette, names)
+    palette_indices = quantizer.quantize(img_array.reshape(-1, 3))
+    quantizer.log_stats(palette_indices, unit='pixels')
+    design_hash = make_cache_key('palette', img_array.shape, quantizer.palette.tobytes(), palette_indices.tobytes())
+    return Design(quantizer.to_rgb(palette_indices).reshape(img_array.shape), False, design_hash)
+
+
+def map_colors_from_design(design: Design, mesh: GridTemplate, grid_size: int = 75) -> np.ndarray:
+    """Map triangles to design pixels (per-triangle RGB, already in the palette for pixelated modes)"""
+    # For Normal mode, use actual image dimensions; otherwise use grid_size
+    mapping_grid_size = design.image.shape[0] if design.is_normal_mode else grid_size
+    triangle_colors = get_triangle_colors_from_image(mesh.vertices, mesh.faces, design.image, mapping_grid_size,
+                                                     centroids=mesh.centroids, top_bounds=mesh.top_bounds,
+                                                     mesh_key=mesh.template_id)
+    if design.is_normal_mode:
+        print(f"⚙️  Using exact colors from image (Normal mode)")
+    else:
+        print(f"⚙️  Quantized to {len(get_active_palette()[0])}-color palette")
+    return triangle_colors
+
+
+def map_colors_from_inputs(stl_bytes: Optional[bytes], png_bytes: bytes, grid_size: int = 75) -> Tuple[GridTemplate, np.ndarray, bool]:
+    """
+    Shared first stage of OBJ/3MF generation: load image and mesh, map triangles to pixels,
+    and quantize to the filament palette for pixelated modes.
+    Returns: (mesh, triangle_colors, is_normal_mode)
+    """
+    design = prepare_design(png_bytes, grid_size)
+    mesh = load_mesh_for_request(stl_bytes, grid_size)
+    return mesh, map_colors_from_design(design, mesh, grid_size), design.is_normal_mode
+
+
+def mesh_cache_id(stl_bytes: Optional[bytes], grid_size: int) -> str:
+    """Identity of the mesh a request will use: uploaded STL hash or grid template id"""
+    template = matching_grid_template(stl_bytes, grid_size)
+    if template is not None:
+        return template.template_id
+    if stl_bytes:
+        return hashlib.sha256(stl_bytes).hexdigest()
+    if grid_templates.has_template(grid_size):
+        return grid_templates.get(grid_size).template_id
+    raise ValueError(f"No STL uploaded and no {grid_size}x{grid_size} grid template on the server")
+
+
+def result_cache_key(stl_bytes: Optional[bytes], png_bytes: bytes, grid_size: int, output_format: str) -> str:
+    """
+    Content address of a generated file: mesh (STL hash or template id), PNG bytes,
+    grid size, output format and the active palette (so palette edits never serve stale files)
+    """
+    palette, _ = get_active_palette()
+    return make_cache_key(output_format, mesh_cache_id(stl_bytes, grid_size), png_bytes, int(grid_size), palette)
+
+
+def design_cache_key(stl_bytes: Optional[bytes], design: Design, grid_size: int, output_format: str) -> str:
+    """Content address of a generated file by design (see prepare_design) rather than PNG bytes"""
+    return make_cache_key(output_format, mesh_cache_id(stl_bytes, grid_size), 'design', design.design_hash, int(grid_size))
+
+
+def generate_cached_file(stl_bytes: Optional[bytes], png_bytes: bytes, grid_size: int, output_format: str,
+                         render: Callable[[GridTemplate, np.ndarray, bool], bytes]) -> Tuple[str, bytes]:
+    """
+    Look a generated file up by exact inputs, then by design hash, and only render it
+    when neither matches. The input key is aliased to the design entry so repeats of
+    the same upload skip decoding entirely.
+    Returns: (cache key of the stored file, file bytes)
+    """
+    cache = get_result_cache()
+    input_key = result_cache_key(stl_bytes, png_bytes, grid_size, output_format)
+    data = cache.get(input_key)
+    if data is not None:
+        print(f"♻️  Serving cached {output_format.upper()} ({len(data)} bytes)")
+        return input_key, data
+    
+    design = prepare_design(png_bytes, grid_size)
+    design_key = design_cache_key(stl_bytes, design, grid_size, output_format)
+    data = cache.get(design_key)
+    if data is not None:
+        print(f"♻️  Design {design.design_hash[:12]} already generated, reusing {output_format.upper()}")
     else:
-        print(f"✅ Generating 3MF with per-triangle colors (exact colors from image)")
+        mesh = load_mesh_for_request(stl_bytes, grid_size)
+        triangle_colors = map_colors_from_design(design, mesh, grid_size)
+        data = render(mesh, triangle_colors, design.is_normal_mode)
+        cache.put(design_key, data)
+    cache.alias(input_key, design_key)
+    return design_key, data
+
+
+def iter_3mf_from_inputs(stl_bytes: Optional[bytes], png_bytes: bytes, grid_size: int = 75) -> Iterator[bytes]:
+    """
+    Map colors eagerly (so input errors raise here), then return an iterator
+    that streams the 3MF package in chunks.
+    Served from the result cache when the same inputs (or the same design) were generated before.
+    With the generation process pool enabled the package is built there and sent in one piece.
+    """
+    if generation_service.enabled:
+        return iter([generate_3mf_file(stl_bytes, png_bytes, grid_size)[1]])
+    
+    cache = get_result_cache()
+    input_key = result_cache_key(stl_bytes, png_bytes, grid_size, '3mf')
+    cached = cache.get(input_key)
+    if cached is None:
+        design = prepare_design(png_bytes, grid_size)
+        design_key = design_cache_key(stl_bytes, design, grid_size, '3mf')
+        cached = cache.get(design_key)
+        if cached is not None:
+            cache.alias(input_key, design_key)
+    if cached is not None:
+        print(f"♻️  Serving cached 3MF ({len(cached)} bytes)")
+        return iter([cached])
+    
+    mesh = load_mesh_for_request(stl_bytes, grid_size)
+    triangle_colors = map_colors_from_design(design, mesh, grid_size)
+    chunks = iter_3mf_vertex_colors(mesh.vertices, mesh.faces, triangle_colors, get_output_skeleton(mesh))
+    
+    def stream_and_store():
+        streamed = []
+        for chunk in chunks:
+            streamed.append(chunk)
+            yield chunk
+        cache.put(design_key, b"".join(streamed))
+        cache.alias(input_key, design_key)
+    
+    return stream_and_store()
+
+
+def generate_3mf_file(stl_bytes: Optional[bytes], png_bytes: bytes, grid_size: int = 75) -> Tuple[str, bytes]:
+    """
+    Generate (or reuse) the per-triangle color 3MF for these inputs.
+    Runs in the generation process pool when it is enabled.
+    Returns: (result cache key, 3mf_bytes); the key can be passed to save_generated_file.
+    """
+    # Check if 3MF is available
+    if _three_mf is None:
+        raise RuntimeError("3MF library not available. Please install: pip install lib3mf")
+    
+    if generation_service.enabled:
+        return generate_in_service('3mf', stl_bytes, png_bytes, grid_size)
+    
+    def render(mesh, triangle_colors, is_normal_mode):
+        print(f"✅ Generating 3MF with per-triangle colors")
+        return write_3mf(mesh.vertices, mesh.faces, triangle_colors, get_output_skeleton(mesh))
     
     try:
-        three_mf_bytes = write_3mf(vertices, faces, triangle_colors)
-        return three_mf_bytes
+        return generate_cached_file(stl_bytes, png_bytes, grid_size, '3mf', render)
     except Exception as e:
         error_msg = str(e)
         if "Lib3MFException" in error_msg or "COULDNOTLOADLIBRARY" in error_msg or ".dylib" in error_msg:
@@ -1301,40 +1573,142 @@ def generate_3mf_from_inputs(stl_bytes: bytes, png_bytes: bytes, grid_size: int
         raise
 
 
-def generate_obj_from_inputs(stl_bytes: bytes, png_bytes: bytes, grid_size: int = 75) -> Tuple[bytes, bytes, bytes]:
+def generate_3mf_from_inputs(stl_bytes: Optional[bytes], png_bytes: bytes, grid_size: int = 75) -> bytes:
+    """
+    Generate 3MF file with per-triangle colors that match frontend exactly
+    Uses the same color mapping logic as the frontend 3D viewer
+    Falls back to OBJ if 3MF library is not available
+    Pass stl_bytes=None to use the server's grid template for grid_size.
+    """
+    _, data = generate_3mf_file(stl_bytes, png_bytes, grid_size)
+    return data
+
+
+def generate_obj_file(stl_bytes: Optional[bytes], png_bytes: bytes, grid_size: int = 75) -> Tuple[str, bytes]:
+    """
+    Generate (or reuse) the vertex-color OBJ for these inputs.
+    Runs in the generation process pool when it is enabled.
+    Returns: (result cache key, obj_bytes); the key can be passed to save_generated_file.
+    """
+    if generation_service.enabled:
+        return generate_in_service('obj', stl_bytes, png_bytes, grid_size)
+    
+    def render(mesh, triangle_colors, is_normal_mode):
+        print(f"⚙️  Generating OBJ with vertex colors")
+        # Generate OBJ with vertex colors (primary method for Bambu Studio)
+        return write_obj_with_vertex_colors(mesh.vertices, mesh.faces, triangle_colors, is_normal_mode,
+                                            skeleton=get_output_skeleton(mesh))
+    
+    return generate_cached_file(stl_bytes, png_bytes, grid_size, 'obj', render)
+
+
+def generate_obj_from_inputs(stl_bytes: Optional[bytes], png_bytes: bytes, grid_size: int = 75) -> Tuple[bytes, bytes, bytes]:
     """
     Generate OBJ file with vertex colors (vc commands) for Bambu Studio compatibility.
     Uses vertex colors as primary method (more compatible than MTL materials).
+    Pass stl_bytes=None to use the server's grid template for grid_size.
+    Identical requests and identical designs are served from the result cache.
     Returns: (obj_bytes, empty bytes, None)
     """
-    # For Normal mode (48), keep full resolution; otherwise resize to grid_size
-    is_normal_mode = (grid_size == 48)
-    if is_normal_mode:
-        img = load_png(png_bytes, target_size=None)  # Keep full resolution
-    else:
-        img = load_png(png_bytes, grid_size)
-    img_array = get_png_as_array(img)
-    vertices, faces = load_stl_vertices_faces(stl_bytes)
-    
-    # For Normal mode, use actual image dimensions; otherwise use grid_size
-    mapping_grid_size = img_array.shape[0] if is_normal_mode else grid_size
-    triangle_colors = get_triangle_colors_from_image(vertices, faces, img_array, mapping_grid_size)
-    
-    # For Normal mode: use exact colors from image (no quantization)
-    # For pixelated modes: quantize to 4 colors
-    if not is_normal_mode:
-        triangle_colors = quantize_to_four_colors(triangle_colors)
-        print(f"⚙️  Generating OBJ with vertex colors (4-color palette)")
-    else:
-        print(f"⚙️  Generating OBJ with vertex colors (exact colors from image)")
-    
-    # Generate OBJ with vertex colors (primary method for Bambu Studio)
-    obj_bytes = write_obj_with_vertex_colors(vertices, faces, triangle_colors, is_normal_mode)
+    _, obj_bytes = generate_obj_file(stl_bytes, png_bytes, grid_size)
     
     # Return OBJ bytes, empty MTL bytes, and None for texture
     return obj_bytes, b"", None
 
 
+def _generate_in_worker(output_format: str, stl_ref: SharedRef, png_ref: SharedRef, grid_size: int) -> Tuple[str, SharedRef]:
+    """Generation process pool entry point: inputs and result travel through shared memory"""
+    generators = {'obj': generate_obj_file, '3mf': generate_3mf_file}
+    cache_key, data = generators[output_format](read_shared_bytes(stl_ref), read_shared_bytes(png_ref), grid_size)
+    result_ref, block = share_bytes(data)
+    block.close()  # The parent copies the result out and unlinks the block
+    return cache_key, result_ref
+
+
+def _warm_generation_worker():
+    """Generation process pool initializer: importing this module already loaded templates and lib3mf"""
+    # Workers share the disk tier of the result cache; the parent keeps the memory tier
+    os.environ['RESULT_CACHE_MEMORY_MB'] = '0'
+    for size in SUPPORTED_GRID_SIZES:
+        if grid_templates.has_template(size):
+            get_output_skeleton(grid_templates.get(size))
+    print(f"✅ Generation worker {os.getpid()} ready (3MF {'available' if _three_mf is not None else 'unavailable'})")
+
+
+generation_service = create_generation_service(_generate_in_worker, _warm_generation_worker)
+
+
+def generate_in_service(output_format: str, stl_bytes: Optional[bytes], png_bytes: bytes, grid_size: int) -> Tuple[str, bytes]:
+    """
+    Generate through the process pool, answering exact repeats from this process's cache first.
+    Returns: (result cache key, file bytes)
+    """
+    cache = get_result_cache()
+    input_key = result_cache_key(stl_bytes, png_bytes, grid_size, output_format)
+    data = cache.get(input_key)
+    if data is not None:
+        print(f"♻️  Serving cached {output_format.upper()} ({len(data)} bytes)")
+        return input_key, data
+    
+    # Requests are turned away with a 429 when every slot is busy; background jobs and
+    # order builds have nobody waiting on a socket, so they queue for a slot instead
+    cache_key, data = generation_service.run(output_format, stl_bytes, png_bytes, grid_size,
+                                             block=not has_request_context())
+    # The worker already wrote the disk tier
+    cache.put(cache_key, data, persist=False)
+    cache.alias(input_key, cache_key)
+    return cache_key, data
+
+
+def save_generated_file(cache_key: str, data: bytes, path: str):
+    """
+    Save a generated file into an order folder, hard-linking the result cache entry
+    when possible so repeated designs share one copy on disk.
+    """
+    if get_result_cache().link_to(cache_key, path):
+        return
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def build_order_model(order_id: str, order_dir: str, state: dict):
+    """Generate model.obj for a checkout order from the inputs saved in its folder"""
+    grid_size = int(state['grid_size'])
+    with open(os.path.join(order_dir, 'original.png'), 'rb') as f:
+        png_bytes = f.read()
+    stl_bytes = None
+    if state.get('stl_uploaded'):
+        with open(os.path.join(order_dir, 'model.stl'), 'rb') as f:
+            stl_bytes = f.read()
+    obj_cache_key, obj_bytes = generate_obj_file(stl_bytes, png_bytes, grid_size)
+    save_generated_file(obj_cache_key, obj_bytes, os.path.join(order_dir, 'model.obj'))
+
+
+order_models = OrderModelBuilder('orders', build_order_model,
+                                 max_workers=int(os.getenv('ORDER_GENERATION_WORKERS', 1)),
+                                 stale_seconds=float(os.getenv('ORDER_GENERATION_STALE_SECONDS', 600)))
+set_order_model_builder(order_models)
+
+
+# Parse the grid STLs once at startup (later workers reuse the .npy cache)
+grid_templates.preload()
+
+# Fingerprint and precompress static assets before the first page render needs them
+if not in_generation_worker():
+    get_asset_store().preload()
+
+# Shopify webhooks are processed from the durable outbox, not inside the request
+if WEBHOOK_HANDLERS_AVAILABLE and not in_generation_worker():
+    webhook_outbox = get_webhook_outbox()
+    webhook_outbox.register('orders/create', handle_order_create)
+    webhook_outbox.register('orders/paid', handle_order_paid)
+    webhook_outbox.start()
+
+# Mirror Shopify orders locally; webhooks keep it current, the reconcile catches anything they missed
+if SHOPIFY_API_AVAILABLE and not in_generation_worker() and get_shopify_api().is_configured():
+    get_shopify_order_mirror().start(get_shopify_api(), interval=float(os.getenv('SHOPIFY_RECONCILE_SECONDS', 900)))
+
+
 # Flask app
 app = Flask(__name__)
 # Enable CORS for frontend access - allow all origins for admin panel and Hostinger domain
@@ -1359,6 +1733,86 @@ def after_request(response):
     return response
 
 
+def bootstrap_sources() -> dict:
+    """Startup data inlined into the storefront pages (the same documents the /api endpoints serve)"""
+    sources = {name: get_config(name).get() for name in ('content', 'prices', 'images')}
+    variants = get_variant_ids()
+    body = json.dumps(variants, separators=(',', ':'), sort_keys=True).encode('utf-8')
+    sources['variants'] = ConfigSnapshot(variants, body, hashlib.sha256(body).hexdigest()[:32])
+    return sources
+
+
+page_cache = PageCache(bootstrap_sources, get_asset_store())
+
+
+def render_page(path: str) -> Response:
+    """
+    Send an HTML page with its bootstrap data, precompressed if the client accepts it.
+    Pages always revalidate (they carry the bootstrap data); a repeat visit gets a 304.
+    """
+    page = page_cache.render(path)
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding', ''), page.encodings)
+    response = Response(page.encodings[encoding] if encoding else page.body, mimetype='text/html')
+    response.set_etag(f'{page.etag}-{encoding}' if encoding else page.etag)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+
+# Behind nginx, set to an internal location aliased to the app directory
+# (location /_protected/ { internal; alias /app/; }) and nginx streams asset bodies itself
+X_ACCEL_REDIRECT_PREFIX = os.getenv('X_ACCEL_REDIRECT_PREFIX')
+
+
+def send_asset(asset: Asset, immutable: bool) -> Response:
+    """
+    Send a static asset, precompressed if the client accepts it. Fingerprinted URLs are
+    cached for a year; plain paths revalidate against the content-hash ETag.
+    Handles If-None-Match and Range (ranges are served from the identity body, so their
+    offsets are the file's); the body goes out through the WSGI file wrapper
+    (sendfile under gunicorn) or, with X_ACCEL_REDIRECT_PREFIX, through nginx.
+    """
+    encoding = None
+    if 'Range' not in request.headers:
+        encoding = negotiate_encoding(request.headers.get('Accept-Encoding', ''), asset.encodings)
+    path = asset.encodings[encoding] if encoding else asset.path
+    etag = f'{asset.digest[:32]}-{encoding}' if encoding else asset.digest[:32]
+    if X_ACCEL_REDIRECT_PREFIX:
+        response = Response(mimetype=asset.mimetype)
+        response.set_etag(etag)
+        response = response.make_conditional(request)
+        if response.status_code != 304:
+            internal_path = os.path.relpath(path, os.getcwd()).replace(os.sep, '/')
+            response.headers['X-Accel-Redirect'] = f"{X_ACCEL_REDIRECT_PREFIX.rstrip('/')}/{internal_path}"
+    else:
+        response = send_file(path, mimetype=asset.mimetype, etag=etag, conditional=True, max_age=None)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if immutable else 'no-cache'
+    return response
+
+
+@app.route('/assets/<digest>/<path:relpath>')
+def serve_asset(digest, relpath):
+    """Serve a fingerprinted static asset (an outdated fingerprint still gets the current file, uncached)"""
+    asset = get_asset_store().get(relpath)
+    if asset is None:
+        return jsonify({'error': 'Asset not found'}), 404
+    return send_asset(asset, immutable=digest == asset.digest[:16])
+
+
+@app.route('/js/<path:filename>')
+def serve_js(filename):
+    """Serve page scripts by their plain path (pages reference the fingerprinted URL)"""
+    asset = get_asset_store().get(f'js/{filename}')
+    if asset is None:
+        return jsonify({'error': 'Script not found'}), 404
+    return send_asset(asset, immutable=False)
+
+
 @app.route('/')
 def index():
     """Serve mobile or desktop version based on user agent"""
@@ -1379,25 +1833,21 @@ def index():
         if not os.path.exists(mobile_path):
             print(f"❌ Mobile file not found at: {mobile_path}")
             return jsonify({'error': f'Mobile file not found: {mobile_path}'}), 404
-        response = send_file(mobile_path)
-        response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-        return response
+        return render_page(mobile_path)
     elif force_desktop:
-        desktop_path = os.path.join(os.path.dirname(__file__), 'Almost finnished.html')
-        return send_file(desktop_path)
+        desktop_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Almost finnished.html')
+        return render_page(desktop_path)
     elif is_mobile:
         # Serve mobile version
         mobile_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mobile', 'index.html')
         if not os.path.exists(mobile_path):
             print(f"❌ Mobile file not found at: {mobile_path}")
             return jsonify({'error': f'Mobile file not found: {mobile_path}'}), 404
-        response = send_file(mobile_path)
-        response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-        return response
+        return render_page(mobile_path)
     else:
         # Serve desktop version
-        desktop_path = os.path.join(os.path.dirname(__file__), 'Almost finnished.html')
-        return send_file(desktop_path)
+        desktop_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Almost finnished.html')
+        return render_page(desktop_path)
 
 @app.route('/mobile')
 def mobile():
@@ -1428,12 +1878,7 @@ def mobile():
                 'cwd': os.getcwd()
             }), 404
     
-    response = send_file(mobile_path)
-    # Force no-cache to prevent browser caching issues
-    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '0'
-    return response
+    return render_page(mobile_path)
 
 @app.route('/mobile/fresh')
 @app.route('/mobile/<int:timestamp>')
@@ -1443,41 +1888,39 @@ def mobile_fresh(timestamp=None):
     if not os.path.exists(mobile_path):
         print(f"❌ Mobile file not found at: {mobile_path}")
         return jsonify({'error': f'Mobile file not found: {mobile_path}'}), 404
-    response = send_file(mobile_path)
-    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '0'
-    return response
+    return render_page(mobile_path)
 
 @app.route('/desktop')
 @app.route('/desktop/mobile')
 def desktop():
     """Force desktop version (accessible from mobile via /desktop or /desktop/mobile)"""
-    desktop_path = os.path.join(os.path.dirname(__file__), 'Almost finnished.html')
-    response = send_file(desktop_path)
-    # Force no-cache to prevent browser caching issues
-    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '0'
-    return response
+    desktop_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Almost finnished.html')
+    return render_page(desktop_path)
+
+
+def queue_full_response(error: QueueFullError):
+    """429 telling the client when to retry"""
+    response = jsonify({'error': str(error), 'retry_after': error.retry_after})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 429
 
 
 @app.route('/generate', methods=['POST'])
 def generate():
     """
     Accepts multipart/form-data with:
-    - stl: STL file
+    - stl: STL file (optional - the server's grid template for grid_size is used if omitted)
     - png: PNG file
+    - grid_size: 48, 75 or 96
     Returns: OBJ file with vertex colors (Bambu Studio compatible)
     """
     try:
-        if 'stl' not in request.files or 'png' not in request.files:
-            return jsonify({'error': 'Missing stl or png file'}), 400
+        if 'png' not in request.files:
+            return jsonify({'error': 'Missing png file'}), 400
 
-        stl_file = request.files['stl']
         png_file = request.files['png']
 
-        stl_bytes = stl_file.read()
+        stl_bytes = request.files['stl'].read() if 'stl' in request.files else None
         png_bytes = png_file.read()
 
         grid_size = int(request.form.get('grid_size', 75))
@@ -1493,6 +1936,8 @@ def generate():
             download_name='output.obj'
         )
 
+    except QueueFullError as e:
+        return queue_full_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1501,8 +1946,9 @@ def generate():
 def generate_obj_route():
     """
     Accepts multipart/form-data with:
-    - stl: STL file
+    - stl: STL file (optional - the server's grid template for grid_size is used if omitted)
     - png: PNG file
+    - grid_size: 48, 75 or 96
     Returns: ZIP file containing OBJ + MTL files
     """
     import zipfile
@@ -1511,23 +1957,23 @@ def generate_obj_route():
     try:
         print("🎨 OBJ generation request received")
         
-        if 'stl' not in request.files or 'png' not in request.files:
+        if 'png' not in request.files:
             print("❌ Missing files in request")
-            return jsonify({'error': 'Missing stl or png file'}), 400
+            return jsonify({'error': 'Missing png file'}), 400
 
-        stl_file = request.files['stl']
+        stl_file = request.files.get('stl')
         png_file = request.files['png']
         
-        print(f"📦 STL file: {stl_file.filename}")
+        print(f"📦 STL file: {stl_file.filename if stl_file else '(server grid template)'}")
         print(f"🖼️  PNG file: {png_file.filename}")
 
-        stl_bytes = stl_file.read()
+        stl_bytes = stl_file.read() if stl_file else None
         png_bytes = png_file.read()
         
         # Get grid size from form data (default to 75 if not provided)
         grid_size = int(request.form.get('grid_size', 75))
         
-        print(f"📊 STL size: {len(stl_bytes)} bytes")
+        print(f"📊 STL size: {len(stl_bytes) if stl_bytes else 0} bytes")
         print(f"📊 PNG size: {len(png_bytes)} bytes")
         print(f"📊 Grid size: {grid_size}x{grid_size}")
 
@@ -1545,17 +1991,204 @@ def generate_obj_route():
             download_name='colored_model.obj'
         )
 
+    except QueueFullError as e:
+        return queue_full_response(e)
     except Exception as e:
         print(f"❌ Error generating OBJ: {e}")
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/generate-3mf', methods=['POST'])
+def generate_3mf_route():
+    """
+    Accepts multipart/form-data with:
+    - stl: STL file (optional - the server's grid template for grid_size is used if omitted)
+    - png: PNG file
+    - grid_size: 48, 75 or 96
+    Returns: 3MF file with per-triangle colors, streamed as it is compressed
+    """
+    try:
+        if 'png' not in request.files:
+            return jsonify({'error': 'Missing png file'}), 400
+
+        stl_bytes = request.files['stl'].read() if 'stl' in request.files else None
+        png_bytes = request.files['png'].read()
+        grid_size = int(request.form.get('grid_size', 75))
+
+        chunks = iter_3mf_from_inputs(stl_bytes, png_bytes, grid_size)
+        return Response(
+            chunks,
+            mimetype='model/3mf',
+            headers={'Content-Disposition': 'attachment; filename=colored_model.3mf'}
+        )
+
+    except QueueFullError as e:
+        return queue_full_response(e)
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+
+# Generators available to the job API, keyed by the "format" form field
+JOB_GENERATORS = {
+    'obj': (generate_obj_file, 'model/obj', 'colored_model.obj'),
+    '3mf': (generate_3mf_file, 'model/3mf', 'colored_model.3mf'),
+}
+
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """
+    Accepts the same multipart/form-data as /generate, plus:
+    - format: obj (default) or 3mf
+    Queues generation and returns the job id immediately (202).
+    Returns 429 with Retry-After when the generation queue is full.
+    """
+    try:
+        if 'png' not in request.files:
+            return jsonify({'error': 'Missing png file'}), 400
+
+        stl_bytes = request.files['stl'].read() if 'stl' in request.files else None
+        png_bytes = request.files['png'].read()
+        grid_size = int(request.form.get('grid_size', 75))
+        output_format = request.form.get('format', 'obj').lower()
+        if output_format not in JOB_GENERATORS:
+            return jsonify({'error': f'Invalid format: {output_format}. Must be one of {sorted(JOB_GENERATORS)}.'}), 400
+        generator = JOB_GENERATORS[output_format][0]
+
+        def run(artifact_path):
+            cache_key, data = generator(stl_bytes, png_bytes, grid_size)
+            save_generated_file(cache_key, data, artifact_path)
+
+        job_id = get_job_queue().submit(run, {'format': output_format, 'grid_size': grid_size})
+        print(f"🧾 Queued {output_format.upper()} generation job {job_id} ({grid_size}x{grid_size})")
+        response = jsonify({'job_id': job_id, 'status': 'queued', 'status_url': f'/jobs/{job_id}'})
+        response.headers['Location'] = f'/jobs/{job_id}'
+        return response, 202
+
+    except QueueFullError as e:
+        return queue_full_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Poll a generation job.
+    Returns the job status as JSON (202 while queued/running, 500 if it failed),
+    and the generated file itself once it is done.
+    """
+    job_queue = get_job_queue()
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    if job['status'] == 'done':
+        _, mimetype, download_name = JOB_GENERATORS[job['format']]
+        return send_file(os.path.abspath(job_queue.artifact_path(job_id)), mimetype=mimetype,
+                         as_attachment=True, download_name=download_name)
+    if job['status'] == 'failed':
+        return jsonify(job), 500
+    
+    response = jsonify(job)
+    response.headers['Retry-After'] = '1'
+    return response, 202
+
+
+# Where a grid STL may live, in order of preference
+STL_CANDIDATES = (
+    'stl_files/{size}x{size}_grid.stl',
+    'stl_files/{size}x{size}.stl',
+    'shopify-version/stl_files/{size}x{size}_grid.stl',
+    'shopify-version/stl_files/{size}x{size}.stl',
+)
+
+stl_index: Dict[int, str] = {}  # grid size -> resolved STL path
+
+
+def refresh_stl_index(size: Optional[int] = None):
+    """Resolve, hash and precompress the grid STLs (startup, and after an admin upload)"""
+    for grid_size in ([size] if size is not None else SUPPORTED_GRID_SIZES):
+        for candidate in STL_CANDIDATES:
+            relpath = candidate.format(size=grid_size)
+            if stl_assets.get(relpath) is not None:
+                stl_index[grid_size] = relpath
+                break
+        else:
+            stl_index.pop(grid_size, None)
+
+
+def get_stl_asset(size: int) -> Optional[Asset]:
+    """Indexed STL for a grid size (one stat() per call; re-resolved if the file went away)"""
+    relpath = stl_index.get(size)
+    asset = stl_assets.get(relpath) if relpath else None
+    if asset is None:
+        refresh_stl_index(size)
+        relpath = stl_index.get(size)
+        asset = stl_assets.get(relpath) if relpath else None
+    return asset
+
+
+def grid_template_stl_path(template: GridTemplate) -> str:
+    """STL file of a grid template: the uploaded STL, or the generated grid encoded once into its cache entry"""
+    if template.stl_path is not None:
+        return template.stl_path
+    return grid_templates.derived_file(template, 'grid.stl',
+                                       lambda: encode_binary_stl(template.vertices, template.faces, template.normals))
+
+
+def get_procedural_stl_asset(columns: int, rows: int) -> Asset:
+    """Binary STL of a generated grid, written once into its template cache entry"""
+    return stl_assets.get(grid_template_stl_path(grid_templates.get_procedural(columns, rows)))
+
+
+def requested_grid_rows(size: int) -> Optional[int]:
+    """?rows= of a grid request (rectangular grids), defaulting to size; None if out of range"""
+    rows = request.args.get('rows', size, type=int)
+    if not (is_valid_grid_size(size) and rows is not None and is_valid_grid_size(rows)):
+        return None
+    return rows
+
+
+def is_offered_grid(columns: int, rows: Optional[int] = None) -> bool:
+    """
+    Whether the public routes serve a grid: the supported sizes, sizes with an uploaded
+    STL, and every "{columns}x{rows}" priced in prices.json. Anything else is generated
+    from the admin panel only (/admin/grids/api), so anonymous requests can't fill the
+    template cache with arbitrary sizes.
+    """
+    rows = rows or columns
+    if rows == columns and (columns in SUPPORTED_GRID_SIZES or grid_templates.has_stl(columns)):
+        return True
+    try:
+        return f"{columns}x{rows}" in get_config('prices').get().data
+    except Exception as e:
+        print(f"⚠️  Warning: Could not load prices: {e}")
+        return False
+
+
+def grid_not_offered_response(columns: int, rows: int):
+    """404 for a grid size the shop does not sell"""
+    response = jsonify({'error': f'Grid size {columns}x{rows} is not offered.'})
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    return response, 404
+
+
+if not in_generation_worker():
+    refresh_stl_index()
+
+
 @app.route('/get-stl/<int:size>', methods=['GET', 'OPTIONS'])
 def get_stl(size):
     """
     Serves the pre-uploaded STL file for the specified grid size.
     Tries multiple filename patterns: {size}x{size}_grid.stl, {size}x{size}.stl
+    (resolved once into stl_index). Sizes without an upload, and ?rows= for a
+    rectangular grid, get the procedural grid; sizes the shop does not sell get a 404
+    (see is_offered_grid). Supports If-None-Match, Range and gzip/brotli.
     """
     # Handle OPTIONS preflight request - MUST return 200 with CORS headers
     if request.method == 'OPTIONS':
@@ -1569,39 +2202,19 @@ def get_stl(size):
         return response, 200
     
     try:
-        if size not in [48, 75, 96]:
-            error_msg = f'Invalid grid size: {size}. Must be 48, 75, or 96.'
+        rows = requested_grid_rows(size)
+        if rows is None:
+            error_msg = f'Invalid grid size: {size}. Must be between 1 and {MAX_GRID_SIZE}.'
             print(f"❌ {error_msg}")
             return jsonify({'error': error_msg}), 400
+        if not is_offered_grid(size, rows):
+            return grid_not_offered_response(size, rows)
         
-        # Try multiple filename patterns
-        possible_paths = [
-            os.path.join('stl_files', f'{size}x{size}_grid.stl'),
-            os.path.join('stl_files', f'{size}x{size}.stl'),
-            os.path.join('shopify-version', 'stl_files', f'{size}x{size}_grid.stl'),
-            os.path.join('shopify-version', 'stl_files', f'{size}x{size}.stl'),
-        ]
-        
-        stl_path = None
-        for path in possible_paths:
-            if os.path.exists(path):
-                stl_path = path
-                print(f"✅ Found STL file at: {stl_path}")
-                break
+        stl_asset = get_stl_asset(size) if rows == size else None
+        if stl_asset is None:
+            stl_asset = get_procedural_stl_asset(size, rows)
         
-        if not stl_path:
-            error_msg = f'STL file not found for {size}×{size} grid. Tried: {", ".join(possible_paths)}. Please upload via admin panel.'
-            print(f"❌ {error_msg}")
-            response = jsonify({'error': error_msg, 'size': size, 'tried_paths': possible_paths})
-            response.headers['Access-Control-Allow-Origin'] = '*'
-            return response, 404
-        
-        print(f"📦 Serving STL file: {stl_path} (size: {os.path.getsize(stl_path)} bytes)")
-        response = send_file(
-            stl_path,
-            mimetype='application/octet-stream',
-            as_attachment=False
-        )
+        response = send_asset(stl_asset, immutable=False)
         # Ensure CORS headers are set
         response.headers['Access-Control-Allow-Origin'] = '*'
         response.headers['Access-Control-Allow-Methods'] = 'GET, OPTIONS'
@@ -1617,13 +2230,72 @@ def get_stl(size):
         return response, 500
 
 
+def get_viewer_mesh_asset(size: int, with_pixels: bool = True, rows: Optional[int] = None) -> Asset:
+    """
+    Viewer mesh for a grid template, encoded once into the template's cache entry
+    (keyed by the STL hash, so an uploaded STL gets a new mesh) and shared by all workers.
+    The face->pixel index is for a size x rows image, what the builder resizes uploads to.
+    """
+    rows = rows or size
+    template = grid_templates.get(size) if rows == size else grid_templates.get_procedural(size, rows)
+    
+    def build() -> bytes:
+        pixel_index = None
+        if with_pixels:
+            pixel_index = get_face_pixel_indices(template.template_id, template.vertices, template.faces, size, rows, size,
+                                                 centroids=template.centroids, top_bounds=template.top_bounds, grid_rows=rows)
+        print(f"📦 Encoding viewer mesh {template.template_id}")
+        return encode_viewer_mesh(template.vertices, template.faces, template.top_bounds, size,
+                                  pixel_index=pixel_index, image_size=(size, rows))
+    
+    return stl_assets.get(grid_templates.derived_file(
+        template, f"viewer{'' if with_pixels else '-plain'}{MESH_EXTENSION}", build
+    ))
+
+
+def warm_viewer_meshes():
+    """Encode and precompress the viewer meshes (brotli takes seconds per mesh, so not on a request)"""
+    for size in SUPPORTED_GRID_SIZES:
+        if grid_templates.has_template(size):
+            try:
+                get_viewer_mesh_asset(size)
+                get_viewer_mesh_asset(size, with_pixels=False)
+            except Exception as e:
+                print(f"⚠️  Could not build viewer mesh {size}x{size}: {e}")
+
+
+@app.route('/get-mesh/<int:size>', methods=['GET'])
+def get_mesh(size):
+    """
+    Grid template in the compact viewer format (see viewer_mesh.py / js/viewerMesh.js),
+    a fraction of the STL's size. Includes the face->pixel index unless ?pixels=0.
+    Takes ?rows= for a rectangular grid, like /get-stl. Served like /get-stl: ETag, Range and gzip/brotli.
+    """
+    rows = requested_grid_rows(size)
+    if rows is None:
+        return jsonify({'error': f'Invalid grid size: {size}. Must be between 1 and {MAX_GRID_SIZE}.'}), 400
+    if not is_offered_grid(size, rows):
+        return grid_not_offered_response(size, rows)
+    
+    with_pixels = request.args.get('pixels', '1') != '0'
+    response = send_asset(get_viewer_mesh_asset(size, with_pixels=with_pixels, rows=rows), immutable=False)
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    return response
+
+
+if not in_generation_worker():
+    threading.Thread(target=warm_viewer_meshes, name='viewer-mesh-warmup', daemon=True).start()
+
+
 @app.route('/upload-for-checkout', methods=['POST'])
 def upload_for_checkout():
     """
     Accepts multipart/form-data with:
-    - stl: STL file
+    - stl: STL file (optional - the server's grid template for grid_size is used if omitted)
     - png: PNG file
-    Generates OBJ+MTL, saves them with a unique order ID, and returns the order ID
+    - grid_size: 48, 75 or 96
+    Saves the inputs with a unique order ID and returns the order ID right away;
+    model.obj is generated in the background (see order_generation.py)
     """
     import zipfile
     import traceback
@@ -1631,17 +2303,17 @@ def upload_for_checkout():
     try:
         print("🛒 Checkout upload request received")
         
-        if 'stl' not in request.files or 'png' not in request.files:
+        if 'png' not in request.files:
             print("❌ Missing files in request")
-            return jsonify({'error': 'Missing stl or png file'}), 400
+            return jsonify({'error': 'Missing png file'}), 400
 
-        stl_file = request.files['stl']
+        stl_file = request.files.get('stl')
         png_file = request.files['png']
         
-        print(f"📦 STL file: {stl_file.filename}")
+        print(f"📦 STL file: {stl_file.filename if stl_file else '(server grid template)'}")
         print(f"🖼️  PNG file: {png_file.filename}")
 
-        stl_bytes = stl_file.read()
+        stl_bytes = stl_file.read() if stl_file else None
         png_bytes = png_file.read()
         
         # Get grid size from form data (default to 75 if not provided)
@@ -1655,17 +2327,22 @@ def upload_for_checkout():
         # Get price from prices.json
         base_price = 0.0
         try:
-            prices_file = 'prices.json'
-            if os.path.exists(prices_file):
-                with open(prices_file, 'r') as f:
-                    prices = json.load(f)
-                    price_key = f"{grid_size}x{grid_size}"
-                    base_price = prices.get(price_key, 0.0)
+            base_price = get_config('prices').get().data.get(f"{grid_size}x{grid_size}", 0.0)
         except Exception as e:
             print(f"⚠️  Warning: Could not load price: {e}")
         
-        # Use OBJ format with vertex colors (Bambu Studio compatible)
-        obj_bytes, mtl_bytes, texture_bytes = generate_obj_from_inputs(stl_bytes, png_bytes, grid_size)
+        # Reject inputs the background generation could never use, before anything is written
+        template_stl_path = None
+        if matching_grid_template(stl_bytes, grid_size) is not None:
+            # The client re-sent the server's own grid: build from the template instead
+            stl_bytes = None
+        if not stl_bytes:
+            if not grid_templates.has_template(grid_size):
+                return jsonify({'error': f'Invalid grid size: {grid_size}. Must be between 1 and {MAX_GRID_SIZE}.'}), 400
+            if not is_offered_grid(grid_size):
+                return jsonify({'error': f'Grid size {grid_size}x{grid_size} is not offered.'}), 400
+            template_stl_path = grid_template_stl_path(grid_templates.get(grid_size))
+        Image.open(io.BytesIO(png_bytes)).verify()
         
         # Create unique order ID
         order_id = str(uuid.uuid4())
@@ -1680,21 +2357,27 @@ def upload_for_checkout():
         order_dir = os.path.join(orders_dir, order_id)
         os.makedirs(order_dir, exist_ok=True)
         
-        # Save OBJ file with vertex colors (Bambu Studio compatible)
-        model_path = os.path.join(order_dir, 'model.obj')
-        with open(model_path, 'wb') as f:
-            f.write(obj_bytes)
-        print(f"✅ Saved model.obj to {order_dir}")
-        
-        # Also save original PNG for reference
+        # Save original PNG; the model is generated from it after checkout returns
         png_path = os.path.join(order_dir, 'original.png')
         with open(png_path, 'wb') as f:
             f.write(png_bytes)
         
         # Save STL file for easy access
         stl_path = os.path.join(order_dir, 'model.stl')
-        with open(stl_path, 'wb') as f:
-            f.write(stl_bytes)
+        if stl_bytes:
+            with open(stl_path, 'wb') as f:
+                f.write(stl_bytes)
+        else:
+            import shutil
+            shutil.copyfile(template_stl_path, stl_path)
+        
+        # Record what the model needs, then generate model.obj in the background
+        order_models.write_state(order_id, {
+            'status': 'pending',
+            'grid_size': grid_size,
+            'stl_uploaded': bool(stl_bytes),
+        })
+        order_models.schedule(order_id)
         
         # Create order metadata
         from datetime import datetime
@@ -1716,22 +2399,10 @@ def upload_for_checkout():
         if mounting_selected:
             order_data['addons'].append('Nano Wall Mounting Dots')
         
-        # Save order metadata to orders.json
-        orders_file = 'orders.json'
-        orders = []
-        if os.path.exists(orders_file):
-            try:
-                with open(orders_file, 'r') as f:
-                    orders = json.load(f)
-            except:
-                orders = []
-        
-        orders.append(order_data)
+        # Save order metadata
+        get_order_store().add(order_data)
         
-        with open(orders_file, 'w') as f:
-            json.dump(orders, f, indent=2)
-        
-        print(f"✅ Files saved to {order_dir}")
+        print(f"✅ Inputs saved to {order_dir}, model generation queued")
         print(f"📋 Order saved: {order_id}")
         
         # Return order ID and price
@@ -1748,23 +2419,29 @@ def upload_for_checkout():
         return jsonify({'error': str(e)}), 500
 
 
+def get_variant_ids() -> Dict[str, str]:
+    """
+    Storefront variant IDs (and store URL) from the environment, skipping unset ones.
+    Cached by the Shopify API wrapper; read directly when shopify_api.py is missing.
+    """
+    if SHOPIFY_API_AVAILABLE:
+        return get_shopify_api().get_variant_ids()
+    variants = {
+        'variant_48': os.getenv('SHOPIFY_VARIANT_48'),
+        'variant_75': os.getenv('SHOPIFY_VARIANT_75'),
+        'variant_96': os.getenv('SHOPIFY_VARIANT_96'),
+        'variant_stand': os.getenv('SHOPIFY_VARIANT_STAND'),
+        'variant_mounting': os.getenv('SHOPIFY_VARIANT_MOUNTING'),
+        'store_url': os.getenv('SHOPIFY_STORE_URL')
+    }
+    return {k: v for k, v in variants.items() if v}
+
+
 @app.route('/api/shopify/variants', methods=['GET'])
 def get_shopify_variants():
     """Return Shopify variant IDs from environment variables"""
     try:
-        variants = {
-            'variant_48': os.getenv('SHOPIFY_VARIANT_48'),
-            'variant_75': os.getenv('SHOPIFY_VARIANT_75'),
-            'variant_96': os.getenv('SHOPIFY_VARIANT_96'),
-            'variant_stand': os.getenv('SHOPIFY_VARIANT_STAND'),
-            'variant_mounting': os.getenv('SHOPIFY_VARIANT_MOUNTING'),
-            'store_url': os.getenv('SHOPIFY_STORE_URL')
-        }
-        
-        # Filter out None values
-        variants = {k: v for k, v in variants.items() if v}
-        
-        return jsonify(variants)
+        return jsonify(get_variant_ids())
     except Exception as e:
         print(f"❌ Error getting Shopify variants: {e}")
         return jsonify({'error': str(e)}), 500
@@ -1772,7 +2449,11 @@ def get_shopify_variants():
 
 @app.route('/api/shopify/orders', methods=['GET'])
 def get_shopify_orders():
-    """Get orders from Shopify Admin API"""
+    """
+    Get Shopify orders from the local mirror
+    Query: limit (max 250), page, status (open/closed/cancelled/any), financial_status,
+    fulfillment_status, order_id (album builder order), q (name or email)
+    """
     if not SHOPIFY_API_AVAILABLE:
         return jsonify({'error': 'Shopify API not available'}), 503
     
@@ -1781,38 +2462,31 @@ def get_shopify_orders():
         if not shopify_api.is_configured():
             return jsonify({'error': 'Shopify API not configured'}), 503
         
-        limit = request.args.get('limit', 50, type=int)
+        limit = max(1, min(request.args.get('limit', 50, type=int), 250))
+        page = max(1, request.args.get('page', 1, type=int))
         status = request.args.get('status', None)
+        mirror = get_shopify_order_mirror()
         
-        orders = shopify_api.get_orders(limit=limit, status=status)
-        
-        # Convert to JSON-serializable format
-        orders_data = []
-        for order in orders:
-            orders_data.append({
-                'id': str(order.id),
-                'name': order.name,
-                'email': order.email if hasattr(order, 'email') else None,
-                'total_price': float(order.total_price) if hasattr(order, 'total_price') else 0,
-                'financial_status': order.financial_status if hasattr(order, 'financial_status') else None,
-                'fulfillment_status': order.fulfillment_status if hasattr(order, 'fulfillment_status') else None,
-                'created_at': order.created_at if hasattr(order, 'created_at') else None,
-                'line_items': [
-                    {
-                        'id': str(item.id),
-                        'title': item.title,
-                        'quantity': item.quantity,
-                        'price': float(item.price) if hasattr(item, 'price') else 0,
-                        'properties': [
-                            {'name': prop.name, 'value': prop.value}
-                            for prop in (item.properties if hasattr(item, 'properties') else [])
-                        ]
-                    }
-                    for item in (order.line_items if hasattr(order, 'line_items') else [])
-                ]
-            })
-        
-        return jsonify({'orders': orders_data})
+        if not mirror.is_synced():
+            # First reconcile still running: answer from Shopify and keep what we fetched
+            orders = shopify_api.get_orders(limit=limit, status=status)
+            for order in orders:
+                mirror.upsert(order)
+            orders_data, total = mirror.query(limit=limit, status=status)
+            return jsonify({'orders': orders_data, 'total': total, 'page': 1, 'limit': limit,
+                            'has_more': False, 'source': 'shopify'})
+        
+        orders_data, total = mirror.query(
+            limit=limit,
+            offset=(page - 1) * limit,
+            status=status,
+            financial_status=request.args.get('financial_status'),
+            fulfillment_status=request.args.get('fulfillment_status'),
+            album_order_id=request.args.get('order_id'),
+            search=request.args.get('q')
+        )
+        return jsonify({'orders': orders_data, 'total': total, 'page': page, 'limit': limit,
+                        'has_more': page * limit < total, 'source': 'mirror'})
     except Exception as e:
         print(f"❌ Error getting Shopify orders: {e}")
         return jsonify({'error': str(e)}), 500
@@ -1820,7 +2494,7 @@ def get_shopify_orders():
 
 @app.route('/api/shopify/order/<order_id>', methods=['GET'])
 def get_shopify_order(order_id):
-    """Get a specific order from Shopify"""
+    """Get a specific order from the local mirror (fetched from Shopify if not mirrored yet)"""
     if not SHOPIFY_API_AVAILABLE:
         return jsonify({'error': 'Shopify API not available'}), 503
     
@@ -1829,33 +2503,16 @@ def get_shopify_order(order_id):
         if not shopify_api.is_configured():
             return jsonify({'error': 'Shopify API not configured'}), 503
         
-        order = shopify_api.get_order(order_id)
-        if not order:
-            return jsonify({'error': 'Order not found'}), 404
-        
-        # Convert to JSON-serializable format
-        order_data = {
-            'id': str(order.id),
-            'name': order.name,
-            'email': order.email if hasattr(order, 'email') else None,
-            'total_price': float(order.total_price) if hasattr(order, 'total_price') else 0,
-            'financial_status': order.financial_status if hasattr(order, 'financial_status') else None,
-            'fulfillment_status': order.fulfillment_status if hasattr(order, 'fulfillment_status') else None,
-            'created_at': order.created_at if hasattr(order, 'created_at') else None,
-            'line_items': [
-                {
-                    'id': str(item.id),
-                    'title': item.title,
-                    'quantity': item.quantity,
-                    'price': float(item.price) if hasattr(item, 'price') else 0,
-                    'properties': [
-                        {'name': prop.name, 'value': prop.value}
-                        for prop in (item.properties if hasattr(item, 'properties') else [])
-                    ]
-                }
-                for item in (order.line_items if hasattr(order, 'line_items') else [])
-            ]
-        }
+        mirror = get_shopify_order_mirror()
+        order_data = mirror.get(order_id)
+        if order_data is None:
+            if not order_id.isdigit():
+                return jsonify({'error': 'Order not found'}), 404
+            order = shopify_api.get_order(order_id)
+            if not order:
+                return jsonify({'error': 'Order not found'}), 404
+            mirror.upsert(order)
+            order_data = mirror.get(order_id)
         
         return jsonify(order_data)
     except Exception as e:
@@ -1878,16 +2535,9 @@ def webhook_order_create():
                 print("❌ Invalid webhook signature")
                 return jsonify({'error': 'Invalid signature'}), 401
         
-        # Get order data
-        order_data = request.get_json()
-        
-        # Process webhook
-        success = handle_order_create(order_data)
-        
-        if success:
-            return '', 200
-        else:
-            return jsonify({'error': 'Failed to process webhook'}), 500
+        # Store the delivery and answer right away; the outbox worker runs handle_order_create
+        get_webhook_outbox().enqueue('orders/create', request.get_data(), request.headers.get('X-Shopify-Webhook-Id'))
+        return '', 200
             
     except Exception as e:
         print(f"❌ Error processing order create webhook: {e}")
@@ -1909,16 +2559,9 @@ def webhook_order_paid():
                 print("❌ Invalid webhook signature")
                 return jsonify({'error': 'Invalid signature'}), 401
         
-        # Get order data
-        order_data = request.get_json()
-        
-        # Process webhook
-        success = handle_order_paid(order_data)
-        
-        if success:
-            return '', 200
-        else:
-            return jsonify({'error': 'Failed to process webhook'}), 500
+        # Store the delivery and answer right away; the outbox worker runs handle_order_paid
+        get_webhook_outbox().enqueue('orders/paid', request.get_data(), request.headers.get('X-Shopify-Webhook-Id'))
+        return '', 200
             
     except Exception as e:
         print(f"❌ Error processing order paid webhook: {e}")
@@ -1967,20 +2610,27 @@ def admin_prices_page():
         }), 500
 
 
+def config_response(document: ConfigDocument) -> Response:
+    """
+    Serve a config document from its cached bytes. Browsers must revalidate every time
+    (so admin edits show up immediately), which costs a 304 while the ETag still matches.
+    """
+    snapshot = document.get()
+    response = Response(snapshot.body, mimetype='application/json')
+    response.set_etag(snapshot.etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+
 @app.route('/admin/prices/api', methods=['GET', 'POST'])
 def admin_prices_api():
     """Admin API to get/edit prices"""
-    prices_file = 'prices.json'
+    prices = get_config('prices')
     
     if request.method == 'GET':
         # Return current prices as JSON
         try:
-            if os.path.exists(prices_file):
-                with open(prices_file, 'r') as f:
-                    prices = json.load(f)
-            else:
-                prices = {}
-            return jsonify(prices)
+            return config_response(prices)
         except Exception as e:
             return jsonify({'error': str(e)}), 500
     
@@ -1988,8 +2638,7 @@ def admin_prices_api():
         # Update prices (admin only - add password check if needed)
         try:
             new_prices = request.get_json()
-            with open(prices_file, 'w') as f:
-                json.dump(new_prices, f, indent=2)
+            prices.save(new_prices)
             return jsonify({'success': True, 'prices': new_prices})
         except Exception as e:
             return jsonify({'error': str(e)}), 500
@@ -1998,50 +2647,66 @@ def admin_prices_api():
 @app.route('/api/prices', methods=['GET'])
 def get_prices():
     """Public API to get current prices (read-only for customers)"""
-    prices_file = 'prices.json'
     try:
-        if os.path.exists(prices_file):
-            with open(prices_file, 'r') as f:
-                prices = json.load(f)
-        else:
-            prices = {}
-        return jsonify(prices)
+        return config_response(get_config('prices'))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/admin/cache/api', methods=['GET'])
+def admin_cache_api():
+    """Admin API to view generation and Shopify read cache hit rates, job queue depth and process pool load"""
+    return jsonify({
+        'result_cache': get_result_cache().stats(),
+        'jobs': get_job_queue().stats(),
+        'generation': generation_service.stats(),
+        'shopify_cache': get_shopify_api().cache.stats() if SHOPIFY_API_AVAILABLE else None,
+        'static_assets': get_asset_store().stats(),
+        'pages_rendered': page_cache.renders,
+    })
+
+
+@app.route('/admin/webhooks/api', methods=['GET'])
+def admin_webhooks_api():
+    """Admin API to view webhook outbox depth and processing lag"""
+    if not WEBHOOK_HANDLERS_AVAILABLE:
+        return jsonify({'error': 'Webhook handlers not available'}), 503
+    return jsonify(get_webhook_outbox().stats())
+
+
+@app.route('/admin/palette/api', methods=['GET', 'POST'])
+def admin_palette_api():
+    """Admin API to get/edit the filament palette used for pixelated modes"""
+    if request.method == 'GET':
+        palette, names = get_active_palette()
+        return jsonify([{'name': name, 'rgb': list(color)} for color, name in zip(palette, names)])
+    
+    elif request.method == 'POST':
+        try:
+            new_palette = request.get_json()
+            parse_palette(new_palette)  # Validate before saving
+            tmp_path = f'{PALETTE_FILE}.tmp-{uuid.uuid4().hex[:8]}'
+            with open(tmp_path, 'w') as f:
+                json.dump(new_palette, f, indent=2)
+            os.replace(tmp_path, PALETTE_FILE)  # readers never see (and cache) a half-written palette
+            return jsonify({'success': True, 'palette': new_palette})
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        except Exception as e:
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @app.route('/admin/images/api', methods=['GET', 'POST'])
 def admin_images_api():
     """Admin API to get/upload images for products"""
-    images_file = 'images.json'
+    images_config = get_config('images')
     images_dir = 'product_images'
     os.makedirs(images_dir, exist_ok=True)
     
     if request.method == 'GET':
-        # Return current images as JSON
+        # Return current images as JSON (a corrupted images.json is backed up and served as empty)
         try:
-            if os.path.exists(images_file):
-                try:
-                    with open(images_file, 'r') as f:
-                        images = json.load(f)
-                except json.JSONDecodeError as e:
-                    # If JSON is corrupted, backup and return empty dict
-                    import shutil
-                    backup_file = images_file + '.backup.' + str(int(time.time()))
-                    try:
-                        shutil.copy2(images_file, backup_file)
-                        print(f"⚠️ images.json is corrupted, backed up to {backup_file}, returning empty")
-                    except:
-                        print(f"⚠️ images.json is corrupted, returning empty (backup failed)")
-                    images = {}
-            else:
-                images = {}
-            response = jsonify(images)
-            # Prevent caching
-            response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-            response.headers['Pragma'] = 'no-cache'
-            response.headers['Expires'] = '0'
-            return response
+            return config_response(images_config)
         except Exception as e:
             import traceback
             print(f"❌ Error reading images: {traceback.format_exc()}")
@@ -2066,29 +2731,12 @@ def admin_images_api():
             filename = f"{key}_{uuid.uuid4().hex[:8]}.{file.filename.rsplit('.', 1)[1].lower()}"
             filepath = os.path.join(images_dir, filename)
             file.save(filepath)
+            get_asset_store().get(f'product_images/{filename}')  # Hash (and precompress) it now
             
-            # Update images.json
-            if os.path.exists(images_file):
-                try:
-                    with open(images_file, 'r') as f:
-                        images = json.load(f)
-                except json.JSONDecodeError as e:
-                    # If JSON is corrupted, backup the file and start fresh
-                    import shutil
-                    backup_file = images_file + '.backup.' + str(int(time.time()))
-                    try:
-                        shutil.copy2(images_file, backup_file)
-                        print(f"⚠️ images.json is corrupted, backed up to {backup_file}, starting fresh")
-                    except:
-                        print(f"⚠️ images.json is corrupted, starting fresh (backup failed)")
-                    images = {}
-            else:
-                images = {}
-            
+            # Update images.json (copy: the cached document is shared)
+            images = dict(images_config.get().data)
             images[key] = f'/product_images/{filename}'
-            
-            with open(images_file, 'w') as f:
-                json.dump(images, f, indent=2)
+            images_config.save(images)
             
             return jsonify({'success': True, 'imageUrl': images[key]})
         except Exception as e:
@@ -2110,14 +2758,10 @@ def serve_product_image(filename):
         response.headers['Access-Control-Max-Age'] = '3600'
         return response, 200
     
-    images_dir = 'product_images'
-    filepath = os.path.join(images_dir, filename)
-    if os.path.exists(filepath):
-        response = send_file(filepath)
-        # Prevent caching of images
-        response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-        response.headers['Pragma'] = 'no-cache'
-        response.headers['Expires'] = '0'
+    asset = get_asset_store().get(f'product_images/{filename}')
+    if asset is not None:
+        # Plain image paths revalidate (304 while unchanged); pages use the fingerprinted URLs
+        response = send_asset(asset, immutable=False)
         # CORS headers already set by after_request, but ensure they're there
         response.headers['Access-Control-Allow-Origin'] = '*'
         return response
@@ -2130,19 +2774,8 @@ def serve_product_image(filename):
 @app.route('/api/images', methods=['GET'])
 def get_images():
     """Public API to get product images (read-only)"""
-    images_file = 'images.json'
     try:
-        if os.path.exists(images_file):
-            with open(images_file, 'r') as f:
-                images = json.load(f)
-        else:
-            images = {}
-        response = jsonify(images)
-        # Prevent caching so images update immediately
-        response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-        response.headers['Pragma'] = 'no-cache'
-        response.headers['Expires'] = '0'
-        return response
+        return config_response(get_config('images'))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -2182,124 +2815,65 @@ def admin_stl_api():
             filepath = os.path.join(stl_dir, filename)
             file.save(filepath)
             
+            # Re-parse the new grid on next use, and re-index it for /get-stl
+            try:
+                grid_templates.invalidate(int(size))
+                refresh_stl_index(int(size))
+            except ValueError:
+                pass
+            
             return jsonify({'success': True, 'filename': filename})
         except Exception as e:
             return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/admin/grids/api', methods=['POST'])
+def admin_grids_api():
+    """
+    Admin API to generate a grid of any size ahead of selling it: builds the template, its STL
+    and viewer meshes into the template cache. Public routes serve it once "{columns}x{rows}"
+    has a price in prices.json.
+    """
+    try:
+        data = request.get_json() or {}
+        columns = int(data.get('columns', 0))
+        rows = int(data.get('rows', columns))
+        if not (is_valid_grid_size(columns) and is_valid_grid_size(rows)):
+            return jsonify({'success': False, 'error': f'Grid sizes must be between 1 and {MAX_GRID_SIZE}.'}), 400
+        
+        template = grid_templates.get(columns) if rows == columns else grid_templates.get_procedural(columns, rows)
+        grid_template_stl_path(template)
+        get_viewer_mesh_asset(columns, rows=rows)
+        get_viewer_mesh_asset(columns, with_pixels=False, rows=rows)
+        return jsonify({
+            'success': True,
+            'template_id': template.template_id,
+            'faces': template.num_faces,
+            'offered': is_offered_grid(columns, rows),
+        })
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @app.route('/admin/content/api', methods=['GET', 'POST'])
 def admin_content_api():
     """Admin API to get/edit text content"""
-    content_file = 'content.json'
-    
-    # Default content - always use this as base
-    default_content = {
-        'title': '3D Album Cover Mosaic Builder',
-        'price_subtitle': 'Create colorized 3D prints',
-        'upload_image_text': 'Choose image file...',
-        'upload_subtext': 'Will be resized to 75×75 pixels',
-        'stl_upload_text': 'Choose STL file...',
-        'stl_subtext': 'Or auto-load from server',
-        'info_title': 'Custom Brick Mosaic Designer',
-        'info_description': 'Turn your favourite photos into stunning brick art—made by you!',
-        'info_additional': 'Bring your memories to life, one brick at a time. With our Custom Brick Mosaic Designer you can transform any image into a beautiful 3D printable mosaic.',
-        'howto_title': 'How to Use',
-        'howto_content': '1. Upload Your Image\n2. Select Grid Size\n3. Adjust Image\n4. View in 3D',
-        'desktop_info': 'Each pixel in your PNG maps to one cube in the STL grid. Colors are preserved exactly as-is.',
-        'desktop_output': 'OBJ file with MTL colors - Import to Bambu Studio and export as 3MF for printing.',
-        # Desktop orange text labels
-        'panel_title': 'Edit Your Photo',
-        'canvas_label': 'Processed (Posterized)',
-        'section_upload': '1. Upload Color Image',
-        'section_grid': '2. Select Grid Size',
-        'section_adjustments': 'Image Adjustments',
-        'section_painting': 'Painting',
-        # Additional editable text fields
-        'grid_btn_48': '48 × 48',
-        'grid_btn_75': '75 × 75',
-        'grid_btn_96': '96 × 96',
-        'slider_contrast_label': 'Contrast',
-        'slider_brightness_label': 'Brightness',
-        'slider_tones_label': 'Tones',
-        'label_dimensions': 'Dimensions:',
-        'label_addons': 'Addons:',
-        'label_48x48': '48×48:',
-        'label_75x75': '75×75:',
-        'label_96x96': '96×96:',
-        'stand_name': 'Stand',
-        'stand_upload_btn': 'Upload Image',
-        'mounting_name': 'Nano Wall Mounting Dots (Pack of 8)',
-        'mounting_upload_btn': 'Upload Image',
-        'color_black_title': 'Black',
-        'color_darkgray_title': 'Dark Gray',
-        'color_lightgray_title': 'Light Gray',
-        'color_white_title': 'White',
-        'size_guide_title': 'Size Guide',
-        'size_guide_button_text': 'Size Guide',
-        'size_guide': {
-            'square': [
-                {'bricks': '32 × 32 bricks', 'cm': '28.6 × 28.6 cm'},
-                {'bricks': '32 × 32 bricks*', 'cm': '25.6 × 25.6 cm'},
-                {'bricks': '48 × 48 bricks', 'cm': '41.4 × 41.4 cm'},
-                {'bricks': '48 × 48 bricks*', 'cm': '38.4 × 38.4 cm'},
-                {'bricks': '64 × 64 bricks', 'cm': '54.2 × 54.2 cm'},
-                {'bricks': '96 × 96 bricks', 'cm': '79.8 × 79.8 cm'}
-            ],
-            'portrait': [],
-            'landscape': [],
-            'note': '* Unframed baseplate. All other measurements shown are for the framed baseplate.'
-        }
-    }
+    content = get_config('content')
     
     if request.method == 'GET':
         # Return current content merged with defaults
         try:
-            content = default_content.copy()  # Start with defaults
-            
-            if os.path.exists(content_file):
-                with open(content_file, 'r') as f:
-                    saved_content = json.load(f)
-                    # Deep merge saved content into defaults (saved content overrides defaults)
-                    def deep_merge(default, saved):
-                        result = default.copy()
-                        for key, value in saved.items():
-                            if key in result and isinstance(result[key], dict) and isinstance(value, dict):
-                                # Recursively merge nested dictionaries
-                                result[key] = deep_merge(result[key], value)
-                            else:
-                                # Overwrite with saved value
-                                result[key] = value
-                        return result
-                    content = deep_merge(content, saved_content)
-            
-            return jsonify(content)
+            return config_response(content)
         except Exception as e:
             return jsonify({'error': str(e)}), 500
     
     elif request.method == 'POST':
         # Update content - merge with defaults to ensure all fields are present
         try:
-            new_content = request.get_json()
-            
-            # Deep merge function for nested dictionaries
-            def deep_merge(default, new):
-                result = default.copy()
-                for key, value in new.items():
-                    if key in result and isinstance(result[key], dict) and isinstance(value, dict):
-                        # Recursively merge nested dictionaries
-                        result[key] = deep_merge(result[key], value)
-                    else:
-                        # Overwrite with new value
-                        result[key] = value
-                return result
-            
-            # Merge with defaults to ensure all fields are present
-            merged_content = deep_merge(default_content, new_content)
-            
-            # Save the merged content
-            with open(content_file, 'w') as f:
-                json.dump(merged_content, f, indent=2)
-            
+            merged_content = deep_merge(DEFAULT_CONTENT, request.get_json())
+            content.save(merged_content)
             return jsonify({'success': True, 'content': merged_content})
         except Exception as e:
             return jsonify({'success': False, 'error': str(e)}), 500
@@ -2308,92 +2882,8 @@ def admin_content_api():
 @app.route('/api/content', methods=['GET'])
 def get_content():
     """Public API to get text content (read-only)"""
-    content_file = 'content.json'
-    
-    # Default content - always use this as base
-    default_content = {
-        'title': '3D Album Cover Mosaic Builder',
-        'price_subtitle': 'Create colorized 3D prints',
-        'upload_image_text': 'Choose image file...',
-        'upload_subtext': 'Will be resized to 75×75 pixels',
-        'stl_upload_text': 'Choose STL file...',
-        'stl_subtext': 'Or auto-load from server',
-        'info_title': 'Custom Brick Mosaic Designer',
-        'info_description': 'Turn your favourite photos into stunning brick art—made by you!',
-        'info_additional': 'Bring your memories to life, one brick at a time. With our Custom Brick Mosaic Designer you can transform any image into a beautiful 3D printable mosaic.',
-        'howto_title': 'How to Use',
-        'howto_content': '1. Upload Your Image\n2. Select Grid Size\n3. Adjust Image\n4. View in 3D',
-        'desktop_info': 'Each pixel in your PNG maps to one cube in the STL grid. Colors are preserved exactly as-is.',
-        'desktop_output': 'OBJ file with MTL colors - Import to Bambu Studio and export as 3MF for printing.',
-        # Desktop orange text labels
-        'panel_title': 'Edit Your Photo',
-        'canvas_label': 'Processed (Posterized)',
-        'section_upload': '1. Upload Color Image',
-        'section_grid': '2. Select Grid Size',
-        'section_adjustments': 'Image Adjustments',
-        'section_painting': 'Painting',
-        # Additional editable text fields
-        'grid_btn_48': '48 × 48',
-        'grid_btn_75': '75 × 75',
-        'grid_btn_96': '96 × 96',
-        'slider_contrast_label': 'Contrast',
-        'slider_brightness_label': 'Brightness',
-        'slider_tones_label': 'Tones',
-        'label_dimensions': 'Dimensions:',
-        'label_addons': 'Addons:',
-        'label_48x48': '48×48:',
-        'label_75x75': '75×75:',
-        'label_96x96': '96×96:',
-        'stand_name': 'Stand',
-        'stand_upload_btn': 'Upload Image',
-        'mounting_name': 'Nano Wall Mounting Dots (Pack of 8)',
-        'mounting_upload_btn': 'Upload Image',
-        'color_black_title': 'Black',
-        'color_darkgray_title': 'Dark Gray',
-        'color_lightgray_title': 'Light Gray',
-        'color_white_title': 'White',
-        'size_guide_title': 'Size Guide',
-        'size_guide_button_text': 'Size Guide',
-        'size_guide': {
-            'square': [
-                {'bricks': '32 × 32 bricks', 'cm': '28.6 × 28.6 cm'},
-                {'bricks': '32 × 32 bricks*', 'cm': '25.6 × 25.6 cm'},
-                {'bricks': '48 × 48 bricks', 'cm': '41.4 × 41.4 cm'},
-                {'bricks': '48 × 48 bricks*', 'cm': '38.4 × 38.4 cm'},
-                {'bricks': '64 × 64 bricks', 'cm': '54.2 × 54.2 cm'},
-                {'bricks': '96 × 96 bricks', 'cm': '79.8 × 79.8 cm'}
-            ],
-            'portrait': [],
-            'landscape': [],
-            'note': '* Unframed baseplate. All other measurements shown are for the framed baseplate.'
-        }
-    }
-    
     try:
-        content = default_content.copy()  # Start with defaults
-        
-        if os.path.exists(content_file):
-            with open(content_file, 'r') as f:
-                saved_content = json.load(f)
-                # Deep merge saved content into defaults (saved content overrides defaults)
-                def deep_merge(default, saved):
-                    result = default.copy()
-                    for key, value in saved.items():
-                        if key in result and isinstance(result[key], dict) and isinstance(value, dict):
-                            # Recursively merge nested dictionaries
-                            result[key] = deep_merge(result[key], value)
-                        else:
-                            # Overwrite with saved value
-                            result[key] = value
-                    return result
-                content = deep_merge(content, saved_content)
-        
-        response = jsonify(content)
-        # Prevent caching so admin updates are seen immediately
-        response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-        response.headers['Pragma'] = 'no-cache'
-        response.headers['Expires'] = '0'
-        return response
+        return config_response(get_config('content'))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -2461,17 +2951,20 @@ def convert_image():
 @app.route('/admin/orders/api', methods=['GET', 'POST', 'DELETE'])
 def admin_orders_api():
     """Admin API to get, update, or delete orders"""
-    orders_file = 'orders.json'
+    order_store = get_order_store()
     
     if request.method == 'GET':
-        if not os.path.exists(orders_file):
-            return jsonify([])
-        
         try:
-            with open(orders_file, 'r') as f:
-                orders = json.load(f)
-            # Return orders in reverse chronological order (newest first)
-            orders.reverse()
+            # ?wait_for=<order_id>&timeout=<seconds> generates that order's model (if needed) before answering
+            wait_for = request.args.get('wait_for')
+            if wait_for:
+                order_models.ensure(wait_for, timeout=float(request.args.get('timeout', 60)))
+            
+            # Newest first; ?completed=true|false filters
+            completed = request.args.get('completed')
+            orders = order_store.list(completed=None if completed is None else completed == 'true')
+            for order in orders:
+                order['generation_status'] = order_models.read_state(order['order_id']).get('status')
             return jsonify(orders)
         except Exception as e:
             print(f"❌ Error loading orders: {e}")
@@ -2481,23 +2974,19 @@ def admin_orders_api():
         # Update order (mark as completed/uncompleted)
         try:
             data = request.get_json()
-            order_id = data.get('order_id')
-            completed = data.get('completed', False)
-            
-            if not os.path.exists(orders_file):
-                return jsonify({'error': 'No orders file found'}), 404
             
-            with open(orders_file, 'r') as f:
-                orders = json.load(f)
+            if isinstance(data, list):
+                # Bulk save from the admin page's Shopify sync: merge only the shopify_* fields it sets,
+                # so a stale page can't overwrite paid/files_uploaded/completed written since it loaded
+                for order in data:
+                    if order.get('order_id'):
+                        synced = {key: value for key, value in order.items() if key.startswith('shopify_')}
+                        if synced:
+                            order_store.update(order['order_id'], synced)
+                return jsonify({'success': True})
             
-            # Find and update the order
-            for order in orders:
-                if order['order_id'] == order_id:
-                    order['completed'] = completed
-                    break
-            
-            with open(orders_file, 'w') as f:
-                json.dump(orders, f, indent=2)
+            if not order_store.update(data.get('order_id'), {'completed': data.get('completed', False)}):
+                return jsonify({'error': 'Order not found'}), 404
             
             return jsonify({'success': True})
         except Exception as e:
@@ -2512,17 +3001,7 @@ def admin_orders_api():
             if not order_id:
                 return jsonify({'error': 'order_id required'}), 400
             
-            if not os.path.exists(orders_file):
-                return jsonify({'error': 'No orders file found'}), 404
-            
-            with open(orders_file, 'r') as f:
-                orders = json.load(f)
-            
-            # Remove the order
-            orders = [order for order in orders if order['order_id'] != order_id]
-            
-            with open(orders_file, 'w') as f:
-                json.dump(orders, f, indent=2)
+            order_store.delete(order_id)
             
             # Also delete the order directory
             import shutil
@@ -2549,6 +3028,10 @@ def download_order_file(order_id, filename):
     
     file_path = os.path.join(order_dir, filename)
     
+    # The model may still be generating (or never have been started on this server)
+    if filename == 'model.obj':
+        order_models.ensure(order_id, timeout=float(os.getenv('ORDER_GENERATION_WAIT_SECONDS', 60)))
+    
     print(f"🔍 Download request: order_id={order_id}, filename={filename}")
     print(f"   Looking for file at: {file_path}")
     print(f"   File exists: {os.path.exists(file_path)}")
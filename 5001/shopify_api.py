@@ -6,19 +6,105 @@ import os
 import hmac
 import hashlib
 import json
-from typing import Optional, Dict, List, Any
+import mimetypes
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional, Dict, Iterator, List, Any, Tuple
 
-try:
-    # Try importing shopify (PyShopify package)
-    try:
-        import shopify
-    except ImportError:
-        # Try alternative import for pyshopify package
-        from pyshopify import shopify
-    SHOPIFY_AVAILABLE = True
-except ImportError:
-    SHOPIFY_AVAILABLE = False
-    print("⚠️  PyShopify not installed. Install with: pip3 install PyShopify")
+from shopify_http import REQUESTS_AVAILABLE, ShopifyHTTPError, wrap_records
+from shopify_cache import ShopifyReadCache
+
+if REQUESTS_AVAILABLE:
+    from shopify_http import ShopifyHTTPClient
+
+# The REST client replaces PyShopify; kept under the old name for callers that check it
+SHOPIFY_AVAILABLE = REQUESTS_AVAILABLE
+
+STAGED_UPLOADS_CREATE = """
+mutation stagedUploadsCreate($input: [StagedUploadInput!]!) {
+  stagedUploadsCreate(input: $input) {
+    stagedTargets { url resourceUrl parameters { name value } }
+    userErrors { field message }
+  }
+}
+"""
+
+FILE_CREATE = """
+mutation fileCreate($files: [FileCreateInput!]!) {
+  fileCreate(files: $files) {
+    files { id fileStatus }
+    userErrors { field message }
+  }
+}
+"""
+
+FILES_QUERY = """
+query files($ids: [ID!]!) {
+  nodes(ids: $ids) {
+    ... on GenericFile { id url fileStatus }
+  }
+}
+"""
+
+ORDER_FULFILLMENT_QUERY = """
+query orderFulfillment($id: ID!) {
+  order(id: $id) {
+    id
+    note
+    fulfillmentOrders(first: 10) { nodes { id status } }
+  }
+}
+"""
+
+# Fulfillment, note and metafields in one request (mutation fields run in order).
+# Steps an earlier attempt already completed are skipped through @include, so a retry
+# never creates a second fulfillment or appends the links to the note twice.
+ATTACH_FILES_MUTATION = """
+mutation attachFiles($fulfillment: FulfillmentV2Input!, $hasFulfillment: Boolean!,
+                     $order: OrderInput!, $hasNote: Boolean!,
+                     $metafields: [MetafieldsSetInput!]!, $hasMetafields: Boolean!) {
+  fulfillmentCreateV2(fulfillment: $fulfillment) @include(if: $hasFulfillment) {
+    fulfillment { id status }
+    userErrors { field message }
+  }
+  orderUpdate(input: $order) @include(if: $hasNote) {
+    order { id }
+    userErrors { field message }
+  }
+  metafieldsSet(metafields: $metafields) @include(if: $hasMetafields) {
+    metafields { id }
+    userErrors { field message }
+  }
+}
+"""
+
+
+def download_links_note(existing_note: Optional[str], file_urls: List[str]) -> Optional[str]:
+    """
+    Order note with the download links appended, or None if the note already lists
+    every link (an earlier attempt got that far)
+    """
+    existing_note = existing_note or ""
+    if all(url in existing_note for url in file_urls):
+        return None
+    return existing_note + "\n\n" + "Download links:\n" + "\n".join(file_urls)
+
+
+# Seconds each read stays cached (SHOPIFY_CACHE_TTL_<RESOURCE> overrides, 0 disables)
+CACHE_TTLS = {'order': 60, 'orders': 30, 'variants': 300, 'variant_ids': 3600}
+
+# Env variables holding the product variant IDs the storefront uses
+VARIANT_ID_VARIABLES = {
+    'variant_48': 'SHOPIFY_VARIANT_48',
+    'variant_75': 'SHOPIFY_VARIANT_75',
+    'variant_96': 'SHOPIFY_VARIANT_96',
+    'variant_stand': 'SHOPIFY_VARIANT_STAND',
+    'variant_mounting': 'SHOPIFY_VARIANT_MOUNTING',
+    'store_url': 'SHOPIFY_STORE_URL',
+}
+
+# Staged PUT targets expect their parameters as request headers
+STAGED_PARAMETER_HEADERS = {'content_type': 'Content-Type', 'acl': 'x-goog-acl'}
 
 
 class ShopifyAPI:
@@ -29,6 +115,12 @@ class ShopifyAPI:
         self.api_key = os.getenv('SHOPIFY_API_KEY')
         self.api_secret = os.getenv('SHOPIFY_API_SECRET')
         self.api_version = os.getenv('SHOPIFY_API_VERSION', '2024-01')
+        self.client = None
+        self.use_graphql = True
+        self.cache = ShopifyReadCache({
+            resource: float(os.getenv(f'SHOPIFY_CACHE_TTL_{resource.upper()}', ttl))
+            for resource, ttl in CACHE_TTLS.items()
+        })
         
         if not all([self.store_url, self.api_key, self.api_secret]):
             print("⚠️  Shopify credentials not configured")
@@ -38,25 +130,21 @@ class ShopifyAPI:
         self.initialized = True
         
         if SHOPIFY_AVAILABLE:
-            try:
-                # Initialize Shopify session (works with PyShopify 0.9.x)
-                shopify.ShopifyResource.set_site(f"https://{self.api_key}:{self.api_secret}@{self.store_url}/admin/api/{self.api_version}")
-                print("✅ Shopify API initialized")
-            except Exception as e:
-                print(f"❌ Error initializing Shopify API: {e}")
-                # Try alternative initialization for older versions
-                try:
-                    shopify.Session.setup(api_key=self.api_key, secret=self.api_secret)
-                    session = shopify.Session(f"{self.store_url}.myshopify.com", self.api_version)
-                    shopify.ShopifyResource.activate_session(session)
-                    print("✅ Shopify API initialized (alternative method)")
-                except Exception as e2:
-                    print(f"❌ Alternative initialization also failed: {e2}")
-                    self.initialized = False
+            # SHOPIFY_API_BASE_URL points the client at another host (e.g. a local stand-in server)
+            base_url = os.getenv('SHOPIFY_API_BASE_URL', f"https://{self.store_url}/admin/api/{self.api_version}")
+            self.client = ShopifyHTTPClient(
+                base_url,
+                auth=(self.api_key, self.api_secret),
+                access_token=os.getenv('SHOPIFY_ACCESS_TOKEN'),
+                timeout=(float(os.getenv('SHOPIFY_CONNECT_TIMEOUT', 5)), float(os.getenv('SHOPIFY_READ_TIMEOUT', 30))),
+                max_retries=int(os.getenv('SHOPIFY_MAX_RETRIES', 4)),
+            )
+            self.use_graphql = os.getenv('SHOPIFY_USE_GRAPHQL', '1') != '0'
+            print("✅ Shopify API initialized")
     
     def is_configured(self) -> bool:
         """Check if Shopify API is properly configured"""
-        return self.initialized and SHOPIFY_AVAILABLE
+        return self.initialized and self.client is not None
     
     def verify_webhook_signature(self, data: bytes, hmac_header: str) -> bool:
         """
@@ -81,57 +169,128 @@ class ShopifyAPI:
     def upload_file_to_shopify(self, file_path: str, filename: str) -> Optional[str]:
         """
         Upload a file to Shopify Files API
-        Note: PyShopify 0.9.x doesn't support File API directly
-        This is a placeholder - you may need to use REST API directly
         Args:
             file_path: Local path to file
             filename: Name for the file in Shopify
         Returns:
             File URL if successful, None otherwise
         """
+        result = self.upload_files_to_shopify({'file': (file_path, filename)}).get('file', {})
+        return result.get('url')
+    
+    def upload_files_to_shopify(self, files: Dict[str, Tuple[str, str]], max_workers: int = 4) -> Dict[str, Dict[str, Any]]:
+        """
+        Upload several files with the staged-upload flow: one stagedUploadsCreate for all files,
+        parallel streaming PUTs straight from disk, then one fileCreate for the uploaded ones
+        Args:
+            files: {key: (local path, filename in Shopify)}
+            max_workers: Concurrent uploads
+        Returns:
+            {key: {'url': file URL or None, 'error': message or None}} so failed files can be retried alone
+        """
+        results = {key: {'url': None, 'error': None} for key in files}
         if not self.is_configured():
             print("⚠️  Shopify API not configured")
-            return None
+            for result in results.values():
+                result['error'] = 'Shopify API not configured'
+            return results
+        if not files:
+            return results
         
+        keys = list(files)
         try:
-            # PyShopify 0.9.x doesn't have File API, use REST API directly
-            import requests
-            import base64
-            
-            with open(file_path, 'rb') as f:
-                file_data = f.read()
-            
-            # Encode file as base64
-            file_base64 = base64.b64encode(file_data).decode('utf-8')
-            
-            # Upload via REST API
-            url = f"https://{self.api_key}:{self.api_secret}@{self.store_url}/admin/api/{self.api_version}/files.json"
-            
-            payload = {
-                'file': {
+            # 1. Reserve upload targets for every file in one round trip
+            staged_input = []
+            for key in keys:
+                file_path, filename = files[key]
+                staged_input.append({
                     'filename': filename,
-                    'contents': file_base64
-                }
-            }
-            
-            response = requests.post(url, json=payload)
-            
-            if response.status_code == 201:
-                file_data = response.json().get('file', {})
-                file_url = file_data.get('url')
-                if file_url:
-                    print(f"✅ File uploaded to Shopify: {file_url}")
-                    return file_url
+                    'mimeType': mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                    'resource': 'FILE',
+                    'httpMethod': 'PUT',
+                    'fileSize': str(os.path.getsize(file_path))
+                })
+            staged = self.client.graphql(STAGED_UPLOADS_CREATE, {'input': staged_input})['stagedUploadsCreate']
+            if staged.get('userErrors'):
+                raise RuntimeError('; '.join(error['message'] for error in staged['userErrors']))
+            targets = dict(zip(keys, staged['stagedTargets']))
+        except Exception as e:
+            print(f"❌ Error staging uploads: {e}")
+            for result in results.values():
+                result['error'] = str(e)
+            return results
+        
+        # 2. Stream the file bodies in parallel
+        def put(key):
+            target = targets[key]
+            headers = {STAGED_PARAMETER_HEADERS.get(p['name'], p['name']): p['value'] for p in target.get('parameters') or []}
+            self.client.put_file(target['url'], files[key][0], headers)
+        
+        uploaded = []
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(keys)))) as executor:
+            futures = {executor.submit(put, key): key for key in keys}
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    future.result()
+                    uploaded.append(key)
+                except Exception as e:
+                    print(f"❌ Failed to upload {key}: {e}")
+                    results[key]['error'] = str(e)
+        if not uploaded:
+            return results
+        
+        # 3. Turn the staged uploads into Shopify files, then wait for their URLs
+        try:
+            created = self.client.graphql(FILE_CREATE, {'files': [
+                {'originalSource': targets[key]['resourceUrl'], 'contentType': 'FILE', 'alt': files[key][1]}
+                for key in uploaded
+            ]})['fileCreate']
+            for error in created.get('userErrors') or []:
+                field = error.get('field') or []
+                index = int(field[1]) if len(field) > 1 and str(field[1]).isdigit() else None
+                for key in ([uploaded[index]] if index is not None and index < len(uploaded) else uploaded):
+                    results[key]['error'] = error['message']
+            file_ids = {}
+            for key, created_file in zip(uploaded, created.get('files') or []):
+                if created_file and not results[key]['error']:
+                    file_ids[created_file['id']] = key
+            for file_id, url in self._wait_for_file_urls(list(file_ids)).items():
+                key = file_ids[file_id]
+                if url:
+                    results[key]['url'] = url
+                    print(f"✅ File uploaded to Shopify: {url}")
                 else:
-                    print("❌ No URL in response")
-                    return None
-            else:
-                print(f"❌ Failed to upload file: {response.status_code} - {response.text}")
-                return None
-                
+                    results[key]['error'] = 'File processing failed or timed out'
         except Exception as e:
-            print(f"❌ Error uploading file to Shopify: {e}")
-            return None
+            print(f"❌ Error creating Shopify files: {e}")
+            for key in uploaded:
+                results[key]['error'] = results[key]['error'] or str(e)
+        return results
+    
+    def _wait_for_file_urls(self, file_ids: List[str], timeout: float = 20.0) -> Dict[str, Optional[str]]:
+        """Poll until Shopify has processed the files (URL available) or failed them"""
+        urls: Dict[str, Optional[str]] = {}
+        pending = list(file_ids)
+        deadline = time.time() + timeout
+        delay = 0.5
+        while pending:
+            nodes = self.client.graphql(FILES_QUERY, {'ids': pending}).get('nodes') or []
+            for node in nodes:
+                if not node:
+                    continue
+                if node.get('url'):
+                    urls[node['id']] = node['url']
+                elif node.get('fileStatus') == 'FAILED':
+                    urls[node['id']] = None
+            pending = [file_id for file_id in pending if file_id not in urls]
+            if not pending or time.time() + delay > deadline:
+                break
+            time.sleep(delay)
+            delay = min(delay * 2, 4.0)
+        for file_id in pending:
+            urls[file_id] = None
+        return urls
     
     def create_draft_order(self, order_data: Dict[str, Any]) -> Optional[Dict]:
         """
@@ -146,7 +305,7 @@ class ShopifyAPI:
             return None
         
         try:
-            draft_order = shopify.DraftOrder.create(order_data)
+            draft_order = wrap_records(self.client.post_json('draft_orders.json', {'draft_order': order_data}).get('draft_order'))
             
             if draft_order:
                 print(f"✅ Draft order created: {draft_order.id}")
@@ -159,20 +318,28 @@ class ShopifyAPI:
             print(f"❌ Error creating draft order: {e}")
             return None
     
-    def get_order(self, order_id: str) -> Optional[Dict]:
+    def get_order(self, order_id: str, fresh: bool = False) -> Optional[Dict]:
         """
-        Get order by ID
+        Get order by ID (cached for a minute; concurrent lookups share one request)
         Args:
             order_id: Shopify order ID
+            fresh: Skip the cache, e.g. before writing back fields of the order
         Returns:
             Order object if found, None otherwise
         """
         if not self.is_configured():
             return None
-        
+        if fresh:
+            return self._fetch_order(order_id)
+        return self.cache.get_or_fetch('order', str(order_id), lambda: self._fetch_order(order_id))
+    
+    def _fetch_order(self, order_id: str) -> Optional[Dict]:
         try:
-            order = shopify.Order.find(order_id)
-            return order
+            return wrap_records(self.client.get_json(f'orders/{order_id}.json').get('order'))
+        except ShopifyHTTPError as e:
+            if e.status_code != 404:
+                print(f"❌ Error getting order {order_id}: {e}")
+            return None
         except Exception as e:
             print(f"❌ Error getting order {order_id}: {e}")
             return None
@@ -188,17 +355,43 @@ class ShopifyAPI:
         """
         if not self.is_configured():
             return []
-        
+        # Failed fetches return [] and are not cached
+        return self.cache.get_or_fetch('orders', (limit, status), lambda: self._fetch_orders(limit, status),
+                                       cache_if=bool)
+    
+    def _fetch_orders(self, limit: int, status: Optional[str]) -> List[Dict]:
         try:
+            params = {'limit': limit}
             if status:
-                orders = shopify.Order.find(limit=limit, status=status)
-            else:
-                orders = shopify.Order.find(limit=limit)
+                params['status'] = status
             
-            return list(orders) if orders else []
+            return wrap_records(self.client.get_json('orders.json', params=params).get('orders') or [])
         except Exception as e:
             print(f"❌ Error getting orders: {e}")
             return []
+
+    def iter_order_pages(self, updated_at_min: Optional[str] = None, page_size: int = 250) -> Iterator[List[Dict]]:
+        """
+        Walk all orders (any status) with cursor pagination, following the Link header
+        Args:
+            updated_at_min: Optional ISO 8601 timestamp; only orders updated since then
+            page_size: Orders per request (Shopify's maximum is 250)
+        Returns:
+            Iterator over pages of raw order dicts; errors are raised to the caller
+        """
+        if not self.is_configured():
+            return
+
+        params = {'status': 'any', 'limit': page_size}
+        if updated_at_min:
+            params['updated_at_min'] = updated_at_min
+        path = 'orders.json'
+        while path:
+            response = self.client.request('GET', path, params=params)
+            yield response.json().get('orders') or []
+            # The next-page URL carries the cursor and must not be combined with the filters
+            path = (response.links.get('next') or {}).get('url')
+            params = None
     
     def add_metafield_to_order(self, order_id: str, namespace: str, key: str, value: str, type: str = 'single_line_text_field') -> bool:
         """
@@ -216,68 +409,119 @@ class ShopifyAPI:
             return False
         
         try:
-            order = shopify.Order.find(order_id)
-            if not order:
-                return False
-            
-            metafield = shopify.Metafield({
+            metafield = {
                 'namespace': namespace,
                 'key': key,
                 'value': value,
-                'type': type,
-                'owner_resource': 'order',
-                'owner_id': order_id
-            })
+                'type': type
+            }
             
-            metafield.save()
+            self.client.post_json(f'orders/{order_id}/metafields.json', {'metafield': metafield})
             print(f"✅ Metafield added to order {order_id}")
             return True
         except Exception as e:
             print(f"❌ Error adding metafield: {e}")
             return False
     
-    def attach_files_to_order(self, order_id: str, file_urls: List[str]) -> bool:
+    def attach_files_to_order(self, order_id: str, file_urls: List[str],
+                              metafields: Optional[List[Tuple[str, str, str, str]]] = None) -> bool:
         """
-        Attach files to order as fulfillment attachments
+        Attach files to order as fulfillment attachments, append the download links
+        to the order note and set any metafields
+        Uses two GraphQL round trips (read order, one batched mutation) unless
+        SHOPIFY_USE_GRAPHQL=0 selects the REST calls
         Args:
             order_id: Shopify order ID
             file_urls: List of file URLs
+            metafields: Optional (namespace, key, value, type) tuples to set on the order
         Returns:
             True if successful
         """
         if not self.is_configured():
             return False
         
+        if not self.use_graphql:
+            return self._attach_files_to_order_rest(order_id, file_urls, metafields or [])
+        
+        try:
+            order_gid = f"gid://shopify/Order/{order_id}"
+            order = self.client.graphql(ORDER_FULFILLMENT_QUERY, {'id': order_gid}).get('order')
+            if not order:
+                return False
+            
+            fulfillment_orders = [
+                {'fulfillmentOrderId': node['id']}
+                for node in order['fulfillmentOrders']['nodes']
+                if node['status'] in ('OPEN', 'IN_PROGRESS')
+            ]
+            # No open fulfillment orders left means an earlier attempt already fulfilled the order
+            note = download_links_note(order.get('note'), file_urls)
+            result = self.client.graphql(ATTACH_FILES_MUTATION, {
+                'fulfillment': {
+                    'lineItemsByFulfillmentOrder': fulfillment_orders,
+                    'notifyCustomer': True,
+                    'trackingInfo': {'company': 'Digital Download', 'number': 'N/A', 'urls': file_urls}
+                },
+                'hasFulfillment': bool(fulfillment_orders),
+                'order': {'id': order_gid, 'note': note or ""},
+                'hasNote': note is not None,
+                'metafields': [
+                    {'ownerId': order_gid, 'namespace': namespace, 'key': key, 'value': value, 'type': type}
+                    for namespace, key, value, type in (metafields or [])
+                ],
+                'hasMetafields': bool(metafields)
+            })
+            
+            for step in ('orderUpdate', 'metafieldsSet'):
+                for error in (result.get(step) or {}).get('userErrors') or []:
+                    print(f"⚠️  {step} failed for order {order_id}: {error['message']}")
+            
+            fulfillment = result.get('fulfillmentCreateV2') or {}
+            if not fulfillment_orders or (fulfillment.get('fulfillment') and not fulfillment.get('userErrors')):
+                print(f"✅ Files attached to order {order_id}")
+                self.invalidate_order(order_id)
+                return True
+            else:
+                print(f"❌ Failed to create fulfillment: {fulfillment.get('userErrors')}")
+                return False
+        except Exception as e:
+            print(f"❌ Error attaching files to order: {e}")
+            return False
+    
+    def _attach_files_to_order_rest(self, order_id: str, file_urls: List[str],
+                                    metafields: List[Tuple[str, str, str, str]]) -> bool:
+        """REST version of attach_files_to_order: one call per step (order, fulfillment, note, each metafield)"""
         try:
-            order = shopify.Order.find(order_id)
+            order = self.get_order(order_id, fresh=True)
             if not order:
                 return False
             
             # Create fulfillment with attachments
-            # Note: tracking_urls may not be supported in older PyShopify
             fulfillment_data = {
                 'order_id': order_id,
                 'status': 'success',
                 'tracking_company': 'Digital Download',
                 'tracking_number': 'N/A',
                 'notify_customer': True,
-                'line_items': [{'id': item.id} for item in order.line_items]
+                'line_items': [{'id': item.id} for item in order.line_items],
+                'tracking_urls': file_urls
             }
             
-            # Try to add tracking_urls if supported
-            try:
-                fulfillment_data['tracking_urls'] = file_urls
-            except:
-                pass
-            
-            fulfillment = shopify.Fulfillment.create(fulfillment_data)
+            if order.get('fulfillment_status') == 'fulfilled':
+                fulfillment = True  # An earlier attempt got this far
+            else:
+                fulfillment = self.client.post_json(f'orders/{order_id}/fulfillments.json',
+                                                    {'fulfillment': fulfillment_data}).get('fulfillment')
             
             if fulfillment:
                 print(f"✅ Files attached to order {order_id}")
+                self.invalidate_order(order_id)
                 # Also add note with download links
-                note = f"Download links:\n" + "\n".join(file_urls)
-                order.note = (order.note or "") + "\n\n" + note
-                order.save()
+                note = download_links_note(order.get('note'), file_urls)
+                if note is not None:
+                    self.client.put_json(f'orders/{order_id}.json', {'order': {'id': order_id, 'note': note}})
+                for namespace, key, value, type in metafields:
+                    self.add_metafield_to_order(order_id, namespace, key, value, type)
                 return True
             else:
                 print("❌ Failed to create fulfillment")
@@ -296,14 +540,17 @@ class ShopifyAPI:
         """
         if not self.is_configured():
             return []
-        
+        return self.cache.get_or_fetch('variants', product_id, lambda: self._fetch_product_variants(product_id),
+                                       cache_if=bool)
+    
+    def _fetch_product_variants(self, product_id: Optional[str]) -> List[Dict]:
         try:
             if product_id:
-                product = shopify.Product.find(product_id)
+                product = wrap_records(self.client.get_json(f'products/{product_id}.json').get('product'))
                 return list(product.variants) if product else []
             else:
                 # Get all products and their variants
-                products = shopify.Product.find(limit=250)
+                products = wrap_records(self.client.get_json('products.json', params={'limit': 250}).get('products') or [])
                 variants = []
                 for product in products:
                     variants.extend(product.variants)
@@ -312,6 +559,18 @@ class ShopifyAPI:
             print(f"❌ Error getting variants: {e}")
             return []
 
+    
+    def get_variant_ids(self) -> Dict[str, str]:
+        """Configured variant IDs (and store URL) for the storefront, skipping unset ones"""
+        return self.cache.get_or_fetch('variant_ids', None, lambda: {
+            name: os.getenv(variable) for name, variable in VARIANT_ID_VARIABLES.items() if os.getenv(variable)
+        })
+    
+    def invalidate_order(self, order_id: str):
+        """Forget cached reads of an order (and order lists) after Shopify reported a change"""
+        self.cache.invalidate('order', str(order_id))
+        self.cache.invalidate('orders')
+
 
 # Global instance
 _shopify_api = None
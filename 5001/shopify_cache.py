@@ -0,0 +1,110 @@
+"""
+Shopify Read Cache
+Per-resource TTL cache for Shopify Admin API reads. Concurrent misses for the same key
+share one request (single-flight), and webhook handlers invalidate entries explicitly
+when Shopify tells us a resource changed.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class _Flight:
+    """A fetch in progress; followers wait on done and read value"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class ShopifyReadCache:
+    """
+    Entries are keyed by (resource, key) and expire after ttls[resource] seconds.
+    Resources without a TTL are never cached. Oldest entries are dropped beyond max_entries.
+    """
+
+    def __init__(self, ttls: Dict[str, float], max_entries: int = 1000):
+        self.ttls = ttls
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Tuple[str, Hashable], Tuple[float, Any]]' = OrderedDict()
+        self._inflight: Dict[Tuple[str, Hashable], _Flight] = {}
+        # Bumped on invalidation so a fetch that started earlier does not store stale data
+        self._generations: Dict[str, int] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def _count(self, resource: str, counter: str):
+        counters = self._counters.setdefault(resource, {'hits': 0, 'misses': 0, 'coalesced': 0, 'invalidations': 0})
+        counters[counter] += 1
+
+    def get_or_fetch(self, resource: str, key: Hashable, fetch: Callable[[], Any],
+                     cache_if: Callable[[Any], bool] = lambda value: value is not None) -> Any:
+        """
+        Return the cached value, or call fetch() once for all concurrent callers of this key.
+        Only values accepted by cache_if are stored (by default: anything but None).
+        """
+        ttl = self.ttls.get(resource, 0)
+        cache_key = (resource, key)
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(cache_key)
+                self._count(resource, 'hits')
+                return entry[1]
+            flight = self._inflight.get(cache_key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[cache_key] = _Flight()
+                generation = self._generations.get(resource, 0)
+                self._count(resource, 'misses')
+            else:
+                self._count(resource, 'coalesced')
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = fetch()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[cache_key]
+                if (flight.error is None and ttl > 0 and cache_if(flight.value)
+                        and self._generations.get(resource, 0) == generation):
+                    self._entries[cache_key] = (time.monotonic() + ttl, flight.value)
+                    self._entries.move_to_end(cache_key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            flight.done.set()
+        return flight.value
+
+    def invalidate(self, resource: str, key: Optional[Hashable] = None):
+        """Drop one entry, or every entry of a resource when key is None"""
+        with self._lock:
+            self._generations[resource] = self._generations.get(resource, 0) + 1
+            self._count(resource, 'invalidations')
+            if key is not None:
+                self._entries.pop((resource, key), None)
+            else:
+                for cache_key in [k for k in self._entries if k[0] == resource]:
+                    del self._entries[cache_key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-resource counters and hit rate (coalesced requests count as hits: they cost no API call)"""
+        with self._lock:
+            stats = {}
+            for resource, counters in self._counters.items():
+                lookups = counters['hits'] + counters['misses'] + counters['coalesced']
+                stats[resource] = dict(
+                    counters,
+                    entries=sum(1 for k in self._entries if k[0] == resource),
+                    hit_rate=round((counters['hits'] + counters['coalesced']) / lookups, 3) if lookups else None,
+                )
+            return stats
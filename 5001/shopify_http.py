@@ -0,0 +1,309 @@
+"""
+Shopify HTTP Client
+Shared keep-alive session for the Shopify Admin API with per-call timeouts,
+a client-side leaky bucket that follows X-Shopify-Shop-Api-Call-Limit (REST),
+a calculated query cost bucket for GraphQL (a separate limit on Shopify's side),
+and exponential backoff on 429/5xx responses
+"""
+import random
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+    REQUESTS_AVAILABLE = True
+except ImportError:
+    REQUESTS_AVAILABLE = False
+    print("⚠️  requests not installed. Install with: pip3 install requests")
+
+
+CALL_LIMIT_HEADER = 'X-Shopify-Shop-Api-Call-Limit'
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'PUT', 'DELETE')
+# Cost assumed for a GraphQL document until Shopify has reported its requestedQueryCost
+DEFAULT_GRAPHQL_COST = 50.0
+
+
+class ShopifyHTTPError(Exception):
+    """Non-success response from Shopify (after retries)"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"Shopify API error {status_code}: {message}")
+        self.status_code = status_code
+
+
+class ShopifyGraphQLError(Exception):
+    """GraphQL response carrying top-level errors (other than throttling, which is retried)"""
+
+
+class ShopifyRecord(dict):
+    """JSON object from the Admin API with attribute access (order.id, item.properties, ...)"""
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return wrap_records(self[name])
+        except KeyError:
+            raise AttributeError(name)
+
+
+def wrap_records(value: Any) -> Any:
+    if isinstance(value, dict) and not isinstance(value, ShopifyRecord):
+        return ShopifyRecord(value)
+    if isinstance(value, list):
+        return [wrap_records(item) for item in value]
+    return value
+
+
+class LeakyBucket:
+    """
+    Client-side mirror of Shopify's call limit bucket: it drains at leak_rate calls per
+    second, and acquire() waits while the bucket is within `reserve` calls of full.
+    Every response resynchronises the level from X-Shopify-Shop-Api-Call-Limit.
+    """
+
+    def __init__(self, capacity: int = 40, leak_rate: float = 2.0, reserve: int = 2):
+        self.capacity = capacity
+        self.leak_rate = leak_rate
+        self.reserve = reserve
+        self._level = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _drain(self, now: float):
+        self._level = max(0.0, self._level - (now - self._updated) * self.leak_rate)
+        self._updated = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._drain(now)
+                limit = max(1, self.capacity - self.reserve)
+                if self._level + 1 <= limit:
+                    self._level += 1
+                    return
+                wait = (self._level + 1 - limit) / self.leak_rate
+            time.sleep(wait)
+
+    def update(self, header_value: Optional[str]):
+        """Apply a "used/capacity" call limit header"""
+        if not header_value:
+            return
+        try:
+            used, capacity = (int(part) for part in header_value.split('/'))
+        except ValueError:
+            return
+        with self._lock:
+            self._drain(time.monotonic())
+            self.capacity = capacity
+            self._level = float(used)
+
+    @property
+    def level(self) -> float:
+        with self._lock:
+            self._drain(time.monotonic())
+            return self._level
+
+
+class GraphQLCostBucket:
+    """
+    Client-side mirror of the GraphQL Admin API's query cost limit: up to `capacity`
+    points, restored at restore_rate points per second. acquire(cost) waits until the
+    estimated cost of a query is available; every response resynchronises the bucket
+    from extensions.cost.throttleStatus.
+    """
+
+    def __init__(self, capacity: float = 1000.0, restore_rate: float = 50.0):
+        self.capacity = capacity
+        self.restore_rate = restore_rate
+        self._available = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _restore(self, now: float):
+        self._available = min(self.capacity, self._available + (now - self._updated) * self.restore_rate)
+        self._updated = now
+
+    def acquire(self, cost: float):
+        cost = min(cost, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._restore(now)
+                if self._available >= cost:
+                    self._available -= cost
+                    return
+                wait = (cost - self._available) / self.restore_rate
+            time.sleep(wait)
+
+    def update(self, throttle_status: Optional[Dict[str, Any]]) -> bool:
+        """Apply a throttleStatus object; returns False if there was none"""
+        if not throttle_status:
+            return False
+        try:
+            capacity = float(throttle_status['maximumAvailable'])
+            available = float(throttle_status['currentlyAvailable'])
+            restore_rate = float(throttle_status['restoreRate'])
+        except (KeyError, TypeError, ValueError):
+            return False
+        with self._lock:
+            self.capacity = capacity
+            self.restore_rate = restore_rate or self.restore_rate
+            self._available = min(capacity, available)
+            self._updated = time.monotonic()
+        return True
+
+    @property
+    def available(self) -> float:
+        with self._lock:
+            self._restore(time.monotonic())
+            return self._available
+
+
+class ShopifyHTTPClient:
+    """Admin API client; one instance (and connection pool) is shared by all threads"""
+
+    def __init__(self, base_url: str, auth: Optional[Tuple[str, str]] = None, access_token: Optional[str] = None,
+                 timeout: Tuple[float, float] = (5.0, 30.0), max_retries: int = 4, backoff: float = 0.5,
+                 pool_size: int = 10):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.bucket = LeakyBucket()
+        self.graphql_bucket = GraphQLCostBucket()
+        # Last requested cost of each GraphQL document, used as the estimate for the next call
+        self._query_costs: Dict[str, float] = {}
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        if access_token:
+            self.session.headers['X-Shopify-Access-Token'] = access_token
+        elif auth:
+            self.session.auth = auth
+        self.session.headers['Accept'] = 'application/json'
+        # Staged upload targets are third-party storage URLs: never send Shopify credentials there
+        self.upload_session = requests.Session()
+        upload_adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.upload_session.mount('https://', upload_adapter)
+        self.upload_session.mount('http://', upload_adapter)
+
+    def url(self, path: str) -> str:
+        return path if path.startswith(('http://', 'https://')) else f"{self.base_url}/{path.lstrip('/')}"
+
+    def _retry_delay(self, attempt: int, response: Optional['requests.Response']) -> float:
+        if response is not None and response.status_code == 429:
+            try:
+                return float(response.headers.get('Retry-After', ''))
+            except ValueError:
+                pass
+        return self.backoff * (2 ** attempt) * (0.5 + random.random() / 2)
+
+    def request(self, method: str, path: str, retry: Optional[bool] = None, call_limit: bool = True,
+                **kwargs) -> 'requests.Response':
+        """
+        Send a request, waiting for REST call limit capacity first (unless call_limit=False,
+        for GraphQL calls, which graphql() throttles by query cost instead).
+        429 is always retried (Shopify did not run the call); 5xx and connection errors
+        only for idempotent methods unless retry=True.
+        Raises ShopifyHTTPError for error responses, requests exceptions for transport errors.
+        """
+        method = method.upper()
+        if retry is None:
+            retry = method in IDEMPOTENT_METHODS
+        kwargs.setdefault('timeout', self.timeout)
+        url = self.url(path)
+
+        for attempt in range(self.max_retries + 1):
+            if call_limit:
+                self.bucket.acquire()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if not retry or attempt == self.max_retries:
+                    raise
+                delay = self._retry_delay(attempt, None)
+                print(f"⚠️  Shopify {method} {path} failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            if call_limit:
+                self.bucket.update(response.headers.get(CALL_LIMIT_HEADER))
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries \
+                    and (retry or response.status_code == 429):
+                delay = self._retry_delay(attempt, response)
+                print(f"⚠️  Shopify {method} {path} returned {response.status_code}, retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            if response.status_code >= 400:
+                raise ShopifyHTTPError(response.status_code, response.text[:500])
+            return response
+        raise AssertionError("unreachable")
+
+    def get_json(self, path: str, **kwargs) -> Dict[str, Any]:
+        return self.request('GET', path, **kwargs).json()
+
+    def post_json(self, path: str, payload: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        response = self.request('POST', path, json=payload, **kwargs)
+        return response.json() if response.content else {}
+
+    def put_json(self, path: str, payload: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        response = self.request('PUT', path, json=payload, **kwargs)
+        return response.json() if response.content else {}
+
+    def put_file(self, url: str, file_path: str, headers: Optional[Dict[str, str]] = None) -> 'requests.Response':
+        """
+        Stream a file from disk to a staged upload URL (PUT, so retrying is safe).
+        Raises ShopifyHTTPError / requests exceptions after the last attempt.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                with open(file_path, 'rb') as f:
+                    response = self.upload_session.put(url, data=f, headers=headers or {}, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self._retry_delay(attempt, None)
+                print(f"⚠️  Staged upload of {file_path} failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                delay = self._retry_delay(attempt, response)
+                print(f"⚠️  Staged upload of {file_path} returned {response.status_code}, retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            if response.status_code >= 400:
+                raise ShopifyHTTPError(response.status_code, response.text[:500])
+            return response
+        raise AssertionError("unreachable")
+
+    def graphql(self, query: str, variables: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Run a GraphQL Admin API query or mutation and return its data.
+        Waits for the query's estimated cost in the GraphQL cost bucket first (the REST
+        call limit does not apply). THROTTLED responses were not executed, so they are
+        retried once enough cost has been restored.
+        Raises ShopifyGraphQLError for other top-level errors.
+        """
+        payload = {'query': query, 'variables': variables or {}}
+        for attempt in range(self.max_retries + 1):
+            self.graphql_bucket.acquire(self._query_costs.get(query, DEFAULT_GRAPHQL_COST))
+            body = self.request('POST', 'graphql.json', call_limit=False, json=payload).json()
+            cost = (body.get('extensions') or {}).get('cost') or {}
+            if cost.get('requestedQueryCost') is not None:
+                self._query_costs[query] = float(cost['requestedQueryCost'])
+            synced = self.graphql_bucket.update(cost.get('throttleStatus'))
+            errors = body.get('errors') or []
+            throttled = any((error.get('extensions') or {}).get('code') == 'THROTTLED' for error in errors)
+            if throttled and attempt < self.max_retries:
+                print(f"⚠️  Shopify GraphQL throttled, waiting for {self._query_costs.get(query, DEFAULT_GRAPHQL_COST):.0f} cost points")
+                if not synced:
+                    time.sleep(self._retry_delay(attempt, None))
+                continue
+            if errors:
+                raise ShopifyGraphQLError('; '.join(str(error.get('message', error)) for error in errors))
+            return body.get('data') or {}
+        raise AssertionError("unreachable")
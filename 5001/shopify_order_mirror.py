@@ -0,0 +1,262 @@
+"""
+Shopify Order Mirror
+Local SQLite copy of Shopify orders for the admin API. The orders/create and orders/paid
+webhooks upsert into it, and a periodic reconcile walks the Admin API's cursor-paginated
+order list for anything updated since the last pass, so admin page loads never wait on Shopify.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shopify_orders (
+    id INTEGER PRIMARY KEY,
+    name TEXT,
+    email TEXT,
+    album_order_id TEXT,
+    financial_status TEXT,
+    fulfillment_status TEXT,
+    closed INTEGER NOT NULL DEFAULT 0,
+    cancelled INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT,
+    updated_at TEXT,
+    summary TEXT NOT NULL,
+    synced_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_shopify_orders_created ON shopify_orders (created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_shopify_orders_album_order ON shopify_orders (album_order_id);
+CREATE TABLE IF NOT EXISTS mirror_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# Seconds re-read before the last reconcile watermark (clock skew between us and Shopify)
+RECONCILE_OVERLAP = 300
+
+
+def _price(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def serialize_order(order: Dict[str, Any]) -> Dict[str, Any]:
+    """The JSON shape served by /api/shopify/orders for one Shopify order"""
+    return {
+        'id': str(order.get('id')),
+        'name': order.get('name'),
+        'email': order.get('email'),
+        'total_price': _price(order.get('total_price')),
+        'financial_status': order.get('financial_status'),
+        'fulfillment_status': order.get('fulfillment_status'),
+        'created_at': order.get('created_at'),
+        'line_items': [
+            {
+                'id': str(item.get('id')),
+                'title': item.get('title'),
+                'quantity': item.get('quantity'),
+                'price': _price(item.get('price')),
+                'properties': [
+                    {'name': prop.get('name'), 'value': prop.get('value')}
+                    for prop in (item.get('properties') or [])
+                ]
+            }
+            for item in (order.get('line_items') or [])
+        ]
+    }
+
+
+def _album_order_id(order: Dict[str, Any]) -> Optional[str]:
+    for item in order.get('line_items') or []:
+        for prop in item.get('properties') or []:
+            if (prop.get('name') or '').lower() in ('_order_id', 'order_id'):
+                return prop.get('value')
+    return None
+
+
+class ShopifyOrderMirror:
+    """
+    Orders table shared by every worker process through one SQLite file.
+    Only the serialized summary is kept; filter columns are copied out of it for the indexes.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._thread: Optional[threading.Thread] = None
+        with self._transaction() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _transaction(self):
+        """Short-lived connection committing on success (connections are not shared across threads)"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def upsert(self, order: Dict[str, Any], conn: Optional[sqlite3.Connection] = None):
+        """
+        Store a Shopify order (webhook payload or Admin API object).
+        A copy older than the stored one (by updated_at) is ignored, so a late webhook
+        never overwrites what the reconcile already fetched.
+        """
+        if conn is None:
+            with self._transaction() as conn:
+                return self.upsert(order, conn)
+        updated_at = order.get('updated_at') or order.get('created_at')
+        conn.execute(
+            'INSERT INTO shopify_orders (id, name, email, album_order_id, financial_status, fulfillment_status, '
+            'closed, cancelled, created_at, updated_at, summary, synced_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (id) DO UPDATE SET name = excluded.name, email = excluded.email, '
+            'album_order_id = excluded.album_order_id, financial_status = excluded.financial_status, '
+            'fulfillment_status = excluded.fulfillment_status, closed = excluded.closed, '
+            'cancelled = excluded.cancelled, created_at = excluded.created_at, updated_at = excluded.updated_at, '
+            'summary = excluded.summary, synced_at = excluded.synced_at '
+            'WHERE shopify_orders.updated_at IS NULL OR excluded.updated_at >= shopify_orders.updated_at',
+            (
+                int(order['id']), order.get('name'), order.get('email'), _album_order_id(order),
+                order.get('financial_status'), order.get('fulfillment_status'),
+                int(bool(order.get('closed_at'))), int(bool(order.get('cancelled_at'))),
+                order.get('created_at'), updated_at, json.dumps(serialize_order(order)), time.time()
+            )
+        )
+
+    def get(self, order_id: str) -> Optional[Dict[str, Any]]:
+        """Serialized order, or None if it is not mirrored"""
+        try:
+            key = int(order_id)
+        except (TypeError, ValueError):
+            return None
+        with self._transaction() as conn:
+            row = conn.execute('SELECT summary FROM shopify_orders WHERE id = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def query(self, limit: int = 50, offset: int = 0, status: Optional[str] = None,
+              financial_status: Optional[str] = None, fulfillment_status: Optional[str] = None,
+              album_order_id: Optional[str] = None, search: Optional[str] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Filtered page of orders, newest first.
+        status follows Shopify's meaning: open, closed, cancelled or any (default).
+        fulfillment_status 'unfulfilled' matches orders without any fulfillment.
+        Returns: (orders, total number of matching orders)
+        """
+        clauses, params = [], []
+        if status == 'open':
+            clauses.append('closed = 0 AND cancelled = 0')
+        elif status == 'closed':
+            clauses.append('closed = 1')
+        elif status == 'cancelled':
+            clauses.append('cancelled = 1')
+        if financial_status:
+            clauses.append('financial_status = ?')
+            params.append(financial_status)
+        if fulfillment_status == 'unfulfilled':
+            clauses.append('fulfillment_status IS NULL')
+        elif fulfillment_status:
+            clauses.append('fulfillment_status = ?')
+            params.append(fulfillment_status)
+        if album_order_id:
+            clauses.append('album_order_id = ?')
+            params.append(album_order_id)
+        if search:
+            clauses.append('(name LIKE ? OR email LIKE ?)')
+            params.extend([f'%{search}%'] * 2)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+
+        with self._transaction() as conn:
+            total = conn.execute(f'SELECT COUNT(*) FROM shopify_orders {where}', params).fetchone()[0]
+            rows = conn.execute(
+                f'SELECT summary FROM shopify_orders {where} ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?',
+                params + [limit, offset]
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows], total
+
+    def _get_meta(self, conn: sqlite3.Connection, key: str) -> Optional[str]:
+        row = conn.execute('SELECT value FROM mirror_meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def is_synced(self) -> bool:
+        """True once a full reconcile has completed (until then the mirror may be missing orders)"""
+        with self._transaction() as conn:
+            return self._get_meta(conn, 'watermark') is not None
+
+    def _claim_reconcile(self, interval: float) -> bool:
+        """Only one worker process reconciles per interval"""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            last = self._get_meta(conn, 'reconcile_claimed_at')
+            if last is not None and now - float(last) < interval:
+                return False
+            conn.execute("INSERT OR REPLACE INTO mirror_meta (key, value) VALUES ('reconcile_claimed_at', ?)", (str(now),))
+            return True
+
+    def reconcile(self, shopify_api) -> int:
+        """
+        Fetch every order updated since the last reconcile (all orders on the first run)
+        Returns: number of orders upserted
+        """
+        with self._transaction() as conn:
+            watermark = self._get_meta(conn, 'watermark')
+        started = time.time()
+        updated_at_min = None
+        if watermark is not None:
+            updated_at_min = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(float(watermark) - RECONCILE_OVERLAP))
+
+        count = 0
+        for page in shopify_api.iter_order_pages(updated_at_min=updated_at_min):
+            with self._transaction() as conn:
+                for order in page:
+                    self.upsert(order, conn)
+            count += len(page)
+        with self._transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO mirror_meta (key, value) VALUES ('watermark', ?)", (str(started),))
+        print(f"🔄 Shopify order mirror reconciled {count} order(s) in {time.time() - started:.1f}s")
+        return count
+
+    def _run(self, shopify_api, interval: float):
+        while True:
+            try:
+                if self._claim_reconcile(interval):
+                    self.reconcile(shopify_api)
+            except Exception as e:
+                print(f"❌ Shopify order reconcile failed: {e}")
+            time.sleep(interval)
+
+    def start(self, shopify_api, interval: float = 900.0):
+        """Start the periodic reconcile thread (idempotent)"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, args=(shopify_api, interval),
+                                            name='shopify-order-mirror', daemon=True)
+            self._thread.start()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._transaction() as conn:
+            count = conn.execute('SELECT COUNT(*) FROM shopify_orders').fetchone()[0]
+            watermark = self._get_meta(conn, 'watermark')
+        return {
+            'orders': count,
+            'last_reconcile_age_seconds': round(time.time() - float(watermark), 3) if watermark else None,
+        }
+
+
+# Global instance
+_shopify_order_mirror = None
+
+def get_shopify_order_mirror() -> ShopifyOrderMirror:
+    """Get or create the order mirror (configured from environment variables)"""
+    global _shopify_order_mirror
+    if _shopify_order_mirror is None:
+        _shopify_order_mirror = ShopifyOrderMirror(os.getenv('SHOPIFY_ORDER_MIRROR_DB', 'shopify_orders.db'))
+    return _shopify_order_mirror
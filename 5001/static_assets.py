@@ -0,0 +1,216 @@
+"""
+Static Assets
+Content-hashed URLs for the files the pages load (product images, /js), so they can be
+cached as immutable. Text assets get gzip (and brotli, if installed) variants computed
+once and stored on disk, and requests are answered with the best encoding they accept.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+import uuid
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+    print("⚠️  brotli not installed, assets are precompressed with gzip only. Install with: pip3 install brotli")
+
+
+ASSET_URL_PREFIX = '/assets'
+ASSET_DIRS = ('js', 'product_images')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Images and other already compressed formats gain nothing from gzip/brotli
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml', 'model/stl', 'model/x-grid-mesh')
+MIN_COMPRESS_SIZE = 1024
+# Above this, top compression levels cost seconds (brotli 11 on the 3.4 MB 75x75 STL: ~9 s) for little gain
+LARGE_COMPRESS_SIZE = 1 << 20
+ENCODING_PREFERENCE = ('br', 'gzip')
+
+
+def compress_variants(data: bytes) -> Dict[str, bytes]:
+    """gzip/brotli encodings of data, keeping only those that save at least 10%"""
+    large = len(data) > LARGE_COMPRESS_SIZE
+    variants = {'gzip': gzip.compress(data, compresslevel=6 if large else 9, mtime=0)}
+    if BROTLI_AVAILABLE:
+        variants['br'] = brotli.compress(data, quality=9 if large else 11)
+    return {encoding: body for encoding, body in variants.items() if len(body) < len(data) * 0.9}
+
+
+def negotiate_encoding(accept_encoding: str, available: Iterable[str]) -> Optional[str]:
+    """Best of the available encodings the Accept-Encoding header allows (None = identity)"""
+    accepted = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        match = re.search(r'q=([0-9.]+)', params)
+        if match:
+            try:
+                quality = float(match.group(1))
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    available = set(available)
+    for encoding in ENCODING_PREFERENCE:
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        if encoding in available and quality > 0:
+            return encoding
+    return None
+
+
+class Asset(NamedTuple):
+    relpath: str
+    path: str
+    digest: str  # sha256 of the file content
+    mimetype: str
+    signature: Tuple[int, int]  # (mtime_ns, size) the digest was computed for
+    encodings: Dict[str, str]  # encoding -> path of the precompressed file
+
+
+class AssetStore:
+    """
+    Files under root/<dirs>, addressed by their path relative to root.
+    Precompressed variants are stored in cache_dir as <digest>.<encoding>, shared by all workers.
+    """
+
+    def __init__(self, root: str, cache_dir: str, dirs: Tuple[str, ...] = ASSET_DIRS):
+        self.root = os.path.abspath(root)
+        self.dirs = dirs
+        self.cache_dir = os.path.abspath(cache_dir)
+        self._assets: Dict[str, Asset] = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _resolve(self, relpath: str) -> Optional[str]:
+        relpath = relpath.lstrip('/')
+        if relpath.split('/', 1)[0] not in self.dirs:
+            return None
+        path = os.path.abspath(os.path.join(self.root, relpath))
+        if not path.startswith(self.root + os.sep):
+            return None
+        return path
+
+    def _precompress(self, path: str, digest: str, mimetype: str) -> Dict[str, str]:
+        if not mimetype.startswith(COMPRESSIBLE_TYPES) or os.path.getsize(path) < MIN_COMPRESS_SIZE:
+            return {}
+        encodings = {}
+        missing = [encoding for encoding in ENCODING_PREFERENCE
+                   if not os.path.exists(os.path.join(self.cache_dir, f'{digest}.{encoding}'))]
+        if missing:
+            with open(path, 'rb') as f:
+                variants = compress_variants(f.read())
+            for encoding, body in variants.items():
+                variant_path = os.path.join(self.cache_dir, f'{digest}.{encoding}')
+                tmp_path = f'{variant_path}.tmp-{uuid.uuid4().hex[:8]}'
+                with open(tmp_path, 'wb') as f:
+                    f.write(body)
+                os.replace(tmp_path, variant_path)
+        for encoding in ENCODING_PREFERENCE:
+            variant_path = os.path.join(self.cache_dir, f'{digest}.{encoding}')
+            if os.path.exists(variant_path):
+                encodings[encoding] = variant_path
+        return encodings
+
+    def get(self, relpath: str) -> Optional[Asset]:
+        """
+        Current asset for relpath (hashed and precompressed again if the file changed),
+        or None if it does not exist or is outside the asset directories
+        """
+        path = self._resolve(relpath)
+        if path is None:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        signature = (stat.st_mtime_ns, stat.st_size)
+        relpath = os.path.relpath(path, self.root).replace(os.sep, '/')
+        with self._lock:
+            asset = self._assets.get(relpath)
+        if asset is not None and asset.signature == signature:
+            return asset
+
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        asset = Asset(relpath, path, digest, mimetype, signature, self._precompress(path, digest, mimetype))
+        with self._lock:
+            self._assets[relpath] = asset
+        return asset
+
+    def forget(self, directory: str):
+        """
+        Drop the assets under directory (about to be deleted) and remove their precompressed
+        variants, including those another worker computed
+        """
+        prefix = os.path.abspath(directory) + os.sep
+        with self._lock:
+            for relpath in [relpath for relpath, asset in self._assets.items() if asset.path.startswith(prefix)]:
+                del self._assets[relpath]
+            kept_digests = {asset.digest for asset in self._assets.values()}
+        for dirpath, _, filenames in os.walk(directory):
+            for filename in filenames:
+                sha = hashlib.sha256()
+                with open(os.path.join(dirpath, filename), 'rb') as f:
+                    for chunk in iter(lambda: f.read(1 << 20), b''):
+                        sha.update(chunk)
+                if sha.hexdigest() in kept_digests:
+                    continue
+                for encoding in ENCODING_PREFERENCE:
+                    try:
+                        os.remove(os.path.join(self.cache_dir, f'{sha.hexdigest()}.{encoding}'))
+                    except FileNotFoundError:
+                        pass
+
+    def url(self, relpath: str) -> str:
+        """Fingerprinted URL for an asset (the plain path if the file is unknown)"""
+        asset = self.get(relpath)
+        if asset is None:
+            return '/' + relpath.lstrip('/')
+        return f'{ASSET_URL_PREFIX}/{asset.digest[:16]}/{asset.relpath}'
+
+    def fingerprint_urls(self, value):
+        """Replace local asset paths in a JSON value (e.g. images.json) with fingerprinted URLs"""
+        if isinstance(value, dict):
+            return {key: self.fingerprint_urls(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self.fingerprint_urls(item) for item in value]
+        if isinstance(value, str) and value.startswith('/') and value.split('/', 2)[1] in self.dirs:
+            return self.url(value)
+        return value
+
+    def preload(self):
+        """Hash and precompress every asset up front (startup)"""
+        count = 0
+        for directory in self.dirs:
+            base = os.path.join(self.root, directory)
+            for dirpath, _, filenames in os.walk(base):
+                for filename in filenames:
+                    if self.get(os.path.relpath(os.path.join(dirpath, filename), self.root)) is not None:
+                        count += 1
+        print(f"📦 Indexed {count} static asset(s)")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'assets': len(self._assets),
+                'precompressed': sum(1 for asset in self._assets.values() if asset.encodings),
+            }
+
+
+# Global instance
+_asset_store = None
+
+def get_asset_store() -> AssetStore:
+    """Get or create the asset store (rooted in the working directory, like product_images and images.json)"""
+    global _asset_store
+    if _asset_store is None:
+        _asset_store = AssetStore(os.getenv('ASSET_ROOT', '.'), os.getenv('ASSET_CACHE_DIR', '.asset_cache'))
+    return _asset_store
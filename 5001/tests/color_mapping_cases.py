@@ -0,0 +1,27 @@
+"""
+Color mapping parity corpus (see record_color_mapping.py and test_color_mapping.py).
+Every pixel of a case image has a distinct color, so a face mapped to the wrong pixel
+always shows up as a wrong color.
+"""
+import os
+
+import numpy as np
+
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'color_mapping.npz')
+
+# name -> (STL template size, grid size passed to the mapping, image width, image height)
+CASES = {
+    'normal48_square': (48, 48, 96, 96),
+    'normal48_wide': (48, 48, 160, 90),
+    'normal48_tall': (48, 48, 64, 120),
+    'grid75': (75, 75, 75, 75),
+    'grid75_nonsquare': (75, 75, 80, 64),
+    'grid96_on_75_mesh': (75, 96, 96, 96),
+    'grid75_on_48_mesh': (48, 75, 75, 75),
+}
+
+
+def case_image(width: int, height: int) -> np.ndarray:
+    """(height, width, 3) uint8 image whose pixels all differ (width, height < 256)"""
+    x, y = np.meshgrid(np.arange(width), np.arange(height))
+    return np.stack([x, y, (x * 7 + y * 13) % 256], axis=-1).astype(np.uint8)
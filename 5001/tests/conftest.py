@@ -0,0 +1,49 @@
+"""
+Test setup: the app modules sit next to server.py and are imported by name.
+server.py keeps its data (orders, caches, SQLite files) relative to the working directory,
+so it is only ever imported from a scratch copy of the data files, never from 5001 itself.
+"""
+import os
+import shutil
+import sys
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+# Read-only inputs server.py loads at import or request time
+APP_DATA_DIRS = ('stl_files', 'js', 'product_images', 'mobile')
+APP_DATA_FILES = ('prices.json', 'content.json', 'images.json', 'index.html', 'Almost finnished.html')
+
+
+def prepare_app_workdir(workdir: str) -> str:
+    """Copy the data server.py needs into workdir (grid template caches are rebuilt there)"""
+    for name in APP_DATA_DIRS:
+        source = os.path.join(APP_DIR, name)
+        if os.path.isdir(source):
+            shutil.copytree(source, os.path.join(workdir, name), ignore=shutil.ignore_patterns('.template_cache'))
+    for name in APP_DATA_FILES:
+        source = os.path.join(APP_DIR, name)
+        if os.path.exists(source):
+            shutil.copy2(source, os.path.join(workdir, name))
+    return workdir
+
+
+def import_server(workdir: str):
+    """Import server.py with workdir as its working directory (generation runs inline)"""
+    os.environ['GENERATION_PROCESSES'] = '0'
+    os.chdir(workdir)
+    import server
+    return server
+
+
+@pytest.fixture(scope='session')
+def server(tmp_path_factory):
+    previous = os.getcwd()
+    workdir = prepare_app_workdir(str(tmp_path_factory.mktemp('app')))
+    try:
+        yield import_server(workdir)
+    finally:
+        os.chdir(previous)
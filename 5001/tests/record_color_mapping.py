@@ -0,0 +1,109 @@
+"""
+Record the color mapping parity corpus from the pre-vectorization implementation.
+
+legacy_triangle_colors is get_triangle_colors_from_image as it was before the mapping was
+vectorized (debug printing removed), run on the same grid templates server.py uses.
+Only needs re-running if the corpus cases change:
+
+    cd 5001 && python tests/record_color_mapping.py
+"""
+import os
+import sys
+import tempfile
+from collections import defaultdict
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from color_mapping_cases import CASES, FIXTURE_PATH, case_image  # noqa: E402
+from conftest import import_server, prepare_app_workdir  # noqa: E402
+
+
+def legacy_triangle_colors(vertices: np.ndarray, faces: np.ndarray, img_rgb: np.ndarray, grid_size: int = 75) -> np.ndarray:
+    img_height, img_width = img_rgb.shape[:2]
+    tri_verts = vertices[faces]
+    minX = np.inf
+    minY = np.inf
+    maxX = -np.inf
+    maxY = -np.inf
+    v0 = tri_verts[:, 0]
+    v1 = tri_verts[:, 1]
+    v2 = tri_verts[:, 2]
+    ab = v1 - v0
+    ac = v2 - v0
+    normals = np.cross(ab, ac)
+    norm_lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    norm_lengths = np.where(norm_lengths == 0, 1, norm_lengths)
+    normals_unit = normals / norm_lengths
+    nz_unit = np.abs(normals_unit[:, 2])
+    top_mask = nz_unit > 0.5
+    if np.any(top_mask):
+        top_tri_verts = tri_verts[top_mask]
+        for tri in top_tri_verts:
+            minX = min(minX, tri[0, 0], tri[1, 0], tri[2, 0])
+            minY = min(minY, tri[0, 1], tri[1, 1], tri[2, 1])
+            maxX = max(maxX, tri[0, 0], tri[1, 0], tri[2, 0])
+            maxY = max(maxY, tri[0, 1], tri[1, 1], tri[2, 1])
+    if not (np.isfinite(minX) and np.isfinite(minY)):
+        minX = vertices[:, 0].min()
+        minY = vertices[:, 1].min()
+        maxX = vertices[:, 0].max()
+        maxY = vertices[:, 1].max()
+    sizeX = max(1e-9, maxX - minX)
+    sizeY = max(1e-9, maxY - minY)
+    centroids = tri_verts.mean(axis=1)
+    num_faces = len(faces)
+    triangle_colors = np.zeros((num_faces, 3), dtype=np.uint8)
+    pixel_triangles = defaultdict(list)
+    if grid_size == 48:
+        for face_idx in range(num_faces):
+            cx = centroids[face_idx, 0]
+            cy = centroids[face_idx, 1]
+            u = max(0.0, min(0.999999, (cx - minX) / sizeX))
+            v = max(0.0, min(0.999999, (cy - minY) / sizeY))
+            img_x = u * (img_width - 1)
+            img_y = (1.0 - v) * (img_height - 1)
+            px = int(np.round(img_x))
+            py = int(np.round(img_y))
+            px = max(0, min(img_width - 1, px))
+            py = max(0, min(img_height - 1, py))
+            pixel_triangles[(py, px)].append(face_idx)
+    else:
+        grid = float(grid_size)
+        for face_idx in range(num_faces):
+            cx = centroids[face_idx, 0]
+            cy = centroids[face_idx, 1]
+            u = max(0.0, min(0.999999, (cx - minX) / sizeX))
+            v = max(0.0, min(0.999999, (cy - minY) / sizeY))
+            cellU = np.floor(u * grid) + 0.5
+            cellV = np.floor(v * grid) + 0.5
+            snappedU = cellU / grid
+            snappedV = cellV / grid
+            px = int(np.floor(snappedU * (img_width - 1)))
+            py = int(np.floor((1.0 - snappedV) * (img_height - 1)))
+            px = max(0, min(img_width - 1, px))
+            py = max(0, min(img_height - 1, py))
+            pixel_triangles[(py, px)].append(face_idx)
+    for (py, px), tri_indices in pixel_triangles.items():
+        pixel_color = img_rgb[py, px, :]
+        for tri_idx in tri_indices:
+            triangle_colors[tri_idx] = pixel_color
+    return triangle_colors
+
+
+def main():
+    with tempfile.TemporaryDirectory() as workdir:
+        server = import_server(prepare_app_workdir(workdir))
+        expected = {}
+        for name, (template_size, grid_size, width, height) in CASES.items():
+            template = server.grid_templates.get(template_size)
+            expected[name] = legacy_triangle_colors(np.asarray(template.vertices), np.asarray(template.faces),
+                                                    case_image(width, height), grid_size)
+            print(f"{name}: {len(expected[name])} faces")
+        os.makedirs(os.path.dirname(FIXTURE_PATH), exist_ok=True)
+        np.savez_compressed(FIXTURE_PATH, **expected)
+        print(f"Wrote {FIXTURE_PATH} ({os.path.getsize(FIXTURE_PATH)} bytes)")
+
+
+if __name__ == '__main__':
+    main()
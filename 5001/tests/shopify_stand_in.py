@@ -0,0 +1,128 @@
+"""
+Stateful local stand-in for the Admin API endpoints attach_files_to_order uses
+(REST and GraphQL), with optional per-response latency. Used by test_shopify_attach.py
+and benchmarks/bench_shopify_attach.py.
+"""
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+API_PREFIX = '/admin/api/2024-01'
+
+
+class ShopifyStandIn:
+    """
+    One order (id 1001, one line item, one fulfillment order) that fulfillments, note
+    updates and metafields really change, so retries can be checked for duplicates.
+    fail_next_fulfillment makes the next fulfillment attempt fail after the rest of the
+    call went through, like a mutation whose later step failed.
+    """
+
+    ORDER_ID = '1001'
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.round_trips = 0
+        self.fail_next_fulfillment = False
+        self._lock = threading.Lock()
+        self.reset()
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _respond(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                payload = json.loads(self.rfile.read(length) or b'null') if length else None
+                status, body = stand_in.handle(self.command, self.path.split('?')[0], payload)
+                if stand_in.latency:
+                    time.sleep(stand_in.latency)
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PUT = _respond
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+        self.thread.start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}{API_PREFIX}"
+
+    def reset(self):
+        self.note = 'Gift wrap please'
+        self.fulfillments = []
+        self.metafields = {}
+        self.round_trips = 0
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _fulfill(self, urls):
+        if self.fail_next_fulfillment:
+            self.fail_next_fulfillment = False
+            return None
+        self.fulfillments.append({'id': len(self.fulfillments) + 1, 'tracking_urls': urls})
+        return self.fulfillments[-1]
+
+    def _rest_order(self):
+        return {'id': int(self.ORDER_ID), 'note': self.note, 'line_items': [{'id': 1}],
+                'fulfillment_status': 'fulfilled' if self.fulfillments else None}
+
+    def handle(self, method, path, payload):
+        with self._lock:
+            self.round_trips += 1
+        path = path[len(API_PREFIX):]
+        order_path = f'/orders/{self.ORDER_ID}'
+        if path == f'{order_path}.json' and method == 'GET':
+            return 200, {'order': self._rest_order()}
+        if path == f'{order_path}.json' and method == 'PUT':
+            self.note = payload['order']['note']
+            return 200, {'order': self._rest_order()}
+        if path == f'{order_path}/fulfillments.json' and method == 'POST':
+            if self.fulfillments:
+                return 422, {'errors': 'Line items are already fulfilled'}
+            fulfillment = self._fulfill(payload['fulfillment']['tracking_urls'])
+            return (201, {'fulfillment': fulfillment}) if fulfillment else (422, {'errors': 'Fulfillment failed'})
+        if path == f'{order_path}/metafields.json' and method == 'POST':
+            metafield = payload['metafield']
+            self.metafields[(metafield['namespace'], metafield['key'])] = metafield['value']
+            return 201, {'metafield': metafield}
+        if path == '/graphql.json' and method == 'POST':
+            return 200, self._graphql(payload['query'], payload.get('variables') or {})
+        return 404, {'errors': 'Not Found'}
+
+    def _graphql(self, query, variables):
+        cost = {'requestedQueryCost': 10, 'throttleStatus': {
+            'maximumAvailable': 1000, 'currentlyAvailable': 990, 'restoreRate': 50}}
+        if re.search(r'^\s*query orderFulfillment', query):
+            status = 'CLOSED' if self.fulfillments else 'OPEN'
+            order = {'id': variables['id'], 'note': self.note,
+                     'fulfillmentOrders': {'nodes': [{'id': 'gid://shopify/FulfillmentOrder/1', 'status': status}]}}
+            return {'data': {'order': order}, 'extensions': {'cost': cost}}
+
+        data = {}
+        if variables.get('hasFulfillment', True):
+            fulfillment = None
+            if variables['fulfillment']['lineItemsByFulfillmentOrder'] and not self.fulfillments:
+                fulfillment = self._fulfill(variables['fulfillment']['trackingInfo']['urls'])
+            data['fulfillmentCreateV2'] = {
+                'fulfillment': {'id': f"gid://shopify/Fulfillment/{fulfillment['id']}", 'status': 'SUCCESS'} if fulfillment else None,
+                'userErrors': [] if fulfillment else [{'field': ['fulfillment'], 'message': 'Fulfillment failed'}],
+            }
+        if variables.get('hasNote', True):
+            self.note = variables['order']['note']
+            data['orderUpdate'] = {'order': {'id': variables['order']['id']}, 'userErrors': []}
+        if variables.get('hasMetafields'):
+            for metafield in variables['metafields']:
+                self.metafields[(metafield['namespace'], metafield['key'])] = metafield['value']
+            data['metafieldsSet'] = {'metafields': [{'id': 'gid://shopify/Metafield/1'}], 'userErrors': []}
+        return {'data': data, 'extensions': {'cost': cost}}
@@ -0,0 +1,17 @@
+"""Admin orders API"""
+from order_store import get_order_store
+
+
+def test_shopify_sync_only_merges_shopify_fields(server):
+    store = get_order_store()
+    store.add({'order_id': 'sync1', 'timestamp': '2026-01-01T00:00:00', 'paid': False, 'completed': False})
+    stale_page_copy = store.get('sync1')
+    store.update('sync1', {'paid': True, 'files_uploaded': True, 'completed': True})
+
+    synced = dict(stale_page_copy, shopify_order_id='1001', shopify_financial_status='paid')
+    response = server.app.test_client().post('/admin/orders/api', json=[synced])
+    assert response.status_code == 200
+
+    order = store.get('sync1')
+    assert order['shopify_order_id'] == '1001' and order['shopify_financial_status'] == 'paid'
+    assert order['paid'] is True and order['files_uploaded'] is True and order['completed'] is True
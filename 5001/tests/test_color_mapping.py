@@ -0,0 +1,41 @@
+"""
+The vectorized triangle->pixel color mapping must reproduce the original per-face loop
+exactly (fixtures recorded by record_color_mapping.py)
+"""
+import numpy as np
+import pytest
+
+from color_mapping_cases import CASES, FIXTURE_PATH, case_image
+
+
+@pytest.fixture(scope='module')
+def expected_colors():
+    with np.load(FIXTURE_PATH) as fixtures:
+        return {name: fixtures[name] for name in fixtures.files}
+
+
+@pytest.mark.parametrize('name', sorted(CASES))
+def test_mapping_matches_recorded_corpus(server, expected_colors, name):
+    template_size, grid_size, width, height = CASES[name]
+    template = server.grid_templates.get(template_size)
+    img_rgb = case_image(width, height)
+    expected = expected_colors[name]
+
+    for mesh_key in (None, template.template_id):  # uncached, then through the face->pixel index cache
+        colors = server.get_triangle_colors_from_image(
+            template.vertices, template.faces, img_rgb, grid_size,
+            centroids=template.centroids, top_bounds=template.top_bounds, mesh_key=mesh_key
+        )
+        mismatched = int(np.count_nonzero((colors != expected).any(axis=1)))
+        assert colors.dtype == np.uint8
+        assert mismatched == 0, f"{mismatched} of {len(expected)} faces differ from the recorded mapping"
+
+
+def test_mapping_without_template_arrays(server, expected_colors):
+    """Bounds and centroids computed from scratch (uploaded STLs) give the same result"""
+    template_size, grid_size, width, height = CASES['grid75']
+    template = server.grid_templates.get(template_size)
+    colors = server.get_triangle_colors_from_image(
+        np.asarray(template.vertices), np.asarray(template.faces), case_image(width, height), grid_size
+    )
+    np.testing.assert_array_equal(colors, expected_colors['grid75'])
@@ -0,0 +1,67 @@
+"""Generation admission: one in-flight cap for every web worker sharing the slot directory"""
+import threading
+import time
+
+import pytest
+
+from generation_service import GenerationService, GenerationSlots, read_shared_bytes, share_bytes
+from jobs import QueueFullError
+
+
+def test_slots_are_shared_through_the_slot_directory(tmp_path):
+    # Two instances stand in for two gunicorn workers
+    worker_a = GenerationSlots(str(tmp_path), 2)
+    worker_b = GenerationSlots(str(tmp_path), 2)
+    first = worker_a.acquire(0)
+    second = worker_b.acquire(0)
+    assert first is not None and second is not None
+    assert worker_a.acquire(0) is None
+    assert worker_b.acquire(0.1) is None
+
+    worker_a.release(first)
+    third = worker_b.acquire(0)
+    assert third is not None
+    worker_b.release(second)
+    worker_b.release(third)
+
+
+def echo_worker(output_format, stl_ref, png_ref, grid_size):
+    """Pool worker standing in for the generator: returns the PNG bytes, slowly for 'slow'"""
+    time.sleep(1.0 if output_format == 'slow' else 0)
+    result_ref, block = share_bytes(read_shared_bytes(png_ref))
+    block.close()
+    return f'{output_format}-{grid_size}', result_ref
+
+
+def test_requests_are_rejected_at_once_and_background_callers_wait(tmp_path):
+    service = GenerationService(processes=1, max_in_flight=1, admission_timeout=0,
+                                worker=echo_worker, slot_dir=str(tmp_path))
+    try:
+        assert service.run('fast', None, b'warm-up', 1) == ('fast-1', b'warm-up')
+
+        finished = []
+        running = threading.Thread(target=lambda: finished.append(service.run('slow', None, b'first', 2)))
+        running.start()
+        deadline = time.monotonic() + 5
+        while service.stats()['in_flight'] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        # A request handler is turned away at once while the only slot is taken
+        start = time.monotonic()
+        with pytest.raises(QueueFullError) as excinfo:
+            service.run('fast', None, b'rejected', 3)
+        assert time.monotonic() - start < 0.5
+        assert excinfo.value.retry_after >= 1
+        assert service.stats()['rejected'] == 1
+
+        # A background caller waits for the slot instead
+        waiting = threading.Thread(target=lambda: finished.append(service.run('fast', None, b'second', 4, block=True)))
+        waiting.start()
+        time.sleep(0.2)
+        assert finished == []
+        running.join(5)
+        waiting.join(5)
+        assert finished == [('slow-2', b'first'), ('fast-4', b'second')]
+        assert service.stats()['rejected'] == 1
+    finally:
+        service.shutdown()
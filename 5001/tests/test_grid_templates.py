@@ -0,0 +1,124 @@
+"""Procedural grid templates: closed meshes on the uploaded templates' scale"""
+import io
+import json
+import os
+
+import numpy as np
+import pytest
+import trimesh
+from PIL import Image
+
+from grid_templates import GridTemplateStore, generate_grid_mesh
+
+
+@pytest.mark.parametrize('columns, rows', [(1, 1), (3, 2), (12, 7)])
+def test_grid_without_gap_is_one_closed_shell(columns, rows):
+    vertices, faces = generate_grid_mesh(columns, rows, pitch=0.5, gap=0.0, height=0.25)
+    mesh = trimesh.Trimesh(vertices, faces, process=False)
+    assert mesh.is_watertight and mesh.is_winding_consistent
+    assert mesh.volume == pytest.approx(columns * rows * 0.5 * 0.5 * 0.25)
+    assert len(faces) == 4 * columns * rows + 4 * (columns + rows)
+
+
+def test_grid_with_gap_is_separate_cubes():
+    vertices, faces = generate_grid_mesh(3, 2, pitch=0.5, gap=0.1, height=0.25)
+    assert len(vertices) == 8 * 6 and len(faces) == 12 * 6
+    assert trimesh.Trimesh(vertices, faces, process=False).volume == pytest.approx(6 * 0.4 * 0.4 * 0.25)
+
+
+def test_procedural_grid_uses_the_nearest_uploaded_template_scale(server):
+    reference = server.grid_templates.get(75)
+    procedural = server.grid_templates.get(96)
+    assert procedural.procedural and procedural.stl_path is None
+
+    pitch = (reference.top_bounds[2] - reference.top_bounds[0]) / 75
+    assert (procedural.top_bounds[2] - procedural.top_bounds[0]) / 96 == pytest.approx(pitch)
+    assert (procedural.top_bounds[3] - procedural.top_bounds[1]) / 96 == pytest.approx(pitch)
+    heights = [np.ptp(np.asarray(template.vertices[:, 2])) for template in (reference, procedural)]
+    assert heights[1] == pytest.approx(heights[0])
+
+
+def test_procedural_templates_get_an_output_skeleton(server):
+    assert server.get_output_skeleton(server.grid_templates.get(96)) is not None
+    assert server.get_output_skeleton(server.grid_templates.get_procedural(20, 30)) is not None
+
+
+def checkout(server, grid_size, stl_bytes=None):
+    png = io.BytesIO()
+    Image.new('RGB', (grid_size if grid_size > 0 else 1,) * 2, (10, 20, 30)).save(png, format='PNG')
+    data = {'png': (io.BytesIO(png.getvalue()), 'design.png'), 'grid_size': str(grid_size)}
+    if stl_bytes is not None:
+        data['stl'] = (io.BytesIO(stl_bytes), 'grid.stl')
+    return server.app.test_client().post('/upload-for-checkout', data=data, content_type='multipart/form-data')
+
+
+def test_checkout_for_a_size_without_uploaded_stl(server):
+    response = checkout(server, 96)
+    assert response.status_code == 200, response.get_json()
+    order_dir = os.path.join('orders', response.get_json()['order_id'])
+    template_stl = server.grid_template_stl_path(server.grid_templates.get(96))
+    with open(os.path.join(order_dir, 'model.stl'), 'rb') as saved, open(template_stl, 'rb') as expected:
+        assert saved.read() == expected.read()
+
+
+@pytest.mark.parametrize('grid_size', [75, 96])
+def test_a_re_uploaded_server_grid_uses_its_template(server, grid_size):
+    served = server.app.test_client().get(f'/get-stl/{grid_size}')
+    assert served.status_code == 200
+    stl_bytes = served.get_data()
+    template = server.grid_templates.get(grid_size)
+    assert server.load_mesh_for_request(stl_bytes, grid_size) is template
+    assert server.mesh_cache_id(stl_bytes, grid_size) == template.template_id
+    assert server.matching_grid_template(stl_bytes[:-1] + b'\x01', grid_size) is None
+
+    response = checkout(server, grid_size, stl_bytes)
+    assert response.status_code == 200, response.get_json()
+    state = server.order_models.read_state(response.get_json()['order_id'])
+    assert state['stl_uploaded'] is False
+
+
+def test_checkout_rejects_an_invalid_size_before_creating_the_order(server):
+    before = set(os.listdir('orders')) if os.path.isdir('orders') else set()
+    response = checkout(server, server.MAX_GRID_SIZE + 1)
+    assert response.status_code == 400
+    after = set(os.listdir('orders')) if os.path.isdir('orders') else set()
+    assert after == before
+
+
+def test_public_routes_only_serve_offered_grids(server, tmp_path):
+    client = server.app.test_client()
+    assert client.get('/get-stl/20?rows=30').status_code == 404
+    assert client.get('/get-mesh/20?rows=30').status_code == 404
+    assert checkout(server, 21).status_code == 400
+
+    response = client.post('/admin/grids/api', json={'columns': 20, 'rows': 30})
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['offered'] is False
+    assert client.get('/get-stl/20?rows=30').status_code == 404
+
+    with open('prices.json') as f:
+        original = f.read()
+    try:
+        with open('prices.json', 'w') as f:
+            json.dump({**json.loads(original), '20x30': 19.99}, f)
+        assert client.get('/get-stl/20?rows=30').status_code == 200
+        assert client.get('/get-mesh/20?rows=30').status_code == 200
+    finally:
+        with open('prices.json', 'w') as f:
+            f.write(original)
+
+
+def test_template_cache_on_disk_keeps_the_most_recently_used_entries(server, tmp_path):
+    evicted = []
+    builder = GridTemplateStore(str(tmp_path), loader=server.load_stl_vertices_faces, max_entries=2)
+    for step, columns in enumerate((3, 4, 5)):
+        template = builder.get_procedural(columns, pitch=1.0, height=1.0)
+        os.utime(os.path.join(builder.cache_dir, template.template_id), ns=(step * 10**9, step * 10**9))
+    # Another worker prunes the entries it does not hold in memory
+    other = GridTemplateStore(str(tmp_path), loader=server.load_stl_vertices_faces, max_entries=2,
+                              on_evict=evicted.append)
+    assert other.prune() == 1
+    assert [os.path.basename(path) for path in evicted] == [builder.get_procedural(3, pitch=1.0, height=1.0).template_id]
+    assert sorted(os.listdir(builder.cache_dir)) == sorted(
+        builder.get_procedural(columns, pitch=1.0, height=1.0).template_id for columns in (4, 5)
+    )
@@ -0,0 +1,202 @@
+"""Paid orders: model generation across processes and delivery to Shopify"""
+import json
+import os
+import threading
+import time
+
+import pytest
+
+import webhook_handlers
+from order_generation import GENERATION_STATE_FILE, MODEL_FILENAME, OrderModelBuilder
+
+
+def write_state(order_dir, **state):
+    with open(os.path.join(order_dir, GENERATION_STATE_FILE), 'w') as f:
+        json.dump(state, f)
+
+
+@pytest.fixture
+def order_dir(tmp_path):
+    path = tmp_path / 'orders' / 'order1'
+    path.mkdir(parents=True)
+    return str(path)
+
+
+def test_ensure_waits_for_a_build_running_in_another_process(tmp_path, order_dir):
+    builds = []
+    builder = OrderModelBuilder(str(tmp_path / 'orders'), lambda *args: builds.append(args))
+    builder.POLL_INTERVAL = 0.05
+    write_state(order_dir, status='running', updated_at=time.time())
+
+    def other_process_finishes():
+        time.sleep(0.3)
+        open(os.path.join(order_dir, MODEL_FILENAME), 'w').close()
+        write_state(order_dir, status='done', updated_at=time.time())
+
+    threading.Thread(target=other_process_finishes).start()
+    assert builder.ensure('order1', timeout=5)['status'] == 'done'
+    assert builds == []
+
+
+def test_ensure_times_out_while_another_process_is_building(tmp_path, order_dir):
+    builds = []
+    builder = OrderModelBuilder(str(tmp_path / 'orders'), lambda *args: builds.append(args))
+    builder.POLL_INTERVAL = 0.05
+    write_state(order_dir, status='running', updated_at=time.time())
+    assert builder.ensure('order1', timeout=0.2)['status'] == 'running'
+    assert builds == []
+
+
+def test_ensure_takes_over_a_stale_build(tmp_path, order_dir):
+    def build(order_id, directory, state):
+        open(os.path.join(directory, MODEL_FILENAME), 'w').close()
+
+    builder = OrderModelBuilder(str(tmp_path / 'orders'), build, stale_seconds=60)
+    write_state(order_dir, status='running', updated_at=time.time() - 120)
+    assert builder.ensure('order1', timeout=5)['status'] == 'done'
+
+
+class FakeShopifyAPI:
+    def __init__(self):
+        self.uploaded = []
+        self.attached = []
+
+    def is_configured(self):
+        return True
+
+    def invalidate_order(self, order_id):
+        pass
+
+    def upload_files_to_shopify(self, files):
+        self.uploaded.extend(files)
+        return {file_type: {'url': f'https://cdn.example/{name}'} for file_type, (path, name) in files.items()}
+
+    def attach_files_to_order(self, shopify_order_id, urls, metafields=None):
+        self.attached.append(urls)
+        return True
+
+
+class FakeOrderStore:
+    def __init__(self):
+        self.updates = []
+
+    def update(self, order_id, fields):
+        self.updates.append((order_id, fields))
+
+
+class FakeBuilder:
+    def __init__(self, status):
+        self.status = status
+
+    def ensure(self, order_id, timeout=None):
+        return {'status': self.status}
+
+
+class FakeMirror:
+    def upsert(self, order):
+        pass
+
+
+@pytest.fixture
+def delivery(tmp_path, monkeypatch, order_dir):
+    monkeypatch.chdir(tmp_path)
+    api = FakeShopifyAPI()
+    store = FakeOrderStore()
+    monkeypatch.setattr(webhook_handlers, 'get_shopify_api', lambda: api)
+    monkeypatch.setattr(webhook_handlers, 'get_order_store', lambda: store)
+    monkeypatch.setattr(webhook_handlers, 'get_shopify_order_mirror', lambda: FakeMirror())
+    monkeypatch.setenv('ORDER_GENERATION_WAIT_SECONDS', '0')
+    for name in ('original.png', 'model.stl'):
+        open(os.path.join(order_dir, name), 'w').close()
+    return api, store
+
+
+def paid_order():
+    return {'id': 1001, 'name': '#1001', 'line_items': [{'properties': [{'name': '_order_id', 'value': 'order1'}]}]}
+
+
+def upload_results(order_dir):
+    with open(os.path.join(order_dir, webhook_handlers.UPLOAD_RESULTS_FILE)) as f:
+        return json.load(f)
+
+
+def test_paid_order_is_retried_until_the_model_is_done(delivery, monkeypatch, order_dir):
+    api, store = delivery
+    monkeypatch.setattr(webhook_handlers, 'get_order_model_builder', lambda: FakeBuilder('running'))
+    assert webhook_handlers.handle_order_paid(paid_order()) is False
+    assert api.uploaded == [] and api.attached == []
+
+    open(os.path.join(order_dir, MODEL_FILENAME), 'w').close()
+    monkeypatch.setattr(webhook_handlers, 'get_order_model_builder', lambda: FakeBuilder('done'))
+    assert webhook_handlers.handle_order_paid(paid_order()) is True
+    assert len(api.attached) == 1 and any(url.endswith('_obj.obj') for url in api.attached[0])
+    assert upload_results(order_dir)['_attached'] is True
+
+
+def test_files_are_not_attached_without_the_model(delivery, order_dir):
+    api, _ = delivery
+    assert webhook_handlers.upload_order_files_to_shopify('order1', '1001') is False
+    assert api.attached == []
+    assert '_attached' not in upload_results(order_dir)
+
+
+@pytest.mark.parametrize('handler', [webhook_handlers.handle_order_create, webhook_handlers.handle_order_paid])
+def test_orders_without_album_order_id_are_acknowledged(delivery, handler):
+    api, store = delivery
+    assert handler({'id': 1002, 'name': '#1002', 'line_items': [{'properties': []}]}) is True
+    assert store.updates == [] and api.uploaded == []
+
+
+def test_paid_order_fails_when_upload_fails_even_if_admin_email_is_sent(delivery, monkeypatch, order_dir):
+    api, _ = delivery
+    open(os.path.join(order_dir, MODEL_FILENAME), 'w').close()
+    monkeypatch.setattr(webhook_handlers, 'get_order_model_builder', lambda: FakeBuilder('done'))
+    monkeypatch.setenv('ADMIN_EMAIL', 'admin@example.com')
+    monkeypatch.setattr(api, 'attach_files_to_order', lambda *args, **kwargs: False)
+    assert webhook_handlers.handle_order_paid(paid_order()) is False
+
+
+def test_admin_is_emailed_once_across_retries(delivery, monkeypatch, order_dir):
+    api, _ = delivery
+    emails = []
+    open(os.path.join(order_dir, MODEL_FILENAME), 'w').close()
+    monkeypatch.setattr(webhook_handlers, 'get_order_model_builder', lambda: FakeBuilder('done'))
+    monkeypatch.setattr(webhook_handlers, 'send_order_files_to_admin', lambda *args, **kwargs: emails.append(args) or True)
+    monkeypatch.setattr(api, 'attach_files_to_order', lambda *args, **kwargs: False)
+    assert webhook_handlers.handle_order_paid(paid_order()) is False
+    assert webhook_handlers.handle_order_paid(paid_order()) is False
+    assert len(emails) == 1
+    assert upload_results(order_dir)['_admin_notified'] is True
+
+
+def test_paid_order_without_shopify_configured_is_not_retried(delivery, monkeypatch, order_dir):
+    api, store = delivery
+    emails = []
+    open(os.path.join(order_dir, MODEL_FILENAME), 'w').close()
+    monkeypatch.setattr(webhook_handlers, 'get_order_model_builder', lambda: FakeBuilder('done'))
+    monkeypatch.setattr(webhook_handlers, 'send_order_files_to_admin', lambda *args, **kwargs: emails.append(args) or True)
+    monkeypatch.setattr(api, 'is_configured', lambda: False)
+    assert webhook_handlers.handle_order_paid(paid_order()) is True
+    assert api.uploaded == [] and len(emails) == 1
+    assert store.updates[-1][1]['files_uploaded'] is False
+
+
+def test_missing_order_files_alert_the_admin_and_are_not_retried(delivery, monkeypatch):
+    emails = []
+    monkeypatch.setattr(webhook_handlers, 'get_order_model_builder', lambda: FakeBuilder('missing'))
+    monkeypatch.setattr(webhook_handlers, 'send_order_files_to_admin',
+                        lambda *args, **kwargs: emails.append(kwargs.get('problem')) or True)
+    assert webhook_handlers.handle_order_paid(paid_order()) is True
+    assert len(emails) == 1 and emails[0]
+
+
+def test_failed_generation_alerts_the_admin_once_and_retries(delivery, monkeypatch):
+    api, _ = delivery
+    emails = []
+    monkeypatch.setattr(webhook_handlers, 'get_order_model_builder', lambda: FakeBuilder('failed'))
+    monkeypatch.setattr(webhook_handlers, 'send_order_files_to_admin',
+                        lambda *args, **kwargs: emails.append(kwargs.get('problem')) or True)
+    assert webhook_handlers.handle_order_paid(paid_order()) is False
+    assert webhook_handlers.handle_order_paid(paid_order()) is False
+    assert len(emails) == 1 and emails[0]
+    assert api.uploaded == []
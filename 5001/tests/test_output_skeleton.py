@@ -0,0 +1,40 @@
+"""Output skeletons are built once per template, without blocking other templates"""
+import threading
+import time
+
+
+def test_concurrent_callers_share_one_build_per_template(server, monkeypatch):
+    builds = []
+    slow_started = threading.Event()
+    release_slow = threading.Event()
+
+    class RecordingSkeleton:
+        def __init__(self, vertices, faces):
+            builds.append(len(faces))
+            if len(faces) == len(slow_template.faces):
+                slow_started.set()
+                release_slow.wait(10)
+
+    monkeypatch.setattr(server, 'OutputSkeleton', RecordingSkeleton)
+    monkeypatch.setattr(server, '_output_skeletons', server.OrderedDict())
+    slow_template = server.grid_templates.get(75)
+    fast_template = server.grid_templates.get(48)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(server.get_output_skeleton(slow_template)))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    assert slow_started.wait(10)
+
+    # Another template builds while the first one is still in progress
+    start = time.monotonic()
+    assert server.get_output_skeleton(fast_template) is not None
+    assert time.monotonic() - start < 5
+
+    release_slow.set()
+    for thread in threads:
+        thread.join(10)
+    assert len(results) == 4 and all(result is results[0] for result in results)
+    assert sorted(builds) == sorted([len(slow_template.faces), len(fast_template.faces)])
+    assert server._output_skeleton_builds == {}
@@ -0,0 +1,23 @@
+"""palette.json is parsed once per file version"""
+import json
+import os
+
+
+def test_active_palette_cached_until_file_changes(server, monkeypatch):
+    loads = []
+    original = server._load_palette
+    monkeypatch.setattr(server, '_load_palette', lambda: loads.append(1) or original())
+    try:
+        with open(server.PALETTE_FILE, 'w') as f:
+            json.dump([{'name': 'Red', 'rgb': [255, 0, 0]}, {'name': 'Blue', 'rgb': [0, 0, 255]}], f)
+        assert server.get_active_palette() == ([(255, 0, 0), (0, 0, 255)], ['Red', 'Blue'])
+        server.get_active_palette()
+        assert len(loads) == 1
+
+        with open(server.PALETTE_FILE, 'w') as f:
+            json.dump([{'name': 'Green', 'rgb': [0, 255, 0]}], f)
+        assert server.get_active_palette() == ([(0, 255, 0)], ['Green'])
+        assert len(loads) == 2
+    finally:
+        os.remove(server.PALETTE_FILE)
+    assert server.get_active_palette()[1] == server.FOUR_COLOR_NAMES
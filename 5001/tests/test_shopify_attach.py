@@ -0,0 +1,63 @@
+"""attach_files_to_order is safe to retry: no second fulfillment, no duplicated note"""
+import pytest
+
+pytest.importorskip('requests')
+
+from shopify_api import ShopifyAPI  # noqa: E402
+from shopify_stand_in import ShopifyStandIn  # noqa: E402
+
+FILE_URLS = ['https://cdn.example/order_1_obj.obj', 'https://cdn.example/order_1_png.png']
+METAFIELDS = [('album_builder', 'order_id', 'order1', 'single_line_text_field')]
+
+
+@pytest.fixture
+def stand_in():
+    shopify = ShopifyStandIn()
+    yield shopify
+    shopify.close()
+
+
+def make_api(monkeypatch, stand_in, use_graphql):
+    monkeypatch.setenv('SHOPIFY_STORE_URL', 'stand-in.myshopify.com')
+    monkeypatch.setenv('SHOPIFY_API_KEY', 'key')
+    monkeypatch.setenv('SHOPIFY_API_SECRET', 'secret')
+    monkeypatch.setenv('SHOPIFY_API_BASE_URL', stand_in.base_url)
+    monkeypatch.setenv('SHOPIFY_USE_GRAPHQL', '1' if use_graphql else '0')
+    monkeypatch.setenv('SHOPIFY_MAX_RETRIES', '0')
+    return ShopifyAPI()
+
+
+@pytest.mark.parametrize('use_graphql', [True, False], ids=['graphql', 'rest'])
+def test_attach_adds_the_links_once(monkeypatch, stand_in, use_graphql):
+    api = make_api(monkeypatch, stand_in, use_graphql)
+    assert api.attach_files_to_order(stand_in.ORDER_ID, FILE_URLS, METAFIELDS)
+    assert stand_in.note.startswith('Gift wrap please\n\nDownload links:\n')
+    assert all(stand_in.note.count(url) == 1 for url in FILE_URLS)
+    assert len(stand_in.fulfillments) == 1
+    assert stand_in.metafields == {('album_builder', 'order_id'): 'order1'}
+
+
+def test_graphql_retry_after_partial_success_does_not_repeat_the_note(monkeypatch, stand_in):
+    api = make_api(monkeypatch, stand_in, use_graphql=True)
+    # The note was written but the fulfillment failed: the webhook is retried later
+    stand_in.fail_next_fulfillment = True
+    assert not api.attach_files_to_order(stand_in.ORDER_ID, FILE_URLS, METAFIELDS)
+    note_after_first_attempt = stand_in.note
+
+    assert api.attach_files_to_order(stand_in.ORDER_ID, FILE_URLS, METAFIELDS)
+    assert stand_in.note == note_after_first_attempt
+    assert len(stand_in.fulfillments) == 1
+
+    # A retry after everything succeeded changes nothing and still reports success
+    assert api.attach_files_to_order(stand_in.ORDER_ID, FILE_URLS, METAFIELDS)
+    assert stand_in.note == note_after_first_attempt
+    assert len(stand_in.fulfillments) == 1
+
+
+def test_rest_retry_does_not_repeat_the_note(monkeypatch, stand_in):
+    api = make_api(monkeypatch, stand_in, use_graphql=False)
+    assert api.attach_files_to_order(stand_in.ORDER_ID, FILE_URLS, METAFIELDS)
+    note = stand_in.note
+    assert api.attach_files_to_order(stand_in.ORDER_ID, FILE_URLS, METAFIELDS)
+    assert stand_in.note == note
+    assert len(stand_in.fulfillments) == 1
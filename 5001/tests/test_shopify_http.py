@@ -0,0 +1,140 @@
+"""ShopifyHTTPClient against a local stand-in for the Admin API"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip('requests')
+
+from shopify_http import CALL_LIMIT_HEADER, ShopifyHTTPClient, ShopifyHTTPError  # noqa: E402
+
+
+class StandInShopify:
+    """
+    Answers each request with the next scripted (status, headers, body) for its path
+    (the last one repeats) and records (method, path, monotonic time) of every request.
+    """
+
+    def __init__(self):
+        self.responses = {}
+        self.requests = []
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _respond(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                if length:
+                    self.rfile.read(length)
+                stand_in.requests.append((self.command, self.path, time.monotonic()))
+                script = stand_in.responses.get(self.path) or [(404, {}, {})]
+                status, headers, body = script.pop(0) if len(script) > 1 else script[0]
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = do_PUT = _respond
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+        self.thread.start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}/admin/api/2024-01"
+
+    def script(self, path, *responses):
+        self.responses[f"/admin/api/2024-01/{path}"] = list(responses)
+
+    def times(self, path):
+        return [at for _, request_path, at in self.requests if request_path.endswith(path)]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def shopify():
+    stand_in = StandInShopify()
+    yield stand_in
+    stand_in.close()
+
+
+@pytest.fixture
+def client(shopify):
+    return ShopifyHTTPClient(shopify.base_url, access_token='test', timeout=(2.0, 5.0), max_retries=3, backoff=0.01)
+
+
+def test_429_waits_for_retry_after(shopify, client):
+    shopify.script('orders.json', (429, {'Retry-After': '0.3'}, {}), (200, {}, {'orders': []}))
+    assert client.get_json('orders.json') == {'orders': []}
+    first, second = shopify.times('orders.json')
+    assert second - first >= 0.3
+
+
+def test_429_is_retried_for_post(shopify, client):
+    shopify.script('orders.json', (429, {'Retry-After': '0'}, {}), (201, {}, {'order': {'id': 1}}))
+    assert client.post_json('orders.json', {'order': {}}) == {'order': {'id': 1}}
+    assert len(shopify.times('orders.json')) == 2
+
+
+def test_post_is_not_retried_on_5xx(shopify, client):
+    shopify.script('orders.json', (502, {}, {'errors': 'bad gateway'}), (201, {}, {}))
+    with pytest.raises(ShopifyHTTPError) as excinfo:
+        client.post_json('orders.json', {'order': {}})
+    assert excinfo.value.status_code == 502
+    assert len(shopify.times('orders.json')) == 1
+
+
+def test_get_is_retried_on_5xx(shopify, client):
+    shopify.script('orders.json', (502, {}, {}), (503, {}, {}), (200, {}, {'orders': []}))
+    assert client.get_json('orders.json') == {'orders': []}
+    assert len(shopify.times('orders.json')) == 3
+
+
+def test_leaky_bucket_follows_the_call_limit_header(shopify, client):
+    client.bucket.leak_rate = 10.0
+    shopify.script('shop.json', (200, {CALL_LIMIT_HEADER: '39/40'}, {'shop': {}}))
+    client.get_json('shop.json')
+    assert client.bucket.capacity == 40 and client.bucket.level > 38
+    # 39 used, 2 kept in reserve: the next call waits for 2 calls to leak out (0.2 s)
+    client.get_json('shop.json')
+    first, second = shopify.times('shop.json')
+    assert second - first >= 0.15
+
+
+def graphql_response(data, available, requested=10, errors=None):
+    body = {'data': data, 'extensions': {'cost': {
+        'requestedQueryCost': requested,
+        'throttleStatus': {'maximumAvailable': 1000, 'currentlyAvailable': available, 'restoreRate': 100},
+    }}}
+    if errors:
+        body['errors'] = errors
+    return 200, {}, body
+
+
+def test_graphql_uses_its_own_cost_bucket(shopify, client):
+    shopify.script('graphql.json', graphql_response({'shop': {'name': 'x'}}, available=990))
+    for _ in range(3):
+        assert client.graphql('{ shop { name } }') == {'shop': {'name': 'x'}}
+    assert client.bucket.level == 0
+    assert 980 <= client.graphql_bucket.available <= 1000
+
+
+def test_graphql_throttled_waits_for_restored_cost(shopify, client):
+    throttled = [{'message': 'Throttled', 'extensions': {'code': 'THROTTLED'}}]
+    shopify.script('graphql.json',
+                   graphql_response(None, available=20, requested=50, errors=throttled),
+                   graphql_response({'ok': True}, available=0, requested=50))
+    assert client.graphql('{ ok }') == {'ok': True}
+    first, second = shopify.times('graphql.json')
+    # 30 more points at 100 points per second
+    assert second - first >= 0.25
+    assert client.bucket.level == 0
@@ -0,0 +1,25 @@
+"""Fingerprinted static assets: cache headers and encodings"""
+from static_assets import IMMUTABLE_CACHE_CONTROL, get_asset_store
+
+
+def test_only_the_exact_fingerprint_is_cached_as_immutable(server):
+    client = server.app.test_client()
+    url = get_asset_store().url('js/viewerMesh.js')
+    digest = url.split('/')[2]
+
+    assert client.get(url).headers['Cache-Control'] == IMMUTABLE_CACHE_CONTROL
+    assert client.get(url.replace(digest, digest[:4])).headers['Cache-Control'] == 'no-cache'
+
+
+def test_range_requests_get_the_identity_body(server):
+    client = server.app.test_client()
+    asset = get_asset_store().get('js/viewerMesh.js')
+    assert asset.encodings, 'viewerMesh.js should be precompressed'
+    with open(asset.path, 'rb') as f:
+        body = f.read()
+
+    response = client.get(get_asset_store().url('js/viewerMesh.js'),
+                          headers={'Range': 'bytes=10-99', 'Accept-Encoding': 'br, gzip'})
+    assert response.status_code == 206
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_data() == body[10:100]
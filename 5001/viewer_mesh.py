@@ -0,0 +1,131 @@
+"""
+Viewer Mesh
+Compact binary grid mesh for the browser viewer (/get-mesh/<size>), as an alternative to
+the binary STL (50 bytes per triangle, float32 normals, every vertex repeated per face).
+Vertices are welded and quantized to uint16 over the bounding box, faces are uint16/uint32
+indices, and an optional face->pixel index lets the client color faces without its own mapping.
+
+Layout (little-endian; every section starts on a 4-byte boundary so it can be viewed as a typed array):
+    header   64 bytes, see HEADER below
+    positions uint16[vertex_count * 3]   p = bbox_min + q * (bbox_max - bbox_min) / 65535
+    indices   uint16 or uint32[face_count * 3] (FLAG_INDEX_UINT32)
+    pixels    uint16 or uint32[face_count]     (FLAG_PIXEL_INDEX, FLAG_PIXEL_UINT32)
+              flat index py * image_width + px, for an image_width x image_height image
+"""
+import mimetypes
+import struct
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+MESH_MAGIC = b'AMSH'
+MESH_VERSION = 1
+# Registered so the asset store serves (and precompresses) .gridmesh files like model/stl
+MESH_MIMETYPE = 'model/x-grid-mesh'
+MESH_EXTENSION = '.gridmesh'
+mimetypes.add_type(MESH_MIMETYPE, MESH_EXTENSION)
+
+FLAG_INDEX_UINT32 = 1
+FLAG_PIXEL_INDEX = 2
+FLAG_PIXEL_UINT32 = 4
+
+# magic, version, flags, vertex_count, face_count, grid_size, image_width, image_height, reserved,
+# bbox_min xyz, bbox_max xyz, top_bounds (minX, minY, maxX, maxY)
+HEADER = struct.Struct('<4sHHIIHHHH3f3f4f')
+QUANT_MAX = 65535
+
+
+def _pad4(data: bytes) -> bytes:
+    return data + b'\0' * (-len(data) % 4)
+
+
+def weld_quantized(vertices: np.ndarray, faces: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Quantize positions to uint16 over the bounding box and merge vertices that land on the same point.
+    Welded vertices keep the order of their first use, which keeps the index stream compressible.
+    Face order (and count) is unchanged.
+    Returns: (positions uint16 (V, 3), indices int64 (F, 3), bbox_min, bbox_max)
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    faces = np.asarray(faces, dtype=np.int64)
+    bbox_min = vertices.min(axis=0)
+    bbox_max = vertices.max(axis=0)
+    extent = np.where(bbox_max > bbox_min, bbox_max - bbox_min, 1.0)
+    quantized = np.rint((vertices - bbox_min) / extent * QUANT_MAX).astype(np.uint16)
+
+    corners = quantized[faces.ravel()]
+    unique, first_use, inverse = np.unique(corners, axis=0, return_index=True, return_inverse=True)
+    order = np.argsort(first_use, kind='stable')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    indices = rank[inverse.ravel()].reshape(-1, 3)
+    return np.ascontiguousarray(unique[order]), indices, bbox_min, bbox_max
+
+
+def encode_viewer_mesh(vertices: np.ndarray, faces: np.ndarray, top_bounds: np.ndarray, grid_size: int,
+                       pixel_index: Optional[np.ndarray] = None, image_size: Tuple[int, int] = (0, 0)) -> bytes:
+    """
+    Encode a grid mesh in the viewer format.
+
+    Args:
+        vertices, faces: Mesh arrays (e.g. from a GridTemplate)
+        top_bounds: [minX, minY, maxX, maxY] of the top faces (what the viewer maps colors over)
+        grid_size: Grid size the mesh belongs to
+        pixel_index: Optional flat pixel index per face, for an image of image_size (width, height)
+
+    Returns:
+        Encoded mesh bytes
+    """
+    positions, indices, bbox_min, bbox_max = weld_quantized(vertices, faces)
+    flags = 0
+    index_dtype = '<u2'
+    if len(positions) > QUANT_MAX + 1:
+        flags |= FLAG_INDEX_UINT32
+        index_dtype = '<u4'
+    image_width, image_height = image_size if pixel_index is not None else (0, 0)
+    sections = [_pad4(positions.astype('<u2').tobytes()), _pad4(indices.astype(index_dtype).tobytes())]
+    if pixel_index is not None:
+        flags |= FLAG_PIXEL_INDEX
+        pixel_dtype = '<u2'
+        if image_width * image_height > QUANT_MAX + 1:
+            flags |= FLAG_PIXEL_UINT32
+            pixel_dtype = '<u4'
+        sections.append(_pad4(np.asarray(pixel_index).astype(pixel_dtype).tobytes()))
+
+    header = HEADER.pack(
+        MESH_MAGIC, MESH_VERSION, flags, len(positions), len(indices),
+        grid_size, image_width, image_height, 0,
+        *(float(x) for x in bbox_min), *(float(x) for x in bbox_max), *(float(x) for x in top_bounds)
+    )
+    return header + b''.join(sections)
+
+
+def decode_viewer_mesh(data: bytes) -> Dict[str, object]:
+    """Decode the viewer format (the inverse of encode_viewer_mesh; js/viewerMesh.js does the same in the browser)"""
+    (magic, version, flags, vertex_count, face_count, grid_size, image_width, image_height, _,
+     min_x, min_y, min_z, max_x, max_y, max_z, *top_bounds) = HEADER.unpack_from(data)
+    if magic != MESH_MAGIC or version != MESH_VERSION:
+        raise ValueError(f"Not a version {MESH_VERSION} viewer mesh")
+    offset = HEADER.size
+
+    def take(dtype: str, count: int) -> np.ndarray:
+        nonlocal offset
+        array = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+        offset += array.nbytes + (-array.nbytes % 4)
+        return array
+
+    bbox_min = np.array([min_x, min_y, min_z])
+    extent = np.array([max_x, max_y, max_z]) - bbox_min
+    quantized = take('<u2', vertex_count * 3).reshape(-1, 3)
+    mesh = {
+        'grid_size': grid_size,
+        'vertices': bbox_min + quantized * (extent / QUANT_MAX),
+        'faces': take('<u4' if flags & FLAG_INDEX_UINT32 else '<u2', face_count * 3).reshape(-1, 3),
+        'top_bounds': np.array(top_bounds),
+        'pixel_index': None,
+        'image_size': (image_width, image_height),
+    }
+    if flags & FLAG_PIXEL_INDEX:
+        mesh['pixel_index'] = take('<u4' if flags & FLAG_PIXEL_UINT32 else '<u2', face_count)
+    return mesh
@@ -9,6 +9,13 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from typing import Optional, Dict, Any
 from shopify_api import get_shopify_api
+from order_generation import get_order_model_builder
+from order_store import get_order_store
+from shopify_order_mirror import get_shopify_order_mirror
+
+
+# Per-file Shopify upload results, stored in the order folder
+UPLOAD_RESULTS_FILE = 'shopify_uploads.json'
 
 
 def extract_order_id_from_order(order_data: Dict[str, Any]) -> Optional[str]:
@@ -55,6 +62,27 @@ def get_order_files(order_id: str) -> Dict[str, str]:
     return {k: v for k, v in files.items() if os.path.exists(v)}
 
 
+def load_upload_results(order_id: str) -> Dict[str, Any]:
+    """
+    Delivery record of an order (orders/<order_id>/shopify_uploads.json): per-file Shopify
+    upload results plus '_attached' and '_admin_notified' flags
+    """
+    results_path = os.path.join('orders', order_id, UPLOAD_RESULTS_FILE)
+    if not os.path.exists(results_path):
+        return {}
+    try:
+        with open(results_path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_upload_results(order_id: str, results: Dict[str, Any]):
+    """Write an order's delivery record back (see load_upload_results)"""
+    with open(os.path.join('orders', order_id, UPLOAD_RESULTS_FILE), 'w') as f:
+        json.dump(results, f, indent=2)
+
+
 def upload_order_files_to_shopify(order_id: str, shopify_order_id: str) -> bool:
     """
     Upload order files to Shopify Files API and attach to order
@@ -75,42 +103,63 @@ def upload_order_files_to_shopify(order_id: str, shopify_order_id: str) -> bool:
         print(f"⚠️  No files found for order {order_id}")
         return False
     
-    uploaded_urls = []
+    # Per-file results from earlier attempts: files that already made it are not sent again
+    results = load_upload_results(order_id)
     
-    # Upload each file
-    for file_type, file_path in order_files.items():
-        filename = f"order_{order_id}_{file_type}.{file_path.split('.')[-1]}"
-        file_url = shopify_api.upload_file_to_shopify(file_path, filename)
-        
-        if file_url:
-            uploaded_urls.append(file_url)
-            print(f"✅ Uploaded {file_type} to Shopify: {file_url}")
-        else:
-            print(f"❌ Failed to upload {file_type}")
-    
-    if uploaded_urls:
-        # Attach files to order
-        success = shopify_api.attach_files_to_order(shopify_order_id, uploaded_urls)
-        
-        # Also store order_id as metafield
-        shopify_api.add_metafield_to_order(
-            shopify_order_id,
-            'album_builder',
-            'order_id',
-            order_id
-        )
+    pending = {
+        file_type: (file_path, f"order_{order_id}_{file_type}.{file_path.split('.')[-1]}")
+        for file_type, file_path in order_files.items()
+        if not (results.get(file_type) or {}).get('url')
+    }
+    
+    if pending:
+        # Upload the remaining files concurrently, streamed from disk
+        for file_type, result in shopify_api.upload_files_to_shopify(pending).items():
+            results[file_type] = result
+            if result.get('url'):
+                print(f"✅ Uploaded {file_type} to Shopify: {result['url']}")
+            else:
+                print(f"❌ Failed to upload {file_type}: {result.get('error')}")
         
-        return success
+        save_upload_results(order_id, results)
+    
+    if 'obj' not in order_files:
+        # The model is what the order is for: never mark the order attached without it
+        print(f"⚠️  Model for order {order_id} does not exist yet, not attaching files")
+        return False
     
-    return False
+    failed = [file_type for file_type in order_files if not (results.get(file_type) or {}).get('url')]
+    if failed:
+        # Attach once every file is there; a retry re-sends only the failed ones
+        print(f"⚠️  {len(failed)} file(s) failed to upload for order {order_id}: {failed}")
+        return False
+    
+    if results.get('_attached'):
+        return True
+    
+    uploaded_urls = [results[file_type]['url'] for file_type in order_files]
+    
+    # Attach files to order, also storing order_id as metafield (batched into one mutation)
+    success = shopify_api.attach_files_to_order(
+        shopify_order_id,
+        uploaded_urls,
+        metafields=[('album_builder', 'order_id', order_id, 'single_line_text_field')]
+    )
+    
+    if success:
+        results['_attached'] = True
+        save_upload_results(order_id, results)
+    
+    return success
 
 
-def send_order_files_to_admin(order_id: str, order_data: Dict[str, Any]) -> bool:
+def send_order_files_to_admin(order_id: str, order_data: Dict[str, Any], problem: Optional[str] = None) -> bool:
     """
     Send order files download links to admin email
     Args:
         order_id: Internal order ID
         order_data: Order data
+        problem: What went wrong with the order, if anything (flagged in the subject and body)
     Returns:
         True if successful
     """
@@ -126,7 +175,7 @@ def send_order_files_to_admin(order_id: str, order_data: Dict[str, Any]) -> bool
         msg = MIMEMultipart()
         msg['From'] = admin_email
         msg['To'] = admin_email
-        msg['Subject'] = f'New Order: {order_id}'
+        msg['Subject'] = f'New Order: {order_id}' if not problem else f'Order needs attention: {order_id}'
         
         # Create download links
         download_links = {
@@ -144,9 +193,10 @@ Order ID: {order_id}
 Shopify Order: {order_data.get('name', 'N/A')}
 Customer: {order_data.get('email', 'N/A')}
 Total: ${order_data.get('total_price', 0)}
-
-Download Links:
 """
+        if problem:
+            body += f"\nProblem: {problem}\n"
+        body += "\nDownload Links:\n"
         for file_type, url in download_links.items():
             body += f"  {file_type}: {url}\n"
         
@@ -175,6 +225,29 @@ Download Links:
         return False
 
 
+def notify_admin_once(order_id: str, order_data: Dict[str, Any], problem: Optional[str] = None) -> bool:
+    """
+    Send the admin email for an order unless an earlier delivery attempt already did
+    (webhook retries would otherwise email the admin on every attempt)
+    Args:
+        order_id: Internal order ID
+        order_data: Shopify order webhook data
+        problem: Send the problem alert instead of the files email (recorded separately)
+    Returns:
+        True if the admin has been emailed (now or before)
+    """
+    flag = '_admin_alerted' if problem else '_admin_notified'
+    results = load_upload_results(order_id)
+    if results.get(flag):
+        return True
+    if not send_order_files_to_admin(order_id, order_data, problem=problem):
+        return False
+    results = load_upload_results(order_id)
+    results[flag] = True
+    save_upload_results(order_id, results)
+    return True
+
+
 def handle_order_create(order_data: Dict[str, Any]) -> bool:
     """
     Handle order creation webhook
@@ -185,36 +258,29 @@ def handle_order_create(order_data: Dict[str, Any]) -> bool:
     """
     print(f"📦 Order created webhook received: {order_data.get('name', 'Unknown')}")
     
+    # Keep the local order mirror current (every order, not only album builder ones)
+    get_shopify_order_mirror().upsert(order_data)
+    get_shopify_api().invalidate_order(order_data.get('id'))
+    
     # Extract internal order_id
     order_id = extract_order_id_from_order(order_data)
     
     if not order_id:
-        print("⚠️  No order_id found in order properties")
-        return False
+        # Not an album builder order: nothing else to do, and nothing to retry
+        print("ℹ️  No order_id found in order properties, not an album order")
+        return True
     
     shopify_order_id = str(order_data.get('id', ''))
     
     print(f"🔗 Linking order {order_id} to Shopify order {shopify_order_id}")
     
-    # Store mapping in orders.json
+    # Store mapping on the order
     try:
-        orders_file = 'orders.json'
-        orders = []
-        
-        if os.path.exists(orders_file):
-            with open(orders_file, 'r') as f:
-                orders = json.load(f)
-        
-        # Update order with Shopify info
-        for order in orders:
-            if order.get('order_id') == order_id:
-                order['shopify_order_id'] = shopify_order_id
-                order['shopify_order_name'] = order_data.get('name')
-                order['shopify_customer_email'] = order_data.get('email')
-                break
-        
-        with open(orders_file, 'w') as f:
-            json.dump(orders, f, indent=2)
+        get_order_store().update(order_id, {
+            'shopify_order_id': shopify_order_id,
+            'shopify_order_name': order_data.get('name'),
+            'shopify_customer_email': order_data.get('email')
+        })
         
         print(f"✅ Order mapping saved")
         return True
@@ -233,45 +299,65 @@ def handle_order_paid(order_data: Dict[str, Any]) -> bool:
     """
     print(f"💰 Order paid webhook received: {order_data.get('name', 'Unknown')}")
     
+    # Keep the local order mirror current (every order, not only album builder ones)
+    get_shopify_order_mirror().upsert(order_data)
+    get_shopify_api().invalidate_order(order_data.get('id'))
+    
     # Extract internal order_id
     order_id = extract_order_id_from_order(order_data)
     
     if not order_id:
-        print("⚠️  No order_id found in order properties")
-        return False
+        # Not an album builder order: nothing else to do, and nothing to retry
+        print("ℹ️  No order_id found in order properties, not an album order")
+        return True
     
     shopify_order_id = str(order_data.get('id', ''))
     
     print(f"📤 Processing paid order {order_id} (Shopify: {shopify_order_id})")
     
+    # The model is generated after checkout; wait for it (or start it) before uploading
+    order_models = get_order_model_builder()
+    if order_models is not None:
+        generation = order_models.ensure(order_id, timeout=float(os.getenv('ORDER_GENERATION_WAIT_SECONDS', 60)))
+        if generation.get('status') == 'missing':
+            # No checkout upload for this order: retrying can't produce a model
+            print(f"❌ Order {order_id} has no checkout files, cannot deliver it")
+            send_order_files_to_admin(order_id, order_data, problem='No checkout files on the server for this order')
+            return True
+        if generation.get('status') == 'failed':
+            # ensure() rebuilds a failed model on the next retry, but someone should look at it now
+            print(f"❌ Model generation failed for order {order_id}: {generation.get('error')}, will retry")
+            notify_admin_once(order_id, order_data, problem=f"Model generation failed: {generation.get('error')}")
+            return False
+        if generation.get('status') != 'done':
+            # Failing the delivery makes the outbox retry it once the model had more time
+            print(f"⚠️  Model for order {order_id} is not ready ({generation.get('status')}), will retry")
+            return False
+    
     # Upload files to Shopify
-    upload_success = upload_order_files_to_shopify(order_id, shopify_order_id)
+    shopify_configured = get_shopify_api().is_configured()
+    if shopify_configured:
+        upload_success = upload_order_files_to_shopify(order_id, shopify_order_id)
+    else:
+        # Retrying cannot fix this: the files stay on the server and the admin email links them
+        print(f"⚠️  Shopify API not configured, not uploading files for order {order_id}")
+        upload_success = False
     
-    # Also send to admin email
-    send_success = send_order_files_to_admin(order_id, order_data)
+    # Also send to admin email (once, however often the delivery is retried)
+    notify_admin_once(order_id, order_data)
     
     # Update order status
     try:
-        orders_file = 'orders.json'
-        orders = []
-        
-        if os.path.exists(orders_file):
-            with open(orders_file, 'r') as f:
-                orders = json.load(f)
-        
-        # Update order status
-        for order in orders:
-            if order.get('order_id') == order_id:
-                order['paid'] = True
-                order['shopify_order_id'] = shopify_order_id
-                order['files_uploaded'] = upload_success
-                break
-        
-        with open(orders_file, 'w') as f:
-            json.dump(orders, f, indent=2)
+        get_order_store().update(order_id, {
+            'paid': True,
+            'shopify_order_id': shopify_order_id,
+            'files_uploaded': upload_success
+        })
         
         print(f"✅ Order status updated")
-        return upload_success or send_success
+        # The admin email is best effort; the delivery only succeeded if Shopify has the files
+        # (or can't have them until Shopify is configured)
+        return upload_success or not shopify_configured
     except Exception as e:
         print(f"❌ Error updating order status: {e}")
         return False
@@ -0,0 +1,221 @@
+"""
+Webhook Outbox
+Durable SQLite queue for Shopify webhooks: the endpoint only verifies and stores the
+payload, a background worker processes it with retry/backoff. Deliveries are deduplicated
+by X-Shopify-Webhook-Id, so Shopify's redeliveries never run a handler twice.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS webhook_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    webhook_id TEXT NOT NULL UNIQUE,
+    topic TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    received_at REAL NOT NULL,
+    next_attempt_at REAL NOT NULL,
+    processed_at REAL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_webhook_events_due ON webhook_events (status, next_attempt_at);
+"""
+
+
+class WebhookOutbox:
+    """
+    Webhook queue shared by every worker process through one SQLite file.
+    A worker claims an event by pushing its next_attempt_at forward by lease_seconds,
+    so an event whose worker died is picked up again once the lease expires.
+    """
+
+    def __init__(self, db_path: str, max_attempts: int = 8, base_backoff: float = 5.0,
+                 max_backoff: float = 900.0, lease_seconds: float = 300.0, retention_days: float = 7.0):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.lease_seconds = lease_seconds
+        self.retention_seconds = retention_days * 86400
+        self._handlers: Dict[str, Callable[[Dict[str, Any]], bool]] = {}
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_prune = 0.0
+        with self._transaction() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _transaction(self):
+        """Short-lived connection committing on success (connections are not shared across threads)"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def register(self, topic: str, handler: Callable[[Dict[str, Any]], bool]):
+        """handler(payload) returns True on success; False or an exception schedules a retry"""
+        self._handlers[topic] = handler
+
+    def enqueue(self, topic: str, payload: bytes, webhook_id: Optional[str] = None) -> bool:
+        """
+        Durably store a webhook delivery.
+        Returns: False if this webhook id was already received (a redelivery)
+        """
+        if not webhook_id:
+            # No delivery id: fall back to the payload itself
+            webhook_id = 'sha256:' + hashlib.sha256(topic.encode('utf-8') + b'\0' + payload).hexdigest()
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                'INSERT OR IGNORE INTO webhook_events (webhook_id, topic, payload, received_at, next_attempt_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (webhook_id, topic, payload, now, now)
+            )
+            inserted = cursor.rowcount == 1
+        if inserted:
+            self._wakeup.set()
+        else:
+            print(f"♻️  Duplicate webhook {webhook_id} ({topic}) ignored")
+        return inserted
+
+    def _claim_next(self) -> Optional[sqlite3.Row]:
+        now = time.time()
+        with self._transaction() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute(
+                "SELECT * FROM webhook_events WHERE status = 'pending' AND next_attempt_at <= ? "
+                "ORDER BY next_attempt_at LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is None:
+                return None
+            claimed = conn.execute(
+                "UPDATE webhook_events SET next_attempt_at = ?, attempts = attempts + 1 "
+                "WHERE id = ? AND status = 'pending' AND next_attempt_at = ?",
+                (now + self.lease_seconds, row['id'], row['next_attempt_at'])
+            ).rowcount == 1
+        # Another worker process may have claimed it between the two statements
+        return row if claimed else None
+
+    def _backoff(self, attempts: int) -> float:
+        return min(self.max_backoff, self.base_backoff * (2 ** (attempts - 1)))
+
+    def process_one(self) -> bool:
+        """
+        Process the next due event, if any.
+        Returns: True if an event was claimed
+        """
+        row = self._claim_next()
+        if row is None:
+            return False
+        attempts = row['attempts'] + 1
+        error = None
+        try:
+            handler = self._handlers.get(row['topic'])
+            if handler is None:
+                raise RuntimeError(f"No handler registered for topic {row['topic']}")
+            if not handler(json.loads(row['payload'])):
+                error = 'Handler reported failure'
+        except Exception as e:
+            error = str(e)
+
+        now = time.time()
+        with self._transaction() as conn:
+            if error is None:
+                conn.execute(
+                    "UPDATE webhook_events SET status = 'done', processed_at = ?, last_error = NULL WHERE id = ?",
+                    (now, row['id'])
+                )
+                print(f"✅ Webhook {row['topic']} processed after {now - row['received_at']:.1f}s")
+            elif attempts >= self.max_attempts:
+                conn.execute(
+                    "UPDATE webhook_events SET status = 'dead', processed_at = ?, last_error = ? WHERE id = ?",
+                    (now, error, row['id'])
+                )
+                print(f"❌ Webhook {row['topic']} ({row['webhook_id']}) gave up after {attempts} attempts: {error}")
+            else:
+                delay = self._backoff(attempts)
+                conn.execute(
+                    'UPDATE webhook_events SET next_attempt_at = ?, last_error = ? WHERE id = ?',
+                    (now + delay, error, row['id'])
+                )
+                print(f"⚠️  Webhook {row['topic']} attempt {attempts} failed ({error}), retrying in {delay:.0f}s")
+        return True
+
+    def _prune(self):
+        """Forget finished events once they are past the redelivery window"""
+        cutoff = time.time() - self.retention_seconds
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM webhook_events WHERE status = 'done' AND processed_at < ?", (cutoff,))
+
+    def _run(self, poll_interval: float):
+        while True:
+            try:
+                while self.process_one():
+                    pass
+                if time.time() - self._last_prune > 3600:
+                    self._last_prune = time.time()
+                    self._prune()
+            except Exception as e:
+                print(f"❌ Webhook outbox worker error: {e}")
+            self._wakeup.wait(poll_interval)
+            self._wakeup.clear()
+
+    def start(self, poll_interval: float = 2.0):
+        """Start the background worker thread (idempotent)"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, args=(poll_interval,), name='webhook-outbox', daemon=True)
+            self._thread.start()
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and lag metrics"""
+        now = time.time()
+        with self._transaction() as conn:
+            counts = dict(conn.execute('SELECT status, COUNT(*) FROM webhook_events GROUP BY status').fetchall())
+            oldest_pending = conn.execute(
+                "SELECT MIN(received_at) FROM webhook_events WHERE status = 'pending'"
+            ).fetchone()[0]
+            recent_lag = conn.execute(
+                "SELECT AVG(processed_at - received_at), MAX(processed_at - received_at) FROM "
+                "(SELECT processed_at, received_at FROM webhook_events WHERE status = 'done' "
+                "ORDER BY processed_at DESC LIMIT 100)"
+            ).fetchone()
+            retrying = conn.execute(
+                "SELECT COUNT(*) FROM webhook_events WHERE status = 'pending' AND attempts > 0"
+            ).fetchone()[0]
+        return {
+            'depth': counts.get('pending', 0),
+            'retrying': retrying,
+            'done': counts.get('done', 0),
+            'dead': counts.get('dead', 0),
+            'oldest_pending_age_seconds': round(now - oldest_pending, 3) if oldest_pending else 0.0,
+            'avg_lag_seconds': round(recent_lag[0], 3) if recent_lag[0] is not None else None,
+            'max_lag_seconds': round(recent_lag[1], 3) if recent_lag[1] is not None else None,
+        }
+
+
+# Global instance
+_webhook_outbox = None
+
+def get_webhook_outbox() -> WebhookOutbox:
+    """Get or create the webhook outbox (configured from environment variables)"""
+    global _webhook_outbox
+    if _webhook_outbox is None:
+        _webhook_outbox = WebhookOutbox(
+            db_path=os.getenv('WEBHOOK_OUTBOX_DB', 'webhook_outbox.db'),
+            max_attempts=int(os.getenv('WEBHOOK_MAX_ATTEMPTS', 8)),
+        )
+    return _webhook_outbox